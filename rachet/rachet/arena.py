@@ -0,0 +1,202 @@
+import struct
+import sys
+from array import array
+
+from parser import Node, NODE_TYPES, node_kind
+
+# Bump when the byte layout written by to_bytes changes
+ARENA_FORMAT = 1
+ARENA_MAGIC = b'RXAST'
+
+class AstArena:
+    """Struct-of-arrays AST.
+
+    Node ids index flat columns: kind, value (an index into a table of
+    distinct values), first child and next sibling (-1 for none). Node 0 is
+    the root. ArenaNode gives the same .type/.value/.children interface as
+    Node, so Compiler.codegen walks either representation.
+    """
+    def __init__(self):
+        self.kinds = array('B')
+        self.value_ids = array('I')
+        self.first_child = array('i')
+        self.next_sibling = array('i')
+        self.values = []
+
+    @classmethod
+    def from_node(cls, root):
+        """Pack a Node tree into a new arena, numbering nodes in preorder"""
+        arena = cls()
+        value_index = {}  # (type, value) -> index into arena.values
+        last_child = {}  # parent id -> id of its most recently added child
+        stack = [(root, -1)]
+        while stack:
+            node, parent = stack.pop()
+            value = node.value
+            key = (type(value), value)
+            value_id = value_index.get(key)
+            if value_id is None:
+                value_id = value_index[key] = len(arena.values)
+                arena.values.append(value)
+            node_id = arena.add(node.kind, value_id)
+            if parent >= 0:
+                if parent in last_child:
+                    arena.next_sibling[last_child[parent]] = node_id
+                else:
+                    arena.first_child[parent] = node_id
+                last_child[parent] = node_id
+            # Reversed so children come off the stack left to right
+            stack.extend((child, node_id) for child in reversed(node.children))
+        return arena
+
+    def add(self, kind, value_id):
+        """Append a node with no links yet and return its id"""
+        self.kinds.append(kind)
+        self.value_ids.append(value_id)
+        self.first_child.append(-1)
+        self.next_sibling.append(-1)
+        return len(self.kinds) - 1
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def to_bytes(self):
+        """Serialize to a compact little-endian binary blob.
+
+        Kinds are written against a table of type names so the blob stays
+        valid even if node kinds are numbered differently next time."""
+        used_kinds = sorted(set(self.kinds))
+        kind_slots = {kind: slot for slot, kind in enumerate(used_kinds)}
+        out = [ARENA_MAGIC, struct.pack('<BIII', ARENA_FORMAT, len(self.kinds), len(self.values), len(used_kinds))]
+        for kind in used_kinds:
+            name = NODE_TYPES[kind].encode('utf-8')
+            out.append(struct.pack('<H', len(name)) + name)
+        for value in self.values:
+            if value is None:
+                out.append(b'\x00')
+            elif isinstance(value, int) and -2**63 <= value < 2**63:
+                out.append(b'\x01' + struct.pack('<q', value))
+            elif isinstance(value, int):
+                data = str(value).encode('ascii')
+                out.append(b'\x03' + struct.pack('<I', len(data)) + data)
+            else:
+                data = str(value).encode('utf-8')
+                out.append(b'\x02' + struct.pack('<I', len(data)) + data)
+        columns = [array('B', [kind_slots[kind] for kind in self.kinds]), self.value_ids, self.first_child, self.next_sibling]
+        for column in columns:
+            if sys.byteorder == 'big':
+                column = array(column.typecode, column)
+                column.byteswap()
+            out.append(column.tobytes())
+        return b''.join(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Rebuild an arena written by to_bytes; raises ValueError if malformed"""
+        view = memoryview(data)
+        if bytes(view[:len(ARENA_MAGIC)]) != ARENA_MAGIC:
+            raise ValueError("Not a Rachet AST blob")
+        offset = len(ARENA_MAGIC)
+        try:
+            version, node_count, value_count, kind_count = struct.unpack_from('<BIII', view, offset)
+            if version != ARENA_FORMAT:
+                raise ValueError(f"Unsupported AST blob format {version}")
+            offset += struct.calcsize('<BIII')
+            kinds_by_slot = []
+            for _ in range(kind_count):
+                (length,) = struct.unpack_from('<H', view, offset)
+                offset += 2
+                kinds_by_slot.append(node_kind(bytes(view[offset:offset + length]).decode('utf-8')))
+                offset += length
+            arena = cls()
+            for _ in range(value_count):
+                tag = view[offset]
+                offset += 1
+                if tag == 0:
+                    arena.values.append(None)
+                elif tag == 1:
+                    arena.values.append(struct.unpack_from('<q', view, offset)[0])
+                    offset += 8
+                elif tag in (2, 3):
+                    (length,) = struct.unpack_from('<I', view, offset)
+                    offset += 4
+                    text = bytes(view[offset:offset + length]).decode('utf-8')
+                    arena.values.append(text if tag == 2 else int(text))
+                    offset += length
+                else:
+                    raise ValueError(f"Bad value tag {tag}")
+            slots = array('B')
+            for column in (slots, arena.value_ids, arena.first_child, arena.next_sibling):
+                size = node_count * column.itemsize
+                if offset + size > len(view):
+                    raise ValueError("Truncated AST blob")
+                column.frombytes(view[offset:offset + size])
+                if sys.byteorder == 'big':
+                    column.byteswap()
+                offset += size
+            arena.kinds = array('B', [kinds_by_slot[slot] for slot in slots])
+        except (struct.error, IndexError, UnicodeDecodeError) as e:
+            raise ValueError(f"Malformed AST blob: {e}")
+        if offset != len(view):
+            raise ValueError("Trailing data in AST blob")
+        return arena
+
+    def root(self):
+        return ArenaNode(self, 0)
+
+    def child_ids(self, node_id):
+        child = self.first_child[node_id]
+        while child >= 0:
+            yield child
+            child = self.next_sibling[child]
+
+    def to_node(self, node_id=0):
+        """Rebuild an ordinary Node tree, e.g. for passes that rewrite the AST"""
+        built = {}
+        order = []
+        stack = [node_id]
+        while stack:
+            current = stack.pop()
+            order.append(current)
+            stack.extend(self.child_ids(current))
+        for current in reversed(order):
+            node = Node(NODE_TYPES[self.kinds[current]], self.values[self.value_ids[current]],
+                        [built.pop(child) for child in self.child_ids(current)])
+            built[current] = node
+        return built[node_id]
+
+class ArenaNode:
+    """Lightweight view of one arena node with the Node interface"""
+    __slots__ = ('arena', 'id')
+
+    def __init__(self, arena, node_id):
+        self.arena = arena
+        self.id = node_id
+
+    @property
+    def kind(self):
+        return self.arena.kinds[self.id]
+
+    @property
+    def type(self):
+        return NODE_TYPES[self.arena.kinds[self.id]]
+
+    @property
+    def value(self):
+        return self.arena.values[self.arena.value_ids[self.id]]
+
+    @property
+    def children(self):
+        arena = self.arena
+        return [ArenaNode(arena, child) for child in arena.child_ids(self.id)]
+
+    # Views are created on every .children access, so compare by position
+    # in the arena rather than by object identity
+    def __eq__(self, other):
+        return isinstance(other, ArenaNode) and other.arena is self.arena and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f"ArenaNode({self.type}, value={repr(self.value)}, id={self.id})"
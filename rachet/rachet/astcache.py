@@ -0,0 +1,98 @@
+import hashlib
+import os
+
+from lexer import LEXER_VERSION
+from parser import PARSER_VERSION
+from arena import AstArena, ARENA_FORMAT
+
+DEFAULT_CACHE_DIR = '.rachet_cache'
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+def cache_dir_for(source_file):
+    """The cache directory of a source file: .rachet_cache next to it, so
+    the cache does not depend on where the compiler is run from"""
+    return os.path.join(os.path.dirname(os.path.abspath(source_file)), DEFAULT_CACHE_DIR)
+
+class AstCache:
+    """Parsed ASTs on disk, one AstArena blob per source content hash.
+
+    Entries are named by key() so a changed source, lexer or parser simply
+    misses. The directory is kept under max_bytes by evicting the least
+    recently used entries; a hit touches the file's mtime.
+    """
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def key(self, source):
+        """Hash of the source bytes and every version the AST depends on"""
+        digest = hashlib.sha256(f"rachet-ast:{LEXER_VERSION}:{PARSER_VERSION}:{ARENA_FORMAT}\n".encode('ascii'))
+        digest.update(source)
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + '.ast')
+
+    def load(self, key):
+        """Return the cached AstArena for key, or None on a miss"""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            arena = AstArena.from_bytes(data)
+        except ValueError:
+            # Corrupt or truncated entry; drop it and parse normally
+            self.remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return arena
+
+    def store(self, key, arena):
+        """Write arena under key, then evict old entries over the size limit"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self.path(key)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(arena.to_bytes())
+            # Atomic so a concurrent compile never reads a half written entry
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Warning: Could not write AST cache: {e}")
+            return
+        self.evict(keep=path)
+
+    def evict(self, keep=None):
+        """Delete least recently used entries until the cache fits max_bytes"""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.ast') and entry.path != keep:
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        if keep is not None:
+            try:
+                total += os.path.getsize(keep)
+            except OSError:
+                pass
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self.remove(path)
+            total -= size
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,253 @@
+from ir import Temp, Var, Const, Str, NEGATED
+from dispatch import emit_string_dispatch, emit_integer_dispatch
+from strength import multiply_sequence, divide_sequence, format_sequence
+
+JCC = {
+    'EQUAL': 'je',
+    'NOT_EQUAL': 'jne',
+    'GREATER': 'jg',
+    'GREATER_EQUAL': 'jge',
+    'LESS': 'jl',
+    'LESS_EQUAL': 'jle',
+}
+SETCC = {
+    'EQUAL': 'sete',
+    'NOT_EQUAL': 'setne',
+    'GREATER': 'setg',
+    'GREATER_EQUAL': 'setge',
+    'LESS': 'setl',
+    'LESS_EQUAL': 'setle',
+}
+# Operand positions whose value may be left in eax by the instruction just
+# before: the instruction reads them before it clobbers eax
+FUSABLE = {
+    'copy': (0,),
+    'binary': (0, 1),
+    'unary': (0,),
+    'call': None,  # any argument; pushes leave eax alone
+    'tailcall': None,
+    'command': (0,),  # plugins expect an expression argument in eax
+    'branch': (0, 1),
+    'switch': (0,),
+    'return': (0,),
+}
+
+class CommandArg:
+    """What a command plugin sees of one argument, like codegen's SimpleArg"""
+    def __init__(self, type, value, asm, value_type):
+        self.type = type
+        self.value = value
+        self.asm = asm
+        self.value_type = value_type
+
+class X86Backend:
+    """Lowers ir.Functions to NASM text in the compiler's emitter.
+
+    Every Var and Temp gets a dword in the frame, except a Temp used only
+    by the very next instruction, which is passed along in eax instead.
+    Blocks are laid out in order, so a jump to the next block is left out.
+    """
+    def __init__(self, compiler):
+        self.compiler = compiler
+        self.emitter = compiler.emitter
+        self.slots = {}
+        self.fused = set()
+        self.next_label = None
+
+    def emit_function(self, function):
+        emit = self.emitter.text
+        self.layout(function)
+        emit(f"global {function.name}\n{function.name}:\npush ebp\nmov ebp, esp\n")
+        if self.size:
+            emit(f"sub esp, {self.size}\n")
+        for i, block in enumerate(function.blocks):
+            self.next_label = function.blocks[i + 1].label if i + 1 < len(function.blocks) else None
+            emit(f"{block.label}:\n")
+            for instr in block.instrs:
+                self.emit_instr(instr)
+
+    def layout(self, function):
+        """Decide which temps stay in eax and give everything else a slot"""
+        self.slots = {}
+        self.fused = set()
+        self.size = 0
+        for i, param in enumerate(function.params):
+            self.slots[Var(param)] = 8 + i * 4
+        uses = {}
+        for instr in function.instructions():
+            for arg in instr.args:
+                if isinstance(arg, Temp):
+                    uses[arg] = uses.get(arg, 0) + 1
+        for block in function.blocks:
+            for previous, instr in zip(block.instrs, block.instrs[1:]):
+                temp = previous.dest
+                if not isinstance(temp, Temp) or uses.get(temp) != 1 or temp not in instr.args:
+                    continue
+                positions = FUSABLE.get(instr.op, ())
+                if positions is None or instr.args.index(temp) in positions:
+                    self.fused.add(temp)
+        for instr in function.instructions():
+            for operand in (instr.dest,) + instr.args:
+                if isinstance(operand, (Var, Temp)) and operand not in self.slots and operand not in self.fused:
+                    if isinstance(operand, Temp) and operand is instr.dest and not uses.get(operand):
+                        continue  # Never read, so never stored
+                    self.size += 4
+                    self.slots[operand] = -self.size
+        self.uses = uses
+
+    def operand(self, value):
+        """Source operand text for a value that is not in eax"""
+        if isinstance(value, Const):
+            return str(value.value)
+        if isinstance(value, Str):
+            return self.emitter.string_literal(value.literal)
+        return f"dword [ebp{self.slots[value]:+d}]"
+
+    def load(self, register, value):
+        if value in self.fused:
+            if register != 'eax':
+                self.emitter.text(f"mov {register}, eax\n")
+        else:
+            self.emitter.text(f"mov {register}, {self.operand(value)}\n")
+
+    def store(self, dest):
+        """Keep the result in eax for the next instruction, or save it"""
+        if dest is None or dest in self.fused:
+            return
+        if isinstance(dest, Temp) and not self.uses.get(dest):
+            return
+        self.emitter.text(f"mov dword [ebp{self.slots[dest]:+d}], eax\n")
+
+    def push(self, value):
+        if value in self.fused:
+            self.emitter.text("push eax\n")
+        elif isinstance(value, (Var, Temp)):
+            self.emitter.text(f"push {self.operand(value)}\n")
+        else:
+            self.emitter.text(f"push dword {self.operand(value)}\n")
+
+    def operands(self, left, right):
+        """Load left into eax; return the operand holding right"""
+        if right in self.fused:
+            self.emitter.text("mov ecx, eax\n")
+            self.load('eax', left)
+            return 'ecx'
+        self.load('eax', left)
+        return self.operand(right)
+
+    def emit_instr(self, instr):
+        emit = self.emitter.text
+        op = instr.op
+        if op == 'copy':
+            source = instr.args[0]
+            if isinstance(source, (Const, Str)) and instr.dest not in self.fused:
+                emit(f"mov dword [ebp{self.slots[instr.dest]:+d}], {self.operand(source)}\n")
+                return
+            self.load('eax', source)
+            self.store(instr.dest)
+        elif op == 'binary':
+            right = self.operands(*instr.args)
+            self.binary(instr.extra, right)
+            self.store(instr.dest)
+        elif op == 'unary':
+            self.load('eax', instr.args[0])
+            if instr.extra == 'NOT':
+                emit("test eax, eax\nsetz al\nmovzx eax, al\n")
+            self.store(instr.dest)
+        elif op == 'call':
+            for arg in reversed(instr.args):
+                self.push(arg)
+            emit(f"call {instr.extra}\n")
+            if instr.args:
+                emit(f"add esp, {len(instr.args) * 4}\n")
+            self.store(instr.dest)
+        elif op == 'command':
+            self.command(instr)
+            self.store(instr.dest)
+        elif op == 'jump':
+            if instr.extra != self.next_label:
+                emit(f"jmp {instr.extra}\n")
+        elif op == 'branch':
+            self.branch(instr)
+        elif op == 'switch':
+            self.load('eax', instr.args[0])
+            cases, default, kind = instr.extra
+            dispatch = emit_integer_dispatch if kind == 'int' else emit_string_dispatch
+            dispatch(self.compiler, cases, default)
+        elif op == 'return':
+            if instr.args:
+                self.load('eax', instr.args[0])
+            emit("mov esp, ebp\npop ebp\nret\n")
+        elif op == 'tailcall':
+            for arg in reversed(instr.args):
+                self.push(arg)
+            for i in range(len(instr.args)):
+                emit(f"pop dword [ebp+{8 + i * 4}]\n")
+            emit(f"mov esp, ebp\npop ebp\njmp {instr.extra}\n")
+        else:
+            raise Exception(f"Unknown IR instruction '{op}'")
+
+    def binary(self, op, right):
+        """eax = eax <op> right"""
+        emit = self.emitter.text
+        if op == 'PLUS':
+            emit(f"add eax, {right}\n")
+        elif op == 'MINUS':
+            emit(f"sub eax, {right}\n")
+        elif op == 'MULTIPLY':
+            sequence = multiply_sequence(int(right), 'eax') if right.lstrip('-').isdigit() else None
+            emit(format_sequence(sequence) if sequence is not None else f"imul eax, {right}\n")
+        elif op == 'DIVIDE':
+            sequence = divide_sequence(int(right)) if right.lstrip('-').isdigit() else None
+            if sequence is not None:
+                emit(format_sequence(sequence))
+                return
+            if not right.startswith(('dword', 'ecx')):
+                # idiv has no immediate form
+                emit(f"mov ecx, {right}\n")
+                right = 'ecx'
+            emit(f"cdq\nidiv {right}\n")
+        elif op in SETCC:
+            emit(f"cmp eax, {right}\n{SETCC[op]} al\nmovzx eax, al\n")
+        elif op == 'AND':
+            if right != 'ecx':
+                emit(f"mov ecx, {right}\n")
+            emit("test eax, eax\nsetnz al\ntest ecx, ecx\nsetnz cl\nand al, cl\nmovzx eax, al\n")
+        elif op == 'OR':
+            emit(f"or eax, {right}\nsetnz al\nmovzx eax, al\n")
+        else:
+            raise Exception(f"Unknown binary operator '{op}'")
+
+    def branch(self, instr):
+        emit = self.emitter.text
+        condition, true_label, false_label = instr.extra
+        left, right = instr.args
+        if isinstance(right, Const) and right.value == 0 and condition in ('EQUAL', 'NOT_EQUAL'):
+            self.load('eax', left)
+            emit("test eax, eax\n")
+        else:
+            emit(f"cmp eax, {self.operands(left, right)}\n")
+        if true_label == self.next_label:
+            emit(f"{JCC[NEGATED[condition]]} {false_label}\n")
+        else:
+            emit(f"{JCC[condition]} {true_label}\n")
+            if false_label != self.next_label:
+                emit(f"jmp {false_label}\n")
+
+    def command(self, instr):
+        compiler = self.compiler
+        command = instr.extra
+        # Like codegen, plugins expect an expression argument in eax. That
+        # includes a short circuit, whose value is in a hidden Var.
+        if instr.args and command.nodes[0][0] not in ('Number', 'Variable', 'StringLiteral'):
+            self.load('eax', instr.args[0])
+        args = []
+        for value, (node_type, node_value, value_type) in zip(instr.args, command.nodes):
+            if isinstance(value, Var) and node_type == 'Variable':
+                asm = f"[ebp{self.slots[value]:+d}]"
+            elif isinstance(value, Const):
+                asm = str(value.value)
+            else:
+                asm = "eax"
+            args.append(CommandArg(node_type, node_value, asm, value_type))
+        compiler.run_command(command.name, command.module, args)
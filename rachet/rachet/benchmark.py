@@ -0,0 +1,133 @@
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from lexer import Lexer
+from parser import Parser
+from arena import AstArena
+from compiler import Compiler
+
+def generate_source(functions):
+    """Build a synthetic .rx program with the given number of helper functions"""
+    lines = ["use crate::bin;", "", "fn main() {"]
+    for i in range(functions):
+        lines.append(f"    helper{i}({i}, \"call {i}\");")
+    lines.append("}")
+    for i in range(functions):
+        lines.extend([
+            "",
+            f"fn helper{i}(count, label) {{",
+            "    # Generated helper",
+            "    print(label);",
+            f"    let total_{i}: i32 = (count + {i}) * 2 - 1;",
+            f"    if (total_{i} >= 10 && count != 0) {{",
+            f"        print(total_{i});",
+            "    } else {",
+            "        print(\"small\");",
+            "    }",
+            "}",
+        ])
+    return "\n".join(lines) + "\n"
+
+def time_call(func, repeat=3):
+    """Return the best wall time of several runs together with the last result"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+def bench_lexer(sizes=(100, 200, 400, 800, 1600)):
+    """Tokenize generated sources of growing size and report tokens/sec"""
+    print(f"{'lines':>8} {'tokens':>9} {'seconds':>9} {'tokens/sec':>12}")
+    for size in sizes:
+        source = generate_source(size)
+        elapsed, tokens = time_call(lambda: Lexer(source).tokenize())
+        lines = source.count("\n")
+        print(f"{lines:>8} {len(tokens):>9} {elapsed:>9.4f} {len(tokens) / elapsed:>12,.0f}")
+
+def flat_expression(terms):
+    """a + 1 * b - 2 / c ... with the given number of operands"""
+    operators = ['+', '*', '-', '/', '+', '-']
+    parts = ["a"]
+    for i in range(1, terms):
+        parts.append(operators[i % len(operators)])
+        parts.append(str(i) if i % 2 else "b")
+    return " ".join(parts)
+
+def nested_expression(depth):
+    """((((a + 1) * 2) - 3) ...) nested to the given depth"""
+    operators = ['+', '*', '-', '/']
+    source = "a"
+    for i in range(1, depth + 1):
+        source = f"({source} {operators[i % len(operators)]} {i})"
+    return source
+
+def bench_expressions(sizes=(1000, 4000, 16000)):
+    """Parse long flat and deeply nested arithmetic expressions"""
+    print(f"{'shape':>8} {'operands':>9} {'seconds':>9} {'operands/sec':>13}")
+    for shape, build in (('flat', flat_expression), ('nested', nested_expression)):
+        for size in sizes:
+            tokens = Lexer(build(size)).tokenize()
+            elapsed, _ = time_call(lambda: Parser(tokens).parse_expression())
+            print(f"{shape:>8} {size:>9} {elapsed:>9.4f} {size / elapsed:>13,.0f}")
+
+def measure(func):
+    """Run func once and return (seconds, bytes still allocated, result)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, retained, result
+
+def bench_ast(functions=1600):
+    """Compare the memory held by a Node tree and by its AstArena"""
+    source = generate_source(functions)
+    tokens = Lexer(source).tokenize()
+    parse_time, _ = time_call(lambda: Parser(tokens).parse())
+    _, tree_bytes, ast = measure(lambda: Parser(tokens).parse())
+    pack_time, _ = time_call(lambda: AstArena.from_node(ast))
+    _, arena_bytes, arena = measure(lambda: AstArena.from_node(ast))
+    nodes = len(arena)
+    print(f"source: {len(source):,} bytes, {nodes:,} nodes, parse {parse_time:.3f}s, pack {pack_time:.3f}s")
+    print(f"{'representation':>16} {'bytes':>12} {'bytes/node':>11}")
+    print(f"{'Node tree':>16} {tree_bytes:>12,} {tree_bytes / nodes:>11.1f}")
+    print(f"{'AstArena':>16} {arena_bytes:>12,} {arena_bytes / nodes:>11.1f}")
+
+def bench_codegen(sizes=(400, 1600, 6400)):
+    """Generate assembly for growing programs and report lines of asm/sec"""
+    print(f"{'functions':>10} {'asm lines':>10} {'seconds':>9} {'lines/sec':>12}")
+    for size in sizes:
+        ast = Parser(Lexer(generate_source(size)).tokenize()).parse()
+        def generate():
+            compiler = Compiler('bench.rx')
+            compiler.codegen(ast)
+            return compiler.emitter
+        elapsed, emitter = time_call(generate)
+        lines = sum(emitter.getvalue(section).count("\n") for section in emitter.SECTIONS)
+        print(f"{size:>10} {lines:>10} {elapsed:>9.4f} {lines / elapsed:>12,.0f}")
+
+BENCHMARKS = {
+    'lexer': bench_lexer,
+    'expressions': bench_expressions,
+    'ast': bench_ast,
+    'codegen': bench_codegen,
+}
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark '{name}'. Available: {', '.join(BENCHMARKS)}")
+            sys.exit(1)
+        print(f"== {name} ==")
+        BENCHMARKS[name]()
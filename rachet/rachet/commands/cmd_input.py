@@ -3,35 +3,18 @@
 # Global flag to track if input_buffer has been defined
 _input_buffer_defined = False
 
-def compile(args):
+def emit(args, emitter):
     global _input_buffer_defined
     
     # Only define the buffer once
-    bss_section = ""
     if not _input_buffer_defined:
-        bss_section = "input_buffer resb 256\n"
+        emitter.bss("input_buffer resb 256\n")
         _input_buffer_defined = True
     
     if not args:
         # No prompt, just get input
-        return {
-            "data": "",
-            "text": "push input_buffer\ncall input_thunk\nmov eax, input_buffer\n",
-            "bss": bss_section
-        }
+        emitter.text("push input_buffer\ncall input_thunk\nmov eax, input_buffer\n")
+        return
     
-    arg = args[0]
-    
-    # First print the prompt, then get input
-    if arg.type == 'StringLiteral':
-        return {
-            "data": "",
-            "text": "push eax\ncall print_thunk\npush input_buffer\ncall input_thunk\nmov eax, input_buffer\n",
-            "bss": bss_section
-        }
-    else:
-        return {
-            "data": "",
-            "text": "push eax\ncall print_thunk\npush input_buffer\ncall input_thunk\nmov eax, input_buffer\n",
-            "bss": bss_section
-        }
\ No newline at end of file
+    # First print the prompt (expected in eax), then get input
+    emitter.text("push eax\ncall print_thunk\npush input_buffer\ncall input_thunk\nmov eax, input_buffer\n")
\ No newline at end of file
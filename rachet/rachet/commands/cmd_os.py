@@ -1,15 +1,9 @@
 # commands/cmd_os.py
 
-def compile(args):
+def emit(args, emitter):
     command = args[0].value
     
     if command == "shutdown":
-        return {
-            "data": "",
-            "text": "call shutdown_thunk"
-        }
+        emitter.text("call shutdown_thunk")
     else:
-        return {
-            "data": "",
-            "text": "; os command not recognized"
-        }
\ No newline at end of file
+        emitter.text("; os command not recognized")
\ No newline at end of file
@@ -1,32 +1,17 @@
 # commands/cmd_pause.py
 
-def compile(args):
+def emit(args, emitter):
     if not args:
         # Default pause of 1000ms
-        return {
-            "data": "",
-            "text": "push 1000\ncall pause_thunk\n",
-            "bss": ""
-        }
+        emitter.text("push 1000\ncall pause_thunk\n")
+        return
     
     arg = args[0]
     
     if arg.type == 'Number':
-        return {
-            "data": "",
-            "text": f"push {arg.value}\ncall pause_thunk\n",
-            "bss": ""
-        }
+        emitter.text(f"push {arg.value}\ncall pause_thunk\n")
     elif arg.type == 'Variable':
-        return {
-            "data": "",
-            "text": f"mov eax, dword {arg.asm}\npush eax\ncall pause_thunk\n",
-            "bss": ""
-        }
+        emitter.text(f"mov eax, dword {arg.asm}\npush eax\ncall pause_thunk\n")
     else:
         # For expressions, the result should already be in eax
-        return {
-            "data": "",
-            "text": "push eax\ncall pause_thunk\n",
-            "bss": ""
-        }
\ No newline at end of file
+        emitter.text("push eax\ncall pause_thunk\n")
\ No newline at end of file
@@ -1,31 +1,28 @@
 # commands/cmd_print.py
 
-def compile(args):
+def emit(args, emitter):
     import uuid
     
     if not args:
-        return {
-            "data": "",
-            "text": "; print with no arguments\n"
-        }
+        emitter.text("; print with no arguments\n")
+        return
     
     arg = args[0]
-    newline_label = f"newline_{uuid.uuid4().hex[:8]}"
+    newline_label = emitter.string("\n")
     
     if arg.type == "StringLiteral":
-        text = arg.value.strip('"').replace('\\n', '\n')
-        label = f"str_{uuid.uuid4().hex[:8]}"
+        label = emitter.string_literal(arg.value)
         
-        return {
-            "data": f'{label}: db "{text}",0\n{newline_label}: db 0x0A,0\n',
-            "text": f"    push {label}\n    call print_thunk\n    push {newline_label}\n    call print_thunk\n"
-        }
+        emitter.text(f"    push {label}\n    call print_thunk\n    push {newline_label}\n    call print_thunk\n")
+    elif arg.type == "Variable" and arg.value_type == "string":
+        emitter.text(f"    push dword {arg.asm}\n    call print_thunk\n    push {newline_label}\n    call print_thunk\n")
+    elif arg.type == "Variable" and arg.value_type == "i32":
+        emitter.text(f"    push dword {arg.asm}\n    call print_number_thunk\n    push {newline_label}\n    call print_thunk\n")
     elif arg.type == "Variable":
-        # Use the heuristic approach since we can't easily access compiler type info here
+        # Type unknown at compile time (e.g. bound to both numbers and
+        # strings): fall back to guessing from the value
         uuid_hex = uuid.uuid4().hex[:8]
-        return {
-            "data": f"{newline_label}: db 0x0A,0\n",
-            "text": f"""    mov eax, dword {arg.asm}
+        emitter.text(f"""    mov eax, dword {arg.asm}
     ; Heuristic: if value < 1000000, treat as number; otherwise as string pointer
     cmp eax, 1000000
     jl .print_as_number_{uuid_hex}
@@ -39,16 +36,11 @@ def compile(args):
 .done_{uuid_hex}:
     push {newline_label}
     call print_thunk
-"""
-        }
+""")
     elif arg.type == "Number":
-        return {
-            "data": f"{newline_label}: db 0x0A,0\n",
-            "text": f"    push dword {arg.value}\n    call print_number_thunk\n    push {newline_label}\n    call print_thunk\n"
-        }
+        emitter.text(f"    push dword {arg.value}\n    call print_number_thunk\n    push {newline_label}\n    call print_thunk\n")
+    elif arg.value_type == "string":
+        emitter.text(f"    push eax\n    call print_thunk\n    push {newline_label}\n    call print_thunk\n")
     else:
         # For other expressions, assume result is in eax
-        return {
-            "data": f"{newline_label}: db 0x0A,0\n",
-            "text": f"    push eax\n    call print_number_thunk\n    push {newline_label}\n    call print_thunk\n"
-        }
\ No newline at end of file
+        emitter.text(f"    push eax\n    call print_number_thunk\n    push {newline_label}\n    call print_thunk\n")
\ No newline at end of file
@@ -1,4 +1,5 @@
 import importlib.util
+import mmap
 import os
 import sys
 
@@ -6,28 +7,180 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from lexer import Lexer
 from parser import Parser, Node
+from arena import AstArena
+from astcache import AstCache, cache_dir_for
+from emitter import Emitter, unescape
+from dispatch import emit_string_dispatch, emit_integer_dispatch
+from inliner import Inliner
+from inference import TypeInference
+from optimizer import ConstantFolder, prune_functions, to_i32
+from frame import FrameLayout
+from peephole import Peephole
+from strength import multiply_sequence, divide_sequence, format_sequence
+from passes import PassManager
+from lower import Lowering
+from backend import X86Backend
+from iropt import simplify_cfg, local_value_numbering
 from linker import link
 
+OPT_LEVELS = (0, 1, 2)
+
+# Registers for expression temporaries, eax first so results land where
+# statements and command plugins expect them. All four have a byte
+# register for setcc. ebx is callee-saved, so a function that writes it
+# saves it (see gen_function), and a function keeping a local in it
+# leaves it out.
+REGISTERS = ('eax', 'ecx', 'edx', 'ebx')
+BYTE_REGISTERS = {'eax': 'al', 'ecx': 'cl', 'edx': 'dl', 'ebx': 'bl'}
+CALL_NEED = len(REGISTERS) + 1
+# Registers a function has to give back to its caller as it found them
+CALLEE_SAVED = ('ebx', 'esi', 'edi')
+# Registers carrying the first arguments of a fastcall user function
+FASTCALL_REGISTERS = ('ecx', 'edx')
+# Functions called from the kernel, which keep the stack convention
+EXTERNAL_FUNCTIONS = ('main',)
+
+JCC = {
+    'EQUAL': 'je',
+    'NOT_EQUAL': 'jne',
+    'GREATER': 'jg',
+    'GREATER_EQUAL': 'jge',
+    'LESS': 'jl',
+    'LESS_EQUAL': 'jle',
+}
+INVERSE_CONDITION = {
+    'EQUAL': 'NOT_EQUAL',
+    'NOT_EQUAL': 'EQUAL',
+    'GREATER': 'LESS_EQUAL',
+    'GREATER_EQUAL': 'LESS',
+    'LESS': 'GREATER_EQUAL',
+    'LESS_EQUAL': 'GREATER',
+}
+
+SETCC = {
+    'EQUAL': 'sete',
+    'NOT_EQUAL': 'setne',
+    'GREATER': 'setg',
+    'GREATER_EQUAL': 'setge',
+    'LESS': 'setl',
+    'LESS_EQUAL': 'setle',
+}
+DEFAULT_OPT_LEVEL = 0
+
 class Compiler:
-    def __init__(self, source_file):
+    def __init__(self, source_file, compact_ast=False, use_cache=True, opt_level=DEFAULT_OPT_LEVEL, inline=True, dump_ir=False, fastcall=False):
         # Check if file has .rx extension
         if not source_file.endswith('.rx'):
             raise Exception(f"Error: Only .rx files are supported. '{source_file}' is not a valid source file.")
         
         self.source_file = source_file
-        self.generated_text_asm = ""
-        self.generated_data_asm = ""
-        self.generated_bss_asm = ""
+        self.emitter = Emitter()
         self.output_type = 'bin'
         self.variables = {}
         self.stack_offset = 0
+        # FrameLayout of the function being generated at -O1, the home
+        # registers of its locals in scope, the registers left for
+        # expressions, every register it has written and the text chunks
+        # reserved for restoring the callee-saved ones on each way out.
+        # Frameless leaf functions have no ebp frame; ret is the
+        # instruction that returns from the function.
+        self.frame = None
+        self.homes = {}
+        self.registers = REGISTERS
+        self.written = set()
+        self.restores = []
+        self.framed = True
+        self.ret = "ret\n"
+        # User functions by name, the one being generated at -O1, the label
+        # its self tail calls jump to, and every tail call converted so far
+        self.functions = {}
+        self.function = None
+        self.tail_label = None
+        self.tail_calls = []
+        # (continue label, break label) of each loop around the statement
+        # being generated
+        self.loops = []
+        # Common subexpressions removed by the IR pass, over all functions
+        self.eliminated = 0
+        # TypeInference results, for the argument types command plugins see
+        self.types = TypeInference()
         self.label_counter = 0
         self.commands_cache = {}
+        # Pack the AST into an AstArena before code generation
+        self.compact_ast = compact_ast
+        # Reuse the parsed AST from the .rachet_cache next to the source
+        # file when the source is unchanged
+        self.use_cache = use_cache
+        # -O0 generates code straight from the parsed AST; -O1 folds
+        # constants and drops unreachable functions and kernel routines
+        # first, keeps expression temporaries in registers and
+        # runs the peephole pass over the assembly; -O2 goes through the
+        # three-address IR (lower.py, backend.py) with its own passes
+        if opt_level not in OPT_LEVELS:
+            raise Exception(f"Unsupported optimization level {opt_level}")
+        self.opt_level = opt_level
+        # Inline small functions at -O1
+        self.inline = inline
+        # Print each function's IR after the IR passes
+        self.dump_ir = dump_ir
+        # At -O1, pass the first arguments of leaf functions in registers
+        # and have the callee pop the rest (see is_fastcall). The -O2
+        # backend keeps every value in the frame, so it gains nothing there.
+        self.fastcall = fastcall and opt_level == 1
+        self.leaves = {}
+        self.passes = PassManager(opt_level)
+        self.register_passes()
+
+    def register_passes(self):
+        """The optimization pipeline: AST passes rewrite the Program node
+        in place, IR passes one ir.Function at a time, asm passes the text
+        section"""
+        if self.inline:
+            self.passes.register('ast', 'inline', self.inline_pass)
+        self.passes.register('ast', 'fold', lambda ast: ConstantFolder().fold(ast))
+        # After inlining and folding, so calls that were inlined or sit in
+        # pruned branches do not count
+        self.passes.register('ast', 'prune', self.prune_pass)
+        self.passes.register('ir', 'simplify-cfg', simplify_cfg, level=2)
+        # After merging blocks, so value numbering sees longer blocks
+        self.passes.register('ir', 'cse', self.cse_pass, level=2)
+        self.passes.register('asm', 'peephole', self.peephole_pass)
+
+    def inline_pass(self, ast):
+        inliner = Inliner()
+        ast = inliner.inline(ast)
+        if inliner.inlined:
+            print(f"   Inlined {inliner.inlined} call sites")
+        return ast
+
+    def prune_pass(self, ast):
+        dropped = prune_functions(ast)
+        if dropped:
+            print(f"   Pruned {len(dropped)} unreachable functions ({', '.join(dropped)})")
+        return ast
+
+    def cse_pass(self, function):
+        self.eliminated += local_value_numbering(function)
+        return function
+
+    def peephole_pass(self, text):
+        peephole = Peephole()
+        text = peephole.optimize(text)
+        if peephole.hits:
+            counts = ", ".join(f"{name} {count}" for name, count in peephole.hits.most_common())
+            print(f"   Peephole: {sum(peephole.hits.values())} rewrites ({counts})")
+        return text
 
     def get_unique_label(self, prefix="label"):
         self.label_counter += 1
         return f"{prefix}_{self.label_counter}"
 
+    def reserve_locals(self, frame):
+        """Fill the chunk reserved after the -O0 prologue with one sub esp
+        for every local of the function, now that they are all known"""
+        if self.stack_offset:
+            self.emitter.fill(frame, f"sub esp, {self.stack_offset}\n")
+
     def load_command(self, command_name):
         """Load command from commands subfolder"""
         if command_name in self.commands_cache:
@@ -51,19 +204,50 @@ class Compiler:
 
     def run(self):
         try:
-            with open(self.source_file, 'r') as f:
-                source_code = f.read()
+            source_file = open(self.source_file, 'rb')
         except FileNotFoundError:
             print(f"Error: Source file '{self.source_file}' not found.")
             return
 
-        print("1. Lexing source code...")
-        lexer = Lexer(source_code)
-        tokens = lexer.tokenize()
+        # Map the file instead of reading it into one big string; the lexer
+        # streams tokens straight into the parser, so neither the source
+        # text nor the token list is ever copied in full
+        with source_file:
+            if os.fstat(source_file.fileno()).st_size == 0:
+                source_code = b""  # mmap cannot map an empty file
+            else:
+                source_code = mmap.mmap(source_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+            try:
+                cache = AstCache(cache_dir_for(self.source_file)) if self.use_cache else None
+                cache_key = cache.key(source_code) if cache else None
+                arena = cache.load(cache_key) if cache else None
+                if arena is not None:
+                    print("1-2. Source unchanged, loaded AST from cache...")
+                    ast = None
+                else:
+                    print("1. Lexing source code...")
+                    lexer = Lexer(source_code)
+                    tokens = lexer.iter_tokens()
+
+                    print("2. Parsing tokens into AST...")
+                    parser = Parser(tokens)
+                    ast = parser.parse()
+            finally:
+                if isinstance(source_code, mmap.mmap):
+                    source_code.close()
 
-        print("2. Parsing tokens into AST...")
-        parser = Parser(tokens)
-        ast = parser.parse()
+        if ast is not None and cache:
+            cache.store(cache_key, AstArena.from_node(ast))
+        if self.passes.enabled('ast'):
+            # AST passes rewrite Node trees in place
+            if ast is None:
+                ast = arena.to_node()
+            ast = self.passes.run('ast', ast)
+        if self.compact_ast:
+            ast = arena.root() if ast is None else AstArena.from_node(ast).root()
+        elif ast is None:
+            ast = arena.to_node()
 
         # Check for use statement to determine output type
         for child in ast.children:
@@ -71,32 +255,58 @@ class Compiler:
                 self.output_type = child.value
                 break
         
+        self.types = TypeInference().infer(ast)
+
         print("3. Generating assembly code from AST...")
-        self.codegen(ast)
-        
+        if self.opt_level >= 2:
+            self.gen_program_ir(ast)
+        else:
+            self.passes.time('codegen', self.codegen, ast)
+
+        size, distinct, uses = self.emitter.data_size()
+        if uses:
+            print(f"   Data: {size} bytes of strings in .rodata ({distinct} distinct of {uses} used)")
+
+        if self.tail_calls:
+            print(f"   Tail calls: {len(self.tail_calls)} turned into jumps ({', '.join(self.tail_calls)})")
+
+        if self.eliminated:
+            print(f"   CSE: {self.eliminated} common subexpressions eliminated")
+
+        if self.passes.enabled('asm'):
+            self.emitter.replace('text', self.passes.run('asm', self.emitter.getvalue('text')))
+        print(f"   Pass timings: {self.passes.report()}")
+
         print(f"4. Linking and creating main.{self.output_type}...")
-        link(self.generated_data_asm, self.generated_text_asm, self.output_type, self.generated_bss_asm)
+        link(self.emitter, self.output_type, prune=self.opt_level >= 1)
 
     def codegen(self, node):
         if node.type == 'Program':
+            self.functions = {child.value: child for child in node.children if child.type == 'FunctionDeclaration'}
             for child in node.children:
                 self.codegen(child)
+        elif node.type == 'FunctionDeclaration' and self.opt_level >= 1:
+            self.gen_function(node)
         elif node.type == 'FunctionDeclaration':
-            self.generated_text_asm += f"global {node.value}\n{node.value}:\n"
+            self.emitter.text(f"global {node.value}\n{node.value}:\n")
+            self.function = node
             if node.value == 'main':
-                self.generated_text_asm += "push ebp\nmov ebp, esp\n"
+                self.emitter.text("push ebp\nmov ebp, esp\n")
+                frame = self.emitter.reserve()
                 old_stack_offset = self.stack_offset
                 old_variables = self.variables.copy()
                 self.stack_offset = 0
                 self.variables = {}
                 self.codegen(node.children[0])
-                self.generated_text_asm += "mov esp, ebp\npop ebp\nret\n"
+                self.reserve_locals(frame)
+                self.emitter.text("mov esp, ebp\npop ebp\nret\n")
                 self.stack_offset = old_stack_offset
                 self.variables = old_variables
             else:
                 # Handle function parameters
                 params = node.children[1:] if len(node.children) > 1 else []
-                self.generated_text_asm += "push ebp\nmov ebp, esp\n"
+                self.emitter.text("push ebp\nmov ebp, esp\n")
+                frame = self.emitter.reserve()
                 
                 old_stack_offset = self.stack_offset
                 old_variables = self.variables.copy()
@@ -109,174 +319,198 @@ class Compiler:
                     param_offset += 4
                 
                 self.codegen(node.children[0])
-                self.generated_text_asm += "mov esp, ebp\npop ebp\nret\n"
+                self.reserve_locals(frame)
+                self.emitter.text("mov esp, ebp\npop ebp\nret\n")
                 
                 self.stack_offset = old_stack_offset
                 self.variables = old_variables
+            self.function = None
         elif node.type == 'Block':
             for statement in node.children:
                 self.codegen(statement)
+        elif node.type == 'VariableDeclaration' and self.frame is not None:
+            self.codegen(node.children[0])
+            offset = self.frame.offset(node)
+            register = self.frame.register(node)
+            if register is not None:
+                self.emitter.text(f"mov {register}, eax\n")
+                self.homes[node.value] = register
+                self.written.add(register)
+            else:
+                self.emitter.text(f"mov dword [ebp{offset:+d}], eax\n")
+                self.homes.pop(node.value, None)
+            self.variables[node.value] = offset
         elif node.type == 'VariableDeclaration':
             var_name = node.value
-            self.stack_offset += 4
-            self.variables[var_name] = -self.stack_offset
             
             # Generate code for the expression
             self.codegen(node.children[0])
             
-            # Store result in variable
-            self.generated_text_asm += f"sub esp, 4\nmov dword [ebp{self.variables[var_name]}], eax\n"
+            if var_name in self.variables:
+                # Variables live in one frame per function, so a let of a
+                # name that already has a place stores there
+                self.emitter.text(f"mov dword [ebp{self.variables[var_name]:+d}], eax\n")
+            else:
+                # reserve_locals makes room for the slot on entry
+                self.stack_offset += 4
+                self.variables[var_name] = -self.stack_offset
+                
+                # Store result in variable
+                self.emitter.text(f"mov dword [ebp{self.variables[var_name]}], eax\n")
+        elif node.type == 'IfStatement' and self.opt_level >= 1:
+            else_label = self.get_unique_label("else")
+            self.gen_condition(node.children[0], else_label, False)
+            self.codegen(node.children[1])
+            if len(node.children) > 2:
+                end_label = self.get_unique_label("endif")
+                self.emitter.text(f"jmp {end_label}\n{else_label}:\n")
+                self.codegen(node.children[2])
+                self.emitter.text(f"{end_label}:\n")
+            else:
+                self.emitter.text(f"{else_label}:\n")
         elif node.type == 'IfStatement':
             else_label = self.get_unique_label("else")
             end_label = self.get_unique_label("endif")
             
             # Generate condition
             self.codegen(node.children[0])
-            self.generated_text_asm += f"test eax, eax\njz {else_label}\n"
+            self.emitter.text(f"test eax, eax\njz {else_label}\n")
             
             # Generate then block
             self.codegen(node.children[1])
-            self.generated_text_asm += f"jmp {end_label}\n{else_label}:\n"
+            self.emitter.text(f"jmp {end_label}\n{else_label}:\n")
             
             # Generate else block if present
             if len(node.children) > 2:
                 self.codegen(node.children[2])
             
-            self.generated_text_asm += f"{end_label}:\n"
+            self.emitter.text(f"{end_label}:\n")
+        elif node.type == 'WhileStatement' and self.opt_level >= 1:
+            self.gen_while(node)
+        elif node.type == 'WhileStatement':
+            top_label = self.get_unique_label("while")
+            next_label = self.get_unique_label("while_next")
+            end_label = self.get_unique_label("while_end")
+            
+            self.emitter.text(f"{top_label}:\n")
+            self.codegen(node.children[0])
+            self.emitter.text(f"test eax, eax\njz {end_label}\n")
+            
+            self.loops.append((next_label, end_label))
+            self.codegen(node.children[1])
+            self.loops.pop()
+            
+            # continue lands here, on the step of a for loop if any
+            self.emitter.text(f"{next_label}:\n")
+            if len(node.children) > 2:
+                self.codegen(node.children[2])
+            self.emitter.text(f"jmp {top_label}\n{end_label}:\n")
+        elif node.type in ('BreakStatement', 'ContinueStatement'):
+            continue_label, break_label = self.loops[-1]
+            self.emitter.text(f"jmp {break_label if node.type == 'BreakStatement' else continue_label}\n")
+        elif node.type == 'MatchStatement' and self.opt_level >= 1:
+            self.gen_match(node)
         elif node.type == 'MatchStatement':
             var_expr = node.children[0]
             end_label = self.get_unique_label("match_end")
             
             # Generate code to get the variable value
             self.codegen(var_expr)
-            self.generated_text_asm += "push eax\n"  # Save the string pointer
+            self.emitter.text("push eax\n")  # Save the string pointer
             
             for i, case in enumerate(node.children[1:]):
                 next_case_label = self.get_unique_label(f"next_case_{i}")
                 
-                # Create string literal for comparison
-                case_str_label = self.get_unique_label("case_str")
-                
-                # Convert case value to null-terminated string
-                case_string = f'"{case.value}",0'
-                self.generated_data_asm += f"{case_str_label}: db {case_string}\n"
-                
-                # Compare strings
-                self.generated_text_asm += f"mov eax, [esp]\n"  # Get saved string pointer
-                self.generated_text_asm += f"push dword {case_str_label}\n"
-                self.generated_text_asm += f"push eax\n"
-                self.generated_text_asm += f"call string_compare\n"
-                self.generated_text_asm += f"add esp, 8\n"
-                self.generated_text_asm += f"test eax, eax\n"
-                self.generated_text_asm += f"jz {next_case_label}\n"
+                if isinstance(case.value, int):
+                    # Number arm: compare the saved value directly
+                    self.emitter.text(f"cmp dword [esp], {case.value}\n")
+                    self.emitter.text(f"jne {next_case_label}\n")
+                else:
+                    # String literal for comparison, from the string pool
+                    case_str_label = self.string_label(case.value)
+                    
+                    # Compare strings
+                    self.emitter.text(f"mov eax, [esp]\n")  # Get saved string pointer
+                    self.emitter.text(f"push dword {case_str_label}\n")
+                    self.emitter.text(f"push eax\n")
+                    self.emitter.text(f"call string_compare\n")  # Pops its own arguments
+                    self.emitter.text(f"test eax, eax\n")
+                    self.emitter.text(f"jz {next_case_label}\n")
                 
                 # Execute case action - clean up stack first
-                self.generated_text_asm += f"add esp, 4\n"  # Remove saved pointer
+                self.emitter.text(f"add esp, 4\n")  # Remove saved pointer
                 self.codegen(case.children[0])
-                self.generated_text_asm += f"jmp {end_label}\n"
+                self.emitter.text(f"jmp {end_label}\n")
                 
-                self.generated_text_asm += f"{next_case_label}:\n"
+                self.emitter.text(f"{next_case_label}:\n")
             
             # Clean up stack if no match
-            self.generated_text_asm += f"add esp, 4\n"
-            self.generated_text_asm += f"{end_label}:\n"
+            self.emitter.text(f"add esp, 4\n")
+            self.emitter.text(f"{end_label}:\n")
+        elif node.type in ('BinaryOp', 'UnaryOp') and self.opt_level >= 1:
+            self.gen_expression(node)
+        elif node.type == 'BinaryOp' and node.value in ('AND', 'OR'):
+            # Short-circuit: the right side only runs if it decides the result
+            done_label = self.get_unique_label(f"{node.value.lower()}_done")
+            self.codegen(node.children[0])
+            self.emitter.text(f"test eax, eax\n{'jz' if node.value == 'AND' else 'jnz'} {done_label}\n")
+            self.codegen(node.children[1])
+            self.emitter.text(f"{done_label}:\ntest eax, eax\nsetnz al\nmovzx eax, al\n")
         elif node.type == 'BinaryOp':
             self.codegen(node.children[0])
-            self.generated_text_asm += "push eax\n"
+            self.emitter.text("push eax\n")
             self.codegen(node.children[1])
-            self.generated_text_asm += "mov ebx, eax\npop eax\n"
+            self.emitter.text("mov ebx, eax\npop eax\n")
             
             if node.value == 'PLUS':
-                self.generated_text_asm += "add eax, ebx\n"
+                self.emitter.text("add eax, ebx\n")
             elif node.value == 'MINUS':
-                self.generated_text_asm += "sub eax, ebx\n"
+                self.emitter.text("sub eax, ebx\n")
             elif node.value == 'MULTIPLY':
-                self.generated_text_asm += "imul eax, ebx\n"
+                self.emitter.text("imul eax, ebx\n")
             elif node.value == 'DIVIDE':
-                self.generated_text_asm += "cdq\nidiv ebx\n"
+                self.emitter.text("cdq\nidiv ebx\n")
             elif node.value == 'EQUAL':
-                self.generated_text_asm += "cmp eax, ebx\nsete al\nmovzx eax, al\n"
+                self.emitter.text("cmp eax, ebx\nsete al\nmovzx eax, al\n")
             elif node.value == 'NOT_EQUAL':
-                self.generated_text_asm += "cmp eax, ebx\nsetne al\nmovzx eax, al\n"
+                self.emitter.text("cmp eax, ebx\nsetne al\nmovzx eax, al\n")
             elif node.value == 'GREATER':
-                self.generated_text_asm += "cmp eax, ebx\nsetg al\nmovzx eax, al\n"
+                self.emitter.text("cmp eax, ebx\nsetg al\nmovzx eax, al\n")
             elif node.value == 'GREATER_EQUAL':
-                self.generated_text_asm += "cmp eax, ebx\nsetge al\nmovzx eax, al\n"
+                self.emitter.text("cmp eax, ebx\nsetge al\nmovzx eax, al\n")
             elif node.value == 'LESS':
-                self.generated_text_asm += "cmp eax, ebx\nsetl al\nmovzx eax, al\n"
+                self.emitter.text("cmp eax, ebx\nsetl al\nmovzx eax, al\n")
             elif node.value == 'LESS_EQUAL':
-                self.generated_text_asm += "cmp eax, ebx\nsetle al\nmovzx eax, al\n"
-            elif node.value == 'AND':
-                and_false_label = self.get_unique_label("and_false")
-                and_done_label = self.get_unique_label("and_done")
-                self.generated_text_asm += f"test eax, eax\njz {and_false_label}\ntest ebx, ebx\njz {and_false_label}\nmov eax, 1\njmp {and_done_label}\n{and_false_label}:\nxor eax, eax\n{and_done_label}:\n"
-            elif node.value == 'OR':
-                or_true_label = self.get_unique_label("or_true")
-                or_done_label = self.get_unique_label("or_done")
-                self.generated_text_asm += f"test eax, eax\njnz {or_true_label}\ntest ebx, ebx\njnz {or_true_label}\nxor eax, eax\njmp {or_done_label}\n{or_true_label}:\nmov eax, 1\n{or_done_label}:\n"
+                self.emitter.text("cmp eax, ebx\nsetle al\nmovzx eax, al\n")
         elif node.type == 'UnaryOp':
             if node.value == 'NOT':
                 self.codegen(node.children[0])
-                self.generated_text_asm += "test eax, eax\nsetz al\nmovzx eax, al\n"
+                self.emitter.text("test eax, eax\nsetz al\nmovzx eax, al\n")
         elif node.type == 'Number':
-            self.generated_text_asm += f"mov eax, {node.value}\n"
+            self.emitter.text(f"mov eax, {node.value}\n")
         elif node.type == 'Variable':
-            if node.value in self.variables:
-                offset = self.variables[node.value]
-                self.generated_text_asm += f"mov eax, dword [ebp{offset:+d}]\n"
-            else:
-                raise Exception(f"Undefined variable: {node.value}")
+            self.emitter.text(f"mov eax, {self.variable_operand(node.value)}\n")
         elif node.type == 'StringLiteral':
-            # Create a string in the data section
-            string_label = self.get_unique_label("str")
-            # Convert string to bytes, handling escape sequences
-            char_bytes = []
-            value = node.value.strip('"')  # Remove surrounding quotes if present
-            i = 0
-            while i < len(value):
-                char = value[i]
-                if char == '\\' and i + 1 < len(value):
-                    next_char = value[i + 1]
-                    if next_char == 'n':
-                        char_bytes.append('10')  # newline
-                        i += 2
-                        continue
-                    elif next_char == 't':
-                        char_bytes.append('9')   # tab
-                        i += 2
-                        continue
-                    elif next_char == '\\':
-                        char_bytes.append('92')  # backslash
-                        i += 2
-                        continue
-                    elif next_char == '"':
-                        char_bytes.append('34')  # quote
-                        i += 2
-                        continue
-                
-                if char == "'":
-                    char_bytes.append('39')
-                elif ord(char) >= 32 and ord(char) <= 126:
-                    char_bytes.append(f"'{char}'")
-                else:
-                    char_bytes.append(str(ord(char)))
-                i += 1
-            
-            char_bytes.append('0')  # null terminator
-            char_string = ', '.join(char_bytes)
-            
-            self.generated_data_asm += f"{string_label}: db {char_string}\n"
-            self.generated_text_asm += f"mov eax, {string_label}\n"
+            self.emitter.text(f"mov eax, {self.string_label(node.value)}\n")
         elif node.type == 'FunctionCall':
             command_name = node.value
             
             # Try to load command from commands subfolder
             command_module = self.load_command(command_name)
-            if command_module and hasattr(command_module, 'compile'):
+            if command_module and (hasattr(command_module, 'emit') or hasattr(command_module, 'compile')):
                 try:
+                    # Plugins expect an expression argument's value in eax
+                    if node.children and node.children[0].type not in ('Number', 'Variable', 'StringLiteral'):
+                        self.codegen(node.children[0])
+
                     # Prepare arguments for command
                     command_args = []
                     for arg in node.children:
+                        if arg.type == 'Variable' and arg.value in self.homes:
+                            # Plugins address variables in memory, so copy
+                            # the register back to the slot first
+                            offset = self.variables[arg.value]
+                            self.emitter.text(f"mov dword [ebp{offset:+d}], {self.homes[arg.value]}\n")
                         # Create a simple argument object
                         class SimpleArg:
                             def __init__(self, arg_node, compiler_ref):
@@ -289,47 +523,570 @@ class Compiler:
                                     self.asm = str(arg_node.value)
                                 else:
                                     self.asm = "eax"  # Default
+                                # 'i32', 'string', or None when unknown
+                                self.value_type = compiler_ref.value_type(arg_node)
                         
                         command_args.append(SimpleArg(arg, self))
                     
-                    result = command_module.compile(command_args)
-                    if result:
-                        self.generated_data_asm += result.get("data", "")
-                        self.generated_text_asm += result.get("text", "")
-                        if "bss" in result:
-                            self.generated_bss_asm += result.get("bss", "")
+                    self.run_command(command_name, command_module, command_args)
                 except Exception as e:
                     print(f"Warning: Error compiling command '{command_name}': {e}")
+            elif self.frame is not None:
+                self.gen_call(node)
             else:
                 # Try to call user-defined function
                 try:
                     # Push arguments in reverse order
                     for arg in reversed(node.children):
                         self.codegen(arg)
-                        self.generated_text_asm += "push eax\n"
+                        self.emitter.text("push eax\n")
                     
                     # Call function
-                    self.generated_text_asm += f"call {command_name}\n"
+                    self.emitter.text(f"call {command_name}\n")
                     
                     # Clean up stack
                     if node.children:
-                        self.generated_text_asm += f"add esp, {len(node.children) * 4}\n"
+                        self.emitter.text(f"add esp, {len(node.children) * 4}\n")
                 except Exception as e:
                     print(f"Warning: Could not generate call for function '{command_name}': {e}")
+        elif node.type == 'ReturnStatement' and self.frame is not None and self.is_tail_call(node.children[0]):
+            self.gen_tail_call(node.children[0])
+        elif node.type == 'ReturnStatement' and self.frame is not None:
+            self.codegen(node.children[0])
+            self.gen_leave()
+            self.emitter.text(self.ret)
         elif node.type == 'ReturnStatement':
             if node.children:
                 self.codegen(node.children[0])
             # eax already contains the return value
-            self.generated_text_asm += "mov esp, ebp\npop ebp\nret\n"
+            self.emitter.text("mov esp, ebp\npop ebp\nret\n")
+
+    def run_command(self, command_name, command_module, command_args):
+        """Have a command plugin emit its code for the given arguments"""
+        try:
+            if hasattr(command_module, 'emit'):
+                command_module.emit(command_args, self.emitter)
+            else:
+                # Older commands return their code as a dict of sections
+                result = command_module.compile(command_args)
+                if result:
+                    for section in Emitter.SECTIONS:
+                        self.emitter.emit(section, result.get(section, ""))
+        except Exception as e:
+            print(f"Warning: Error compiling command '{command_name}': {e}")
+
+    def gen_program_ir(self, ast):
+        """-O2 code generation: each function is lowered to IR, run
+        through the IR passes and handed to the x86 backend"""
+        self.functions = {child.value: child for child in ast.children if child.type == 'FunctionDeclaration'}
+        backend = X86Backend(self)
+        for node in self.functions.values():
+            self.function = node
+            function = self.passes.time('lower', Lowering(self).lower, node)
+            function = self.passes.run('ir', function)
+            if self.dump_ir:
+                print(function.dump())
+            self.passes.time('x86', backend.emit_function, function)
+        self.function = None
+
+    def value_type(self, node):
+        """Static type of an expression in the current function, or None"""
+        if self.function is None:
+            return None
+        return self.types.type_of(node, self.function.value)
+
+    def gen_function(self, node):
+        """Function with its frame laid out up front: one sub esp for all
+        locals, parameters above ebp (after the fastcall ones), and the
+        hottest locals in registers. A fastcall leaf function that fits
+        entirely in registers gets no frame at all.
+
+        Which callee-saved registers need saving is only known once the
+        body is generated (ebx may be used for expressions), so the saves
+        and every restore are reserved chunks filled in at the end. The
+        saves sit below the locals, at fixed offsets from ebp."""
+        emitter = self.emitter
+        emitter.text(f"global {node.value}\n{node.value}:\n")
+        self.function = node
+        params = node.children[1:]
+        registers = self.param_registers(node.value)
+        leaf = self.is_fastcall(node.value)
+        self.frame = FrameLayout(node, registers, leaf)
+        self.variables = {}
+        self.homes = {}
+        self.written = set()
+        self.restores = []
+        homes = set(self.frame.registers.values())
+        self.registers = tuple(reg for reg in REGISTERS if reg not in homes)
+        self.framed = not (leaf and self.frame.size == 0 and len(params) <= len(registers))
+        pops = self.callee_pops(node.value)
+        self.ret = f"ret {pops}\n" if pops else "ret\n"
+        if self.framed:
+            emitter.text("push ebp\nmov ebp, esp\n")
+            if self.frame.size:
+                emitter.text(f"sub esp, {self.frame.size}\n")
+        saves = emitter.reserve()
+        self.tail_label = None
+        if self.calls_self_in_tail(node.children[0], node.value):
+            self.tail_label = self.get_unique_label(f"{node.value}_tail")
+            emitter.text(f"{self.tail_label}:\n")
+        for i, param in enumerate(params):
+            register = self.frame.register(param)
+            if i < len(registers):
+                # Arrived in a register; keep it there, or move it to its
+                # home register or slot
+                self.variables[param.value] = self.frame.offset(param)
+                if register is None:
+                    emitter.text(f"mov dword [ebp{self.variables[param.value]:+d}], {registers[i]}\n")
+                elif register != registers[i]:
+                    emitter.text(f"mov {register}, {registers[i]}\n")
+            else:
+                self.variables[param.value] = 8 + (i - len(registers)) * 4
+                if register is not None:
+                    emitter.text(f"mov {register}, dword [ebp{self.variables[param.value]:+d}]\n")
+            if register is not None:
+                self.homes[param.value] = register
+                self.written.add(register)
+        self.codegen(node.children[0])
+        self.gen_leave()
+        emitter.text(self.ret)
+        saved = [reg for reg in CALLEE_SAVED if reg in self.written]
+        emitter.fill(saves, ''.join(f"push {reg}\n" for reg in saved))
+        if self.framed:
+            restore = ''.join(f"mov {reg}, dword [ebp-{self.frame.size + 4 * (i + 1)}]\n" for i, reg in enumerate(saved))
+        else:
+            restore = ''.join(f"pop {reg}\n" for reg in reversed(saved))
+        for index in self.restores:
+            emitter.fill(index, restore)
+        self.frame = None
+        self.function = None
+        self.variables = {}
+        self.homes = {}
+        self.registers = REGISTERS
+        self.framed = True
+        self.ret = "ret\n"
+
+    def gen_leave(self):
+        """Everything before the ret or jmp that leaves a function at -O1:
+        restore the callee-saved registers (reserved, see gen_function)
+        and drop the frame"""
+        self.restores.append(self.emitter.reserve())
+        if self.framed:
+            self.emitter.text("mov esp, ebp\npop ebp\n")
+
+    def is_fastcall(self, name):
+        """True if user function name takes its first arguments in
+        registers. Only leaf functions do: they can keep them there, while
+        any other function would have to store them to survive its calls."""
+        if not self.fastcall or name in EXTERNAL_FUNCTIONS or name not in self.functions:
+            return False
+        if name not in self.leaves:
+            self.leaves[name] = self.is_leaf(self.functions[name].children[0], name)
+        return self.leaves[name]
+
+    def param_registers(self, name):
+        """Registers the first arguments of user function name arrive in"""
+        if not self.is_fastcall(name):
+            return ()
+        return FASTCALL_REGISTERS[:len(self.functions[name].children) - 1]
+
+    def callee_pops(self, name):
+        """Bytes of stack arguments user function name removes with ret N
+        (fastcall); under the stack convention the caller removes them"""
+        if not self.is_fastcall(name):
+            return 0
+        return (len(self.functions[name].children) - 1 - len(self.param_registers(name))) * 4
+
+    def is_leaf(self, node, name):
+        """True if node calls nothing and has no string match, whose
+        dispatch calls string_compare. Returning a call to name itself
+        with every argument is fine: it becomes a jump."""
+        if node.type == 'ReturnStatement' and node.children[0].type == 'FunctionCall':
+            call = node.children[0]
+            if call.value == name and len(call.children) == len(self.functions[name].children) - 1:
+                return all(self.is_leaf(arg, name) for arg in call.children)
+        if node.type == 'FunctionCall':
+            return False
+        if node.type == 'MatchStatement' and not all(isinstance(case.value, int) for case in node.children[1:]):
+            return False
+        return all(self.is_leaf(child, name) for child in node.children)
+
+    def gen_call(self, node):
+        """Call a user function at -O1: stack arguments are pushed last to
+        first, then the fastcall ones are loaded into their registers.
+        Parameters a fastcall call leaves out are still pushed (as 0),
+        since the callee pops them."""
+        emit = self.emitter.text
+        name = node.value
+        args = node.children
+        registers = self.param_registers(name)
+        in_registers = min(len(args), len(registers))
+        stack_args = len(args) - in_registers
+        padding = 0
+        if self.is_fastcall(name):
+            padding = max(self.callee_pops(name) // 4 - stack_args, 0)
+        for _ in range(padding):
+            emit("push dword 0\n")
+        deferred = []
+        for i in reversed(range(len(args))):
+            arg = args[i]
+            if arg.type in ('Number', 'Variable', 'StringLiteral'):
+                # Nothing to evaluate: loaded once the rest are done, or
+                # pushed straight from where it is
+                if i < in_registers:
+                    deferred.append(i)
+                elif arg.type == 'Variable':
+                    emit(f"push {self.variable_operand(arg.value)}\n")
+                else:
+                    emit(f"push dword {arg.value if arg.type == 'Number' else self.string_label(arg.value)}\n")
+                continue
+            self.codegen(arg)
+            emit("push eax\n")
+        for i in range(in_registers):
+            if i not in deferred:
+                emit(f"pop {registers[i]}\n")
+        for i in deferred:
+            self.gen_into(args[i], [registers[i]], {})
+        emit(f"call {name}\n")
+        leftover = (stack_args + padding) * 4 - self.callee_pops(name)
+        if leftover:
+            emit(f"add esp, {leftover}\n")
+
+    def calls_self_in_tail(self, node, name):
+        if node.type == 'ReturnStatement':
+            call = node.children[0]
+            return call.type == 'FunctionCall' and call.value == name and self.is_tail_call(call)
+        return any(self.calls_self_in_tail(child, name) for child in node.children)
+
+    def is_tail_call(self, node):
+        """True if a returned call can reuse the current frame: a user
+        function taking no more stack arguments than the current one has
+        slots. A callee that pops its own arguments (fastcall) has to pop
+        exactly what our caller expects us to."""
+        if node.type != 'FunctionCall' or node.value not in self.functions:
+            return False
+        name = self.function.value
+        stack_args = len(node.children) - len(self.param_registers(node.value))
+        own = len(self.function.children) - 1 - len(self.param_registers(name))
+        if self.is_fastcall(node.value):
+            if len(node.children) != len(self.functions[node.value].children) - 1:
+                return False
+            return stack_args * 4 == self.callee_pops(name)
+        return stack_args <= own and self.callee_pops(name) == 0
+
+    def gen_tail_call(self, node):
+        """return f(args) without growing the stack: the arguments replace
+        the current ones in place, then a jump instead of a call. A self
+        call restarts the body; any other call tears down this frame first,
+        so the callee returns straight to our caller."""
+        emit = self.emitter.text
+        registers = self.param_registers(node.value)
+        # Every argument is evaluated before any slot is overwritten
+        for arg in reversed(node.children):
+            self.gen_expression(arg)
+            emit("push eax\n")
+        for i in range(len(node.children)):
+            if i < len(registers):
+                emit(f"pop {registers[i]}\n")
+            else:
+                emit(f"pop dword [ebp+{8 + (i - len(registers)) * 4}]\n")
+        if node.value == self.function.value:
+            emit(f"jmp {self.tail_label}\n")
+        else:
+            self.gen_leave()
+            emit(f"jmp {node.value}\n")
+        self.tail_calls.append(f"{self.function.value} -> {node.value}")
+
+    def gen_while(self, node):
+        """Loop with its test at the bottom, so an iteration costs one
+        conditional jump. The condition is generated first, where it sits
+        in program order, then moved after the body (and the step, which
+        continue jumps to)."""
+        emit = self.emitter.text
+        body_label = self.get_unique_label("loop")
+        test_label = self.get_unique_label("loop_test")
+        end_label = self.get_unique_label("loop_end")
+        step_label = self.get_unique_label("loop_step") if len(node.children) > 2 else test_label
+        mark = self.emitter.mark()
+        self.gen_condition(node.children[0], body_label, True)
+        test = self.emitter.cut(mark)
+        emit(f"jmp {test_label}\n{body_label}:\n")
+        self.loops.append((step_label, end_label))
+        self.codegen(node.children[1])
+        self.loops.pop()
+        if len(node.children) > 2:
+            emit(f"{step_label}:\n")
+            self.codegen(node.children[2])
+        emit(f"{test_label}:\n{test}{end_label}:\n")
+
+    def gen_match(self, node):
+        """Match with compile-time dispatch over the case values instead of
+        one comparison per arm: a trie for strings, a jump table or binary
+        search for integers"""
+        end_label = self.get_unique_label("match_end")
+        cases = node.children[1:]
+        numeric = [isinstance(case.value, int) for case in cases]
+        if any(numeric) and not all(numeric):
+            raise Exception("Match arms mix numbers and strings")
+        self.codegen(node.children[0])
+        # First match wins, so a repeated case value never runs its body
+        arms = {}
+        for case in cases:
+            key = to_i32(case.value) if isinstance(case.value, int) else unescape(case.value).encode('utf-8')
+            if key not in arms:
+                arms[key] = (self.get_unique_label("case"), case)
+        dispatch = emit_integer_dispatch if all(numeric) and cases else emit_string_dispatch
+        dispatch(self, [(key, label) for key, (label, _) in arms.items()], end_label)
+        for label, case in arms.values():
+            self.emitter.text(f"{label}:\n")
+            self.codegen(case.children[0])
+            self.emitter.text(f"jmp {end_label}\n")
+        self.emitter.text(f"{end_label}:\n")
+
+    def string_label(self, value):
+        """Label of a string literal in the shared string pool"""
+        return self.emitter.string_literal(value)
+
+    def register_need(self, node, needs):
+        """Sethi-Ullman number: registers needed to evaluate node without
+        spilling. Calls clobber every register, so a subtree containing
+        one needs more than there are."""
+        node_type = node.type
+        if node_type == 'BinaryOp':
+            left = self.register_need(node.children[0], needs)
+            right = self.register_need(node.children[1], needs)
+            if self.direct_operand(node.children[1], node.value):
+                right = 0
+            if node.value in ('AND', 'OR') and self.has_effects(node.children[1]):
+                # Evaluated as two separate conditions, see gen_condition
+                need = max(left, right)
+            else:
+                need = max(left, right) if left != right else left + 1
+        elif node_type == 'UnaryOp':
+            need = self.register_need(node.children[0], needs)
+        elif node_type == 'FunctionCall':
+            need = CALL_NEED
+        else:
+            need = 1
+        needs[node] = need
+        return need
+
+    def direct_operand(self, node, op):
+        """Source operand for a Number or Variable used directly in an
+        instruction, or None if it has to be loaded into a register"""
+        if op in ('AND', 'OR'):
+            return None
+        if node.type == 'Number':
+            # idiv has no immediate form, but most constant divisors are
+            # strength reduced by gen_divide
+            if op == 'DIVIDE' and divide_sequence(node.value) is None:
+                return None
+            return str(node.value)
+        if node.type == 'Variable':
+            return self.variable_operand(node.value)
+        return None
+
+    def variable_operand(self, name):
+        """Home register or dword memory operand of a variable"""
+        if name not in self.variables:
+            raise Exception(f"Undefined variable: {name}")
+        if name in self.homes:
+            return self.homes[name]
+        return f"dword [ebp{self.variables[name]:+d}]"
+
+    def gen_expression(self, node, registers=None):
+        """Evaluate an expression into registers[0] (eax by default, which
+        is what statements and command plugins expect), using only the
+        given registers (those not holding locals by default) and spilling
+        to the stack when they run out"""
+        needs = {}
+        self.register_need(node, needs)
+        self.gen_into(node, list(registers or self.registers), needs)
+
+    def gen_into(self, node, regs, needs):
+        emit = self.emitter.text
+        target = regs[0]
+        self.written.add(target)
+        node_type = node.type
+        if node_type == 'Number':
+            emit(f"mov {target}, {node.value}\n")
+        elif node_type == 'Variable':
+            emit(f"mov {target}, {self.variable_operand(node.value)}\n")
+        elif node_type == 'StringLiteral':
+            emit(f"mov {target}, {self.string_label(node.value)}\n")
+        elif node_type == 'UnaryOp':
+            self.gen_into(node.children[0], regs, needs)
+            if node.value == 'NOT':
+                emit(f"test {target}, {target}\nsetz {BYTE_REGISTERS[target]}\nmovzx {target}, {BYTE_REGISTERS[target]}\n")
+        elif node_type == 'BinaryOp' and node.value in ('AND', 'OR') and self.has_effects(node.children[1]):
+            # The right side may only run if the left does not decide the
+            # result, so compute the value with jumps
+            false_label = self.get_unique_label("false")
+            done_label = self.get_unique_label("done")
+            self.gen_condition(node, false_label, False, regs, needs)
+            emit(f"mov {target}, 1\njmp {done_label}\n{false_label}:\nxor {target}, {target}\n{done_label}:\n")
+        elif node_type == 'BinaryOp':
+            operand = self.gen_operands(node, regs, needs)
+            self.gen_binary(node.value, target, operand, regs)
+        else:
+            # Calls and anything else leave their result in eax
+            self.codegen(node)
+            if target != 'eax':
+                emit(f"mov {target}, eax\n")
+
+    def has_effects(self, node):
+        """True if evaluating node can call a function or fault (divide)"""
+        if node.type == 'FunctionCall' or (node.type == 'BinaryOp' and node.value == 'DIVIDE'):
+            return True
+        return any(self.has_effects(child) for child in node.children)
+
+    def gen_condition(self, node, target, when, regs=None, needs=None):
+        """Jump to target if node's truth value equals when, else fall
+        through. Comparisons branch on the flags directly; && and || stop
+        as soon as the result is known."""
+        emit = self.emitter.text
+        regs = list(regs or self.registers)
+        if needs is None:
+            needs = {}
+            self.register_need(node, needs)
+        if node.type == 'BinaryOp' and node.value in JCC:
+            operand = self.gen_operands(node, regs, needs)
+            jump = JCC[node.value] if when else JCC[INVERSE_CONDITION[node.value]]
+            emit(f"cmp {regs[0]}, {operand}\n{jump} {target}\n")
+        elif node.type == 'BinaryOp' and node.value in ('AND', 'OR'):
+            left, right = node.children
+            # && jumps out on the first false, || on the first true
+            decided = node.value == 'OR'
+            if when == decided:
+                self.gen_condition(left, target, when, regs, needs)
+                self.gen_condition(right, target, when, regs, needs)
+            else:
+                skip = self.get_unique_label("skip")
+                self.gen_condition(left, skip, decided, regs, needs)
+                self.gen_condition(right, target, when, regs, needs)
+                emit(f"{skip}:\n")
+        elif node.type == 'UnaryOp' and node.value == 'NOT':
+            self.gen_condition(node.children[0], target, not when, regs, needs)
+        elif node.type == 'Number':
+            if bool(node.value) == when:
+                emit(f"jmp {target}\n")
+        else:
+            self.gen_into(node, regs, needs)
+            emit(f"test {regs[0]}, {regs[0]}\n{'jnz' if when else 'jz'} {target}\n")
+
+    def gen_operands(self, node, regs, needs):
+        """Evaluate a BinaryOp's left side into regs[0] and return the
+        operand (register, immediate or memory) holding its right side"""
+        emit = self.emitter.text
+        target = regs[0]
+        left, right = node.children
+        operand = self.direct_operand(right, node.value)
+        if operand is not None:
+            self.gen_into(left, regs, needs)
+        elif needs[right] > needs[left] and needs[left] < len(regs):
+            # Right side first while it has every register, then the
+            # left side into the remaining ones
+            self.gen_into(right, [regs[1], target] + regs[2:], needs)
+            self.gen_into(left, [target] + regs[2:], needs)
+            operand = regs[1]
+        elif needs[right] < len(regs):
+            self.gen_into(left, regs, needs)
+            self.gen_into(right, regs[1:], needs)
+            operand = regs[1]
+        else:
+            # Out of registers: park the left value on the stack
+            self.gen_into(left, regs, needs)
+            emit(f"push {target}\n")
+            self.gen_into(right, regs, needs)
+            emit(f"mov {regs[1]}, {target}\npop {target}\n")
+            operand = regs[1]
+        return operand
+
+    def gen_binary(self, op, target, operand, regs):
+        """target = target <op> operand"""
+        emit = self.emitter.text
+        low = BYTE_REGISTERS[target]
+        if op == 'PLUS':
+            emit(f"add {target}, {operand}\n")
+        elif op == 'MINUS':
+            emit(f"sub {target}, {operand}\n")
+        elif op == 'MULTIPLY':
+            sequence = multiply_sequence(int(operand), target) if is_immediate(operand) else None
+            emit(format_sequence(sequence) if sequence is not None else f"imul {target}, {operand}\n")
+        elif op == 'DIVIDE':
+            self.gen_divide(target, operand, regs)
+        elif op in SETCC:
+            emit(f"cmp {target}, {operand}\n{SETCC[op]} {low}\nmovzx {target}, {low}\n")
+        elif op == 'AND':
+            other = BYTE_REGISTERS[operand]
+            emit(f"test {target}, {target}\nsetnz {low}\ntest {operand}, {operand}\nsetnz {other}\nand {low}, {other}\nmovzx {target}, {low}\n")
+        elif op == 'OR':
+            emit(f"or {target}, {operand}\nsetnz {low}\nmovzx {target}, {low}\n")
+
+    def gen_divide(self, target, divisor, regs):
+        """idiv works on edx:eax, so borrow them; anything a caller still
+        holds in eax or edx is saved around the division. A constant
+        divisor gets a shift or multiply sequence instead, which also
+        borrows ecx."""
+        emit = self.emitter.text
+        sequence = divide_sequence(int(divisor)) if is_immediate(divisor) else None
+        scratch = ('eax', 'edx') if sequence is None else ('eax', 'ecx', 'edx')
+        saved = [reg for reg in scratch if reg not in regs]
+        for reg in saved:
+            emit(f"push {reg}\n")
+        if divisor in ('eax', 'edx'):
+            # Move the divisor out of the way of cdq/idiv
+            emit(f"push {divisor}\n")
+            divisor = "dword [esp]"
+        if target != 'eax':
+            emit(f"mov eax, {target}\n")
+        if sequence is not None:
+            emit(format_sequence(sequence))
+        else:
+            emit(f"cdq\nidiv {divisor}\n")
+        if divisor == "dword [esp]":
+            emit("add esp, 4\n")
+        if target != 'eax':
+            emit(f"mov {target}, eax\n")
+        for reg in reversed(saved):
+            emit(f"pop {reg}\n")
+
+def is_immediate(operand):
+    return operand.lstrip('-').isdigit()
+
+def parse_args(args):
+    """Split command line arguments into the source file and Compiler options"""
+    source_file = None
+    options = {}
+    for arg in args:
+        if arg == '--compact-ast':
+            options['compact_ast'] = True
+        elif arg == '--no-cache':
+            options['use_cache'] = False
+        elif arg == '--no-inline':
+            options['inline'] = False
+        elif arg == '--dump-ir':
+            options['dump_ir'] = True
+        elif arg == '--fastcall':
+            options['fastcall'] = True
+        elif arg.startswith('-O') and arg[2:].isdigit():
+            options['opt_level'] = int(arg[2:])
+        elif arg.startswith('-'):
+            raise Exception(f"Unknown option '{arg}'")
+        else:
+            source_file = arg
+    return source_file, options
 
 if __name__ == '__main__':
     if len(sys.argv) < 2:
-        print("Usage: python compiler.py <source_file.rx>")
+        print("Usage: python compiler.py <source_file.rx> [-O<level>] [--compact-ast] [--no-cache] [--no-inline] [--dump-ir] [--fastcall]")
         sys.exit(1)
         
-    source_file = sys.argv[1]
     try:
-        compiler = Compiler(source_file)
+        source_file, options = parse_args(sys.argv[1:])
+        if source_file is None:
+            raise Exception("No source file given")
+        compiler = Compiler(source_file, **options)
         compiler.run()
     except Exception as e:
         print(f"Compilation error: {e}")
@@ -0,0 +1,102 @@
+# Decision code for match statements. Each function emits the dispatch only;
+# the caller emits the case bodies at the labels it passes in.
+
+# A single remaining candidate with at most this many bytes left (including
+# the terminator) is checked inline instead of calling string_compare
+INLINE_COMPARE_BYTES = 4
+# Switches with more arms than this become a binary search
+LINEAR_SWITCH_ARMS = 3
+# Integer matches with at least this many arms, covering at least half of
+# the range between the smallest and largest value, use a jump table
+JUMP_TABLE_MIN_ARMS = 4
+JUMP_TABLE_MIN_DENSITY = 0.5
+
+def emit_integer_dispatch(compiler, cases, no_match, register='eax'):
+    """Jump to the label of the case equal to register (clobbering it).
+
+    cases is a list of distinct (int, label). Dense value sets index a
+    bounds-checked jump table in .rodata; sparse ones get a balanced
+    binary search of compares.
+    """
+    arms = sorted(cases)
+    if not arms:
+        compiler.emitter.text(f"jmp {no_match}\n")
+        return
+    low, high = arms[0][0], arms[-1][0]
+    span = high - low + 1
+    if len(arms) < JUMP_TABLE_MIN_ARMS or len(arms) < span * JUMP_TABLE_MIN_DENSITY:
+        emit_switch(compiler, register, arms, no_match)
+        return
+    emit = compiler.emitter.text
+    table = compiler.get_unique_label("jump_table")
+    targets = dict(arms)
+    entries = [targets.get(value, no_match) for value in range(low, high + 1)]
+    compiler.emitter.emit('rodata', f"{table}: dd {', '.join(entries)}\n")
+    if low != 0:
+        emit(f"sub {register}, {low}\n")
+    # Unsigned compare also sends values below low (now negative) to no_match
+    emit(f"cmp {register}, {span - 1}\nja {no_match}\njmp [{table} + {register}*4]\n")
+
+def emit_string_dispatch(compiler, cases, no_match, pointer='eax'):
+    """Jump to the label of the case equal to the string at pointer.
+
+    cases is a list of distinct (string bytes without terminator, label).
+    The cases are arranged in a trie over the bytes at [pointer+depth], so
+    the cost grows with the string length and log of the arm count rather
+    than with the number of arms. Once one candidate is left, the rest of it
+    is verified with at most one string_compare call.
+    """
+    if cases:
+        emit_trie(compiler, [(data + b'\0', label) for data, label in cases], 0, no_match, pointer)
+    else:
+        compiler.emitter.text(f"jmp {no_match}\n")
+
+def emit_trie(compiler, cases, depth, no_match, pointer):
+    emit = compiler.emitter.text
+    if len(cases) == 1:
+        data, label = cases[0]
+        remaining = data[depth:]
+        if len(remaining) <= INLINE_COMPARE_BYTES:
+            for offset, byte in enumerate(remaining, depth):
+                emit(f"cmp byte [{pointer}+{offset}], {byte}\njne {no_match}\n")
+        else:
+            literal = compiler.emitter.string(data[:-1].decode('utf-8'))
+            emit(f"push dword {literal}\npush {pointer}\ncall string_compare\n")
+            emit(f"test eax, eax\njz {no_match}\n")
+        emit(f"jmp {label}\n")
+        return
+    groups = {}
+    for data, label in cases:
+        groups.setdefault(data[depth], []).append((data, label))
+    arms = []
+    for byte in sorted(groups):
+        group = groups[byte]
+        if byte == 0:
+            # Every earlier byte matched and this is the terminator
+            arms.append((byte, group[0][1]))
+        else:
+            arms.append((byte, compiler.get_unique_label("trie")))
+    emit(f"movzx ecx, byte [{pointer}+{depth}]\n")
+    emit_switch(compiler, 'ecx', arms, no_match)
+    for byte, label in arms:
+        if byte != 0:
+            emit(f"{label}:\n")
+            emit_trie(compiler, groups[byte], depth + 1, no_match, pointer)
+
+def emit_switch(compiler, register, arms, default):
+    """Compare register against the sorted (value, label) arms, jumping to
+    the matching label or to default: a compare chain for a few arms, a
+    balanced binary search otherwise"""
+    emit = compiler.emitter.text
+    if len(arms) <= LINEAR_SWITCH_ARMS:
+        for value, label in arms:
+            emit(f"cmp {register}, {value}\nje {label}\n")
+        emit(f"jmp {default}\n")
+        return
+    middle = len(arms) // 2
+    value, label = arms[middle]
+    upper = compiler.get_unique_label("switch_upper")
+    emit(f"cmp {register}, {value}\nje {label}\njg {upper}\n")
+    emit_switch(compiler, register, arms[:middle], default)
+    emit(f"{upper}:\n")
+    emit_switch(compiler, register, arms[middle + 1:], default)
@@ -0,0 +1,126 @@
+ESCAPES = {'n': '\n', 't': '\t', '\\': '\\', '"': '"'}
+
+def unescape(literal):
+    """Text of a string literal token: surrounding quotes removed and
+    \\n, \\t, \\\\ and \\" escapes resolved"""
+    value = literal.strip('"')
+    chars = []
+    i = 0
+    while i < len(value):
+        if value[i] == '\\' and i + 1 < len(value) and value[i + 1] in ESCAPES:
+            chars.append(ESCAPES[value[i + 1]])
+            i += 2
+        else:
+            chars.append(value[i])
+            i += 1
+    return ''.join(chars)
+
+def db_bytes(data):
+    """NASM db operands for data: printable runs quoted, other bytes as numbers"""
+    parts = []
+    run = []
+    for byte in data:
+        if 32 <= byte <= 126 and byte != ord('"'):
+            run.append(chr(byte))
+            continue
+        if run:
+            parts.append(f'"{"".join(run)}"')
+            run = []
+        parts.append(str(byte))
+    if run:
+        parts.append(f'"{"".join(run)}"')
+    return ','.join(parts)
+
+class Emitter:
+    """Collects generated assembly as lists of chunks, one list per section.
+
+    Appending is O(1); the sections are only joined (or written out) once,
+    when the program is complete. Section order and headers match what
+    linker.link has always written after the kernel.
+
+    String constants go through string(), a pool shared by codegen and the
+    command plugins: every distinct string gets one label in .rodata no
+    matter how often it is used.
+    """
+    SECTIONS = ('data', 'rodata', 'bss', 'text')
+
+    def __init__(self):
+        self.chunks = {name: [] for name in self.SECTIONS}
+        self.strings = {}  # encoded bytes -> label
+        self.string_uses = 0
+        self.rodata_size = 0
+
+    def string(self, value):
+        """Label of a null-terminated copy of value in .rodata"""
+        data = value.encode('utf-8') + b'\0'
+        self.string_uses += 1
+        label = self.strings.get(data)
+        if label is None:
+            label = self.strings[data] = f"lit_{len(self.strings)}"
+            self.chunks['rodata'].append(f"{label}: db {db_bytes(data)}\n")
+            self.rodata_size += len(data)
+        return label
+
+    def string_literal(self, literal):
+        """string() for the text of a StringLiteral token"""
+        return self.string(unescape(literal))
+
+    def data_size(self):
+        """(bytes, distinct strings, literal uses) of the string pool"""
+        return self.rodata_size, len(self.strings), self.string_uses
+
+    def emit(self, section, code):
+        if code:
+            self.chunks[section].append(code)
+
+    def text(self, code):
+        self.chunks['text'].append(code)
+
+    def reserve(self):
+        """Index of an empty text chunk, for code only known later"""
+        self.chunks['text'].append('')
+        return len(self.chunks['text']) - 1
+
+    def fill(self, index, code):
+        self.chunks['text'][index] = code
+
+    def mark(self):
+        """Position in the text section, for cut()"""
+        return len(self.chunks['text'])
+
+    def cut(self, mark):
+        """Remove and return the text emitted since mark, so it can be
+        emitted again further on"""
+        code = ''.join(self.chunks['text'][mark:])
+        del self.chunks['text'][mark:]
+        return code
+
+    def data(self, code):
+        self.chunks['data'].append(code)
+
+    def bss(self, code):
+        self.chunks['bss'].append(code)
+
+    def replace(self, section, code):
+        """Swap a whole section for rewritten code, e.g. after a peephole pass"""
+        self.chunks[section] = [code] if code else []
+
+    def getvalue(self, section):
+        """Join one section into a single string"""
+        return ''.join(self.chunks[section])
+
+    def is_empty(self, section):
+        """True if the section holds nothing but whitespace"""
+        return not any(chunk.strip() for chunk in self.chunks[section])
+
+    def write(self, f):
+        """Write every section, with its header, to an open text file"""
+        for section in self.SECTIONS:
+            # Data, rodata and bss are left out entirely when empty; text
+            # always gets a header
+            if section != 'text' and self.is_empty(section):
+                continue
+            f.write(f"section .{section}\n")
+            f.writelines(self.chunks[section])
+            if section != 'text':
+                f.write("\n")
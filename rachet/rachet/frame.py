@@ -0,0 +1,150 @@
+# Callee-saved registers locals can live in, in order of preference. ebx
+# doubles as an expression register, so it is taken last.
+HOME_REGISTERS = ('esi', 'edi', 'ebx')
+# Reads plus writes a local needs before a register pays for saving and
+# restoring it. A variable passed straight to a call does not count: it is
+# pushed either way, and a command plugin needs it in memory.
+PROMOTE_MIN_USES = 4
+# A use inside a loop counts this many times per loop around it
+LOOP_WEIGHT = 8
+
+class FrameLayout:
+    """Stack slots for one function's locals, decided before codegen.
+
+    Every local gets a slot ([ebp-offset]) that it owns from the store
+    after its first declaration until the last Variable that reads it.
+    Variables live in one frame per function, so a later let of a name
+    that is already declared (or a parameter) stores into the same place.
+    A local used inside a loop owns its slot for the whole loop, since the
+    back edge reads it again. Slots whose owners are no longer live are
+    reused, so locals in disjoint if/else or match branches share space.
+    size is the frame size for a single sub esp in the prologue.
+
+    The most used locals and parameters also get a home register, most
+    uses first (a use in a loop counts LOOP_WEIGHT times), sharing a
+    register only with owners that are never live at the same time. They keep their slot, which codegen fills when a
+    command plugin needs the value in memory.
+
+    register_params are the registers the first parameters arrive in
+    (fastcall); those parameters get a slot like a local. In a leaf
+    function nothing clobbers them, so they stay where they arrive, every
+    local that fits gets a register and only the rest get slots.
+    """
+    def __init__(self, function, register_params=(), leaf=False):
+        self.slots = {}  # VariableDeclaration or parameter node -> ebp offset
+        self.size = 0
+        self.position = 0
+        self.intervals = {}  # VariableDeclaration or parameter node -> [first, last]
+        self.uses = {}  # VariableDeclaration or parameter node -> reads and writes that a register speeds up
+        self.registers = {}  # VariableDeclaration or parameter node -> register
+        self.declared = {}  # name -> first VariableDeclaration or parameter
+        self.owners = {}  # later VariableDeclaration -> the node whose place it stores to
+        self.loops = []  # per enclosing loop, the nodes used inside it
+        self.params = function.children[1:]
+        self.register_params = register_params
+        self.leaf = leaf
+        for param in self.params:
+            self.intervals[param] = [0, 0]
+            self.uses[param] = 0
+            self.declared[param.value] = param
+        self.walk(function.children[0])
+        self.assign_registers()
+        self.allocate()
+
+    def walk(self, node, weight=1):
+        if node.type == 'VariableDeclaration':
+            for child in node.children:
+                self.walk(child)
+            self.position += 1
+            owner = self.declared.get(node.value)
+            if owner is None:
+                # Bound after its own expression, so let x = x + 1 reads
+                # the previous x
+                owner = self.declared[node.value] = node
+                self.intervals[node] = [self.position, self.position]
+                self.uses[node] = 0
+            else:
+                self.owners[node] = owner
+            self.use(owner, 1)
+            return
+        if node.type == 'Variable':
+            self.position += 1
+            owner = self.declared.get(node.value)
+            if owner is not None:
+                self.use(owner, weight)
+            return
+        if node.type == 'WhileStatement':
+            start = self.position
+            self.loops.append(set())
+            for child in node.children:
+                self.walk(child)
+            used = self.loops.pop()
+            for owner in used:
+                interval = self.intervals[owner]
+                interval[0] = min(interval[0], start)
+                interval[1] = max(interval[1], self.position)
+            if self.loops:
+                self.loops[-1].update(used)
+            return
+        for child in node.children:
+            self.walk(child, 0 if node.type == 'FunctionCall' else 1)
+
+    def use(self, owner, weight):
+        self.intervals[owner][1] = self.position
+        self.uses[owner] += weight * LOOP_WEIGHT ** len(self.loops)
+        if self.loops:
+            self.loops[-1].add(owner)
+
+    def allocate(self):
+        """Linear scan over the live intervals, lowest free slot first"""
+        free = []
+        active = []  # (last, offset)
+        for i, param in enumerate(self.params[len(self.register_params):]):
+            # Passed in by the caller, above ebp
+            self.slots[param] = 8 + i * 4
+        for node, (first, last) in sorted(self.intervals.items(), key=lambda item: item[1][0]):
+            if node in self.params[len(self.register_params):]:
+                continue
+            if self.leaf and node in self.registers:
+                continue
+            for entry in [entry for entry in active if entry[0] < first]:
+                active.remove(entry)
+                free.append(entry[1])
+            if free:
+                free.sort(reverse=True)
+                offset = free.pop()
+            else:
+                self.size += 4
+                offset = self.size
+            self.slots[node] = -offset
+            active.append((last, offset))
+
+    def assign_registers(self):
+        homes = HOME_REGISTERS
+        minimum = PROMOTE_MIN_USES
+        if self.leaf:
+            for param, register in zip(self.params, self.register_params):
+                self.registers[param] = register
+            if len(self.register_params) == 2:
+                # Leave expressions eax and ebx
+                homes = tuple(register for register in homes if register != 'ebx')
+            if len(self.params) <= len(self.register_params):
+                # Every local in a register means no frame at all
+                minimum = 1
+        owners = {register: [] for register in homes}
+        candidates = [node for node, uses in self.uses.items() if uses >= minimum and node not in self.registers]
+        for node in sorted(candidates, key=lambda node: -self.uses[node]):
+            first, last = self.intervals[node]
+            for register in homes:
+                if all(last < start or end < first for start, end in owners[register]):
+                    owners[register].append((first, last))
+                    self.registers[node] = register
+                    break
+
+    def offset(self, declaration):
+        """ebp offset of a declaration's slot, or None if it has none"""
+        return self.slots.get(self.owners.get(declaration, declaration))
+
+    def register(self, declaration):
+        """Home register of a declaration or parameter, or None"""
+        return self.registers.get(self.owners.get(declaration, declaration))
@@ -0,0 +1,100 @@
+I32 = 'i32'
+STRING = 'string'
+# A name bound to values of different types
+MIXED = 'mixed'
+
+# Annotation spellings the lexer accepts as TYPE tokens
+ANNOTATIONS = {'i32': I32, 'string': STRING, 'str': STRING}
+
+# Command plugins with a known result type
+COMMAND_TYPES = {'input': STRING}
+
+def join(a, b):
+    """Combine two facts about one value; None means nothing is known yet"""
+    if a is None:
+        return b
+    if b is None or a == b:
+        return a
+    return MIXED
+
+class TypeInference:
+    """Works out whether values are i32 numbers or string pointers.
+
+    Variables live in one frame per function with no block scope, so each
+    name gets a single type per function: the join of everything it is
+    ever bound to (lets, annotations, and for parameters the arguments at
+    every call site). Functions get the join of their return values.
+    The facts feed each other across functions, so the pass repeats until
+    nothing changes.
+
+    type_of() answers for one expression in one function, with None when
+    the type is unknown or mixed.
+    """
+    def __init__(self):
+        self.functions = {}
+        self.locals = {}  # function name -> {variable name -> type}
+        self.returns = {}  # function name -> type
+        self.changed = False
+
+    def infer(self, ast):
+        self.functions = {child.value: child for child in ast.children if child.type == 'FunctionDeclaration'}
+        for name in self.functions:
+            self.locals[name] = {}
+        self.changed = True
+        while self.changed:
+            self.changed = False
+            for name, function in self.functions.items():
+                self.statement(function.children[0], name)
+        return self
+
+    def type_of(self, node, function):
+        value_type = self.expression(node, function, record=False)
+        return None if value_type == MIXED else value_type
+
+    def bind(self, table, name, value_type):
+        joined = join(table.get(name), value_type)
+        if joined != table.get(name):
+            table[name] = joined
+            self.changed = True
+
+    def statement(self, node, function):
+        node_type = node.type
+        if node_type == 'VariableDeclaration':
+            value_type = self.expression(node.children[0], function)
+            for child in node.children[1:]:
+                if child.type == 'Type':
+                    value_type = ANNOTATIONS.get(child.value, MIXED)
+            self.bind(self.locals[function], node.value, value_type)
+        elif node_type == 'ReturnStatement':
+            if node.children:
+                self.bind(self.returns, function, self.expression(node.children[0], function))
+        elif node_type in ('Block', 'IfStatement', 'MatchStatement', 'MatchCase', 'WhileStatement'):
+            for child in node.children:
+                self.statement(child, function)
+        else:
+            self.expression(node, function)
+
+    def expression(self, node, function, record=True):
+        """Type of an expression; with record, arguments of user function
+        calls are bound to the callee's parameters on the way"""
+        node_type = node.type
+        if node_type == 'Number':
+            return I32
+        elif node_type == 'StringLiteral':
+            return STRING
+        elif node_type == 'Variable':
+            return self.locals.get(function, {}).get(node.value)
+        elif node_type in ('BinaryOp', 'UnaryOp'):
+            for child in node.children:
+                self.expression(child, function, record)
+            return I32
+        elif node_type == 'FunctionCall':
+            arg_types = [self.expression(arg, function, record) for arg in node.children]
+            callee = self.functions.get(node.value)
+            if callee is None:
+                return COMMAND_TYPES.get(node.value, MIXED)
+            if record:
+                for param, arg_type in zip(callee.children[1:], arg_types):
+                    self.bind(self.locals[node.value], param.value, arg_type)
+            return self.returns.get(node.value)
+        return MIXED
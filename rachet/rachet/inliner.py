@@ -0,0 +1,231 @@
+from parser import Node
+
+# Functions whose body has more nodes than this are never inlined
+INLINE_MAX_NODES = 40
+
+def count_nodes(node):
+    return 1 + sum(count_nodes(child) for child in node.children)
+
+def copy_tree(node, rename):
+    """Deep copy of node with the Variable and VariableDeclaration names in
+    rename replaced"""
+    value = node.value
+    if node.type in ('Variable', 'VariableDeclaration') and value in rename:
+        value = rename[value]
+    return Node(node.type, value, [copy_tree(child, rename) for child in node.children])
+
+def has_effects(node):
+    """True if evaluating node can call something or fault (divide)"""
+    if node.type == 'FunctionCall' or (node.type == 'BinaryOp' and node.value == 'DIVIDE'):
+        return True
+    return any(has_effects(child) for child in node.children)
+
+class Inliner:
+    """Replaces calls to small, non-recursive user functions with their body.
+
+    Runs on the Node tree before ConstantFolder, so constant arguments fold
+    through the inlined code. Functions are handled callees first, so a
+    function whose own calls were all inlined can be inlined in turn.
+
+    A function whose body is a single return is inlined into any
+    expression, with the arguments substituted for its parameters. Others,
+    whose only return is their last statement, are inlined where the call
+    is a whole statement, a let's value or a return's value: the arguments
+    become lets, the body's statements are spliced in before, and the
+    returned expression takes the call's place. Parameters and locals get
+    names the lexer cannot produce, so they never collide with the
+    caller's.
+    """
+    def __init__(self, max_nodes=INLINE_MAX_NODES):
+        self.max_nodes = max_nodes
+        self.functions = {}
+        self.recursive = set()
+        self.done = set()
+        self.inlined = 0
+
+    def inline(self, ast):
+        self.functions = {child.value: child for child in ast.children if child.type == 'FunctionDeclaration'}
+        self.recursive = {name for name in self.functions if self.reaches(name, name)}
+        for name in self.functions:
+            self.visit(name, set())
+        return ast
+
+    def visit(self, name, active):
+        """Inline into name's body after its callees; calls back into a
+        function still in active are recursion and stay calls"""
+        if name in self.done or name in active:
+            return
+        active.add(name)
+        function = self.functions[name]
+        for callee in self.callees(function.children[0]):
+            self.visit(callee, active)
+        active.discard(name)
+        function.children[0] = self.inline_statement(function.children[0])
+        self.done.add(name)
+
+    def reaches(self, start, name):
+        """True if start calls name, directly or through other functions"""
+        seen = set()
+        pending = [start]
+        while pending:
+            for callee in self.callees(self.functions[pending.pop()].children[0]):
+                if callee == name:
+                    return True
+                if callee not in seen:
+                    seen.add(callee)
+                    pending.append(callee)
+        return False
+
+    def callees(self, node):
+        found = []
+        if node.type == 'FunctionCall' and node.value in self.functions:
+            found.append(node.value)
+        for child in node.children:
+            found.extend(self.callees(child))
+        return found
+
+    def candidate(self, name, args):
+        """The FunctionDeclaration to inline for a call, or None"""
+        function = self.functions.get(name)
+        if function is None or name == 'main' or name in self.recursive or name not in self.done:
+            return None
+        params = [param.value for param in function.children[1:]]
+        if len(args) != len(params):
+            return None
+        body = function.children[0]
+        if count_nodes(body) > self.max_nodes or not self.resolves(body, set(params)):
+            return None
+        return function
+
+    def resolves(self, node, names):
+        """True if every Variable under node reads a parameter or an earlier
+        local (codegen would reject the function otherwise)"""
+        if node.type == 'Variable':
+            return node.value in names
+        for child in node.children:
+            if not self.resolves(child, names):
+                return False
+        if node.type == 'VariableDeclaration':
+            names.add(node.value)
+        return True
+
+    def returns(self, node):
+        if node.type == 'ReturnStatement':
+            return 1
+        return sum(self.returns(child) for child in node.children)
+
+    def inline_statement(self, node):
+        """Inline calls within one statement. Returns the statement, or a
+        Block when a call had to be spliced in as several statements."""
+        node_type = node.type
+        if node_type == 'Block':
+            statements = []
+            for statement in node.children:
+                statement = self.inline_statement(statement)
+                if statement.type == 'Block' and statement.value == 'inlined':
+                    statements.extend(statement.children)
+                else:
+                    statements.append(statement)
+            node.children = statements
+            return node
+        elif node_type == 'IfStatement':
+            node.children[0] = self.inline_expression(node.children[0])
+            node.children[1:] = [self.inline_statement(child) for child in node.children[1:]]
+            return node
+        elif node_type == 'WhileStatement':
+            # The condition is evaluated again on every iteration, so only
+            # single-return functions go into it
+            node.children[0] = self.inline_expression(node.children[0])
+            node.children[1:] = [self.inline_statement(child) for child in node.children[1:]]
+            return node
+        elif node_type == 'MatchStatement':
+            node.children[0] = self.inline_expression(node.children[0])
+            for case in node.children[1:]:
+                case.children[0] = self.inline_statement(case.children[0])
+            return node
+        elif node_type in ('VariableDeclaration', 'ReturnStatement'):
+            node.children[0] = self.inline_expression(node.children[0])
+            return self.splice(node, node.children[0])
+        node = self.inline_expression(node)
+        return self.splice(None, node)
+
+    def splice(self, statement, call):
+        """Replace a call that makes up a whole statement (statement is
+        None), a let's value or a return's value with the callee's body"""
+        unchanged = statement if statement is not None else call
+        function = self.candidate(call.value, call.children) if call.type == 'FunctionCall' else None
+        if function is None:
+            return unchanged
+        body = function.children[0]
+        last = body.children[-1] if body.children and body.children[-1].type == 'ReturnStatement' else None
+        if self.returns(body) != (last is not None):
+            # A return anywhere but at the end leaves the function early
+            return unchanged
+        if statement is not None and last is None:
+            # The caller wants a value the callee never returns
+            return unchanged
+        rename = self.renames(function, body)
+        self.inlined += 1
+        params = [param.value for param in function.children[1:]]
+        # Arguments were pushed (so evaluated) last to first
+        statements = [Node('VariableDeclaration', rename[param], [arg])
+                      for param, arg in reversed(list(zip(params, call.children)))]
+        tail = body.children[:-1] if last is not None else body.children
+        statements.extend(copy_tree(child, rename) for child in tail)
+        if last is not None:
+            result = copy_tree(last.children[0], rename)
+            if statement is None:
+                if has_effects(result):
+                    statements.append(result)
+            else:
+                statement.children[0] = result
+                statements.append(statement)
+        return Node('Block', 'inlined', statements)
+
+    def renames(self, function, body):
+        site = self.inlined
+        names = [param.value for param in function.children[1:]]
+        names.extend(self.declared(body))
+        return {name: f"{function.value}.{name}.{site}" for name in names}
+
+    def declared(self, node):
+        found = []
+        if node.type == 'VariableDeclaration':
+            found.append(node.value)
+        for child in node.children:
+            found.extend(self.declared(child))
+        return found
+
+    def inline_expression(self, node):
+        """Inline single-return functions into an expression tree"""
+        if node.children:
+            node.children = [self.inline_expression(child) for child in node.children]
+        if node.type != 'FunctionCall':
+            return node
+        function = self.candidate(node.value, node.children)
+        if function is None:
+            return node
+        body = function.children[0]
+        if len(body.children) != 1 or body.children[0].type != 'ReturnStatement':
+            return node
+        result = body.children[0].children[0]
+        params = [param.value for param in function.children[1:]]
+        uses = {param: self.uses(result, param) for param in params}
+        args = dict(zip(params, node.children))
+        for param, arg in args.items():
+            # Simple arguments can be copied anywhere; anything else must be
+            # evaluated exactly once and have nothing to reorder
+            if arg.type not in ('Number', 'Variable', 'StringLiteral') and (uses[param] != 1 or has_effects(arg)):
+                return node
+        self.inlined += 1
+        return self.substitute(result, args)
+
+    def uses(self, node, name):
+        if node.type == 'Variable':
+            return int(node.value == name)
+        return sum(self.uses(child, name) for child in node.children)
+
+    def substitute(self, node, args):
+        if node.type == 'Variable' and node.value in args:
+            return copy_tree(args[node.value], {})
+        return Node(node.type, node.value, [self.substitute(child, args) for child in node.children])
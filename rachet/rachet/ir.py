@@ -0,0 +1,188 @@
+# Three-address intermediate representation used at -O2.
+#
+# A Function is a list of BasicBlocks, each a run of Instrs ending in
+# exactly one terminator (jump, branch, switch, return or tailcall).
+# Operands are Temps (compiler temporaries, each assigned once), Vars
+# (named locals and parameters, which live in the frame), Consts and Strs.
+
+TERMINATORS = ('jump', 'branch', 'switch', 'return', 'tailcall')
+
+# Branch conditions and the condition that holds when they do not
+NEGATED = {
+    'EQUAL': 'NOT_EQUAL',
+    'NOT_EQUAL': 'EQUAL',
+    'GREATER': 'LESS_EQUAL',
+    'GREATER_EQUAL': 'LESS',
+    'LESS': 'GREATER_EQUAL',
+    'LESS_EQUAL': 'GREATER',
+}
+
+class Temp:
+    __slots__ = ('id', 'type')
+
+    def __init__(self, id, type=None):
+        self.id = id
+        self.type = type
+
+    def __repr__(self):
+        return f"t{self.id}"
+
+class Var:
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __eq__(self, other):
+        return isinstance(other, Var) and other.name == self.name
+
+    def __hash__(self):
+        return hash(('var', self.name))
+
+    def __repr__(self):
+        return self.name
+
+class Const:
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return isinstance(other, Const) and other.value == self.value
+
+    def __hash__(self):
+        return hash(('const', self.value))
+
+    def __repr__(self):
+        return str(self.value)
+
+class Str:
+    """A string literal, as its token text (quotes and escapes included)"""
+    __slots__ = ('literal',)
+
+    def __init__(self, literal):
+        self.literal = literal
+
+    def __eq__(self, other):
+        return isinstance(other, Str) and other.literal == self.literal
+
+    def __hash__(self):
+        return hash(('str', self.literal))
+
+    def __repr__(self):
+        return self.literal
+
+class Instr:
+    """One instruction: dest = op(args), with op-specific extra data.
+
+        copy      dest = args[0]
+        binary    dest = args[0] <extra> args[1]   (extra: BinaryOp name)
+        unary     dest = <extra> args[0]
+        call      dest = extra(args...)            (user function)
+        command   dest = extra.name(args...)       (command plugin; extra
+                                                    is a Command)
+        jump      goto extra
+        branch    if args[0] <extra[0]> args[1] goto extra[1] else extra[2]
+        switch    goto the label of args[0] in extra[0], else extra[1];
+                  extra[2] is 'int' or 'string'
+        return    return args[0]
+        tailcall  return extra(args...) reusing the caller's frame
+    """
+    __slots__ = ('op', 'dest', 'args', 'extra')
+
+    def __init__(self, op, dest=None, args=(), extra=None):
+        self.op = op
+        self.dest = dest
+        self.args = tuple(args)
+        self.extra = extra
+
+    def is_terminator(self):
+        return self.op in TERMINATORS
+
+    def targets(self):
+        """Labels this terminator can jump to"""
+        if self.op == 'jump':
+            return [self.extra]
+        if self.op == 'branch':
+            return [self.extra[1], self.extra[2]]
+        if self.op == 'switch':
+            return [label for _, label in self.extra[0]] + [self.extra[1]]
+        return []
+
+    def __repr__(self):
+        args = ', '.join(repr(arg) for arg in self.args)
+        if self.op == 'copy':
+            text = f"{args}"
+        elif self.op == 'binary':
+            text = f"{self.args[0]!r} {self.extra} {self.args[1]!r}"
+        elif self.op == 'unary':
+            text = f"{self.extra} {args}"
+        elif self.op in ('call', 'tailcall'):
+            text = f"{self.op} {self.extra}({args})"
+        elif self.op == 'command':
+            text = f"command {self.extra.name}({args})"
+        elif self.op == 'jump':
+            text = f"jump {self.extra}"
+        elif self.op == 'branch':
+            text = f"if {self.args[0]!r} {self.extra[0]} {self.args[1]!r} goto {self.extra[1]} else {self.extra[2]}"
+        elif self.op == 'switch':
+            arms = ', '.join(f"{key!r}: {label}" for key, label in self.extra[0])
+            text = f"switch {args} [{arms}] else {self.extra[1]}"
+        else:
+            text = f"{self.op} {args}"
+        return f"{self.dest!r} = {text}" if self.dest is not None else text
+
+class Command:
+    """A command plugin call: the module and, per argument, the parser node
+    type, node value and static type the plugin gets to see"""
+    __slots__ = ('name', 'module', 'nodes')
+
+    def __init__(self, name, module, nodes):
+        self.name = name
+        self.module = module
+        self.nodes = nodes
+
+class BasicBlock:
+    __slots__ = ('label', 'instrs')
+
+    def __init__(self, label):
+        self.label = label
+        self.instrs = []
+
+    def terminator(self):
+        return self.instrs[-1] if self.instrs and self.instrs[-1].is_terminator() else None
+
+    def successors(self):
+        terminator = self.terminator()
+        return terminator.targets() if terminator else []
+
+class Function:
+    def __init__(self, name, params):
+        self.name = name
+        self.params = params  # parameter names, first argument first
+        self.blocks = []
+        self.temps = 0
+
+    def new_temp(self, type=None):
+        self.temps += 1
+        return Temp(self.temps, type)
+
+    def predecessors(self):
+        """Label -> labels of the blocks that can jump to it"""
+        preds = {block.label: [] for block in self.blocks}
+        for block in self.blocks:
+            for label in block.successors():
+                preds[label].append(block.label)
+        return preds
+
+    def instructions(self):
+        for block in self.blocks:
+            yield from block.instrs
+
+    def dump(self):
+        lines = [f"function {self.name}({', '.join(self.params)})"]
+        for block in self.blocks:
+            lines.append(f"{block.label}:")
+            lines.extend(f"    {instr!r}" for instr in block.instrs)
+        return '\n'.join(lines)
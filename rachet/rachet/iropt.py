@@ -0,0 +1,109 @@
+from ir import Temp, Var, Const
+
+# Binary operators whose operands can be swapped
+COMMUTATIVE = ('PLUS', 'MULTIPLY', 'EQUAL', 'NOT_EQUAL', 'AND', 'OR')
+
+def retarget(instr, mapping):
+    """Point a terminator's jump targets through mapping"""
+    if instr.op == 'jump':
+        instr.extra = mapping.get(instr.extra, instr.extra)
+    elif instr.op == 'branch':
+        condition, true_label, false_label = instr.extra
+        instr.extra = (condition, mapping.get(true_label, true_label), mapping.get(false_label, false_label))
+    elif instr.op == 'switch':
+        cases, default, kind = instr.extra
+        instr.extra = ([(key, mapping.get(label, label)) for key, label in cases], mapping.get(default, default), kind)
+
+def simplify_cfg(function):
+    """Thread jumps through empty blocks, drop blocks that cannot be
+    reached and merge a block into its only predecessor when that
+    predecessor just jumps to it. The entry block always stays first,
+    since self tail calls jump back to it."""
+    entry = function.blocks[0].label
+    # A block holding nothing but a jump forwards to its target
+    forward = {}
+    for block in function.blocks[1:]:
+        if len(block.instrs) == 1 and block.instrs[0].op == 'jump' and block.instrs[0].extra != block.label:
+            forward[block.label] = block.instrs[0].extra
+    mapping = {}
+    for label in forward:
+        target, seen = label, set()
+        while target in forward and target not in seen:
+            seen.add(target)
+            target = forward[target]
+        mapping[label] = target
+    for block in function.blocks:
+        if block.terminator() is not None:
+            retarget(block.terminator(), mapping)
+
+    blocks = {block.label: block for block in function.blocks}
+    reached = {entry}
+    pending = [entry]
+    while pending:
+        for label in blocks[pending.pop()].successors():
+            if label not in reached:
+                reached.add(label)
+                pending.append(label)
+    function.blocks = [block for block in function.blocks if block.label in reached]
+
+    preds = function.predecessors()
+    merged = []
+    for block in function.blocks:
+        if merged and block.label != entry and preds[block.label] == [merged[-1].label]:
+            previous = merged[-1]
+            last = previous.terminator()
+            if last is not None and last.op == 'jump' and last.extra == block.label:
+                previous.instrs[-1:] = block.instrs
+                # Blocks that jumped from the merged block now come from previous
+                for label in block.successors():
+                    preds[label] = [previous.label if p == block.label else p for p in preds[label]]
+                continue
+        merged.append(block)
+    function.blocks = merged
+    return function
+
+def value_key(value, versions):
+    """Hashable name for an operand's value. A Var names a different
+    value after each copy into it, so its key carries the version."""
+    if isinstance(value, Temp):
+        return ('temp', value.id)
+    if isinstance(value, Var):
+        return ('var', value.name, versions.get(value, 0))
+    if isinstance(value, Const):
+        return ('const', value.value)
+    return ('str', value.literal)
+
+def local_value_numbering(function):
+    """Common subexpression elimination within basic blocks: each binary
+    or unary instruction is hash-consed on its operator and operand values,
+    and one that repeats an earlier instruction of the block is dropped,
+    its temp replaced by the earlier one everywhere. Every expression is
+    pure (a divide that faults did so the first time), and only copies
+    change Vars. Returns the number of instructions eliminated."""
+    replace = {}  # Temp -> earlier Temp holding the same value
+    eliminated = 0
+    for block in function.blocks:
+        versions = {}  # Var -> copies into it so far in this block
+        available = {}  # expression key -> Temp
+        kept = []
+        for instr in block.instrs:
+            instr.args = tuple(replace.get(arg, arg) for arg in instr.args)
+            if instr.op in ('binary', 'unary') and isinstance(instr.dest, Temp):
+                operands = [value_key(arg, versions) for arg in instr.args]
+                if instr.op == 'binary' and instr.extra in COMMUTATIVE:
+                    operands.sort()
+                key = (instr.op, instr.extra, tuple(operands))
+                if key in available:
+                    replace[instr.dest] = available[key]
+                    eliminated += 1
+                    continue
+                available[key] = instr.dest
+            elif instr.op == 'copy' and isinstance(instr.dest, Var):
+                versions[instr.dest] = versions.get(instr.dest, 0) + 1
+            kept.append(instr)
+        block.instrs = kept
+    # Temps can be read in later blocks (call arguments around a short
+    # circuit), so rewrite those reads too
+    for instr in function.instructions():
+        instr.args = tuple(replace.get(arg, arg) for arg in instr.args)
+    return eliminated
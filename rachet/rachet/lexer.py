@@ -1,100 +1,219 @@
 import re
+from array import array
+from bisect import bisect_right
+
+# Bump whenever the token stream for the same source can change; it is part
+# of the AST cache key
+LEXER_VERSION = 2
+
+class Source:
+    """Source text shared by every token of one lexer run.
+
+    Tokens only keep offsets into it. The table of line start offsets is
+    built the first time a line/column is asked for (usually an error), so
+    normal lexing pays nothing for it.
+    """
+    def __init__(self, text):
+        # text may be a str or any bytes-like object (bytes, mmap)
+        self.text = text
+        self.is_text = isinstance(text, str)
+        self.line_starts = None
+
+    def slice(self, start, end):
+        value = self.text[start:end]
+        return value if self.is_text else value.decode('utf-8')
+
+    def line_col(self, offset):
+        """Return the 1-based (line, column) of an offset"""
+        if self.line_starts is None:
+            newline = '\n' if self.is_text else b'\n'
+            self.line_starts = [0] + [m.end() for m in re.finditer(re.escape(newline), self.text)]
+        line = bisect_right(self.line_starts, offset)
+        return line, offset - self.line_starts[line - 1] + 1
 
 class Token:
-    def __init__(self, type, value=None):
+    # Tokens from the lexer store a span into their Source and slice the
+    # value out on demand; Token(type, value) still works for hand-built ones
+    __slots__ = ('type', 'start', 'end', 'source', '_value')
+
+    def __init__(self, type, value=None, start=None, end=None, source=None):
         self.type = type
-        self.value = value
+        self.start = start
+        self.end = end
+        self.source = source
+        self._value = value
+
+    @property
+    def value(self):
+        if self.source is None:
+            return self._value
+        return self.source.slice(self.start, self.end)
+
+    def line_col(self):
+        """Return the 1-based (line, column) of the token, or None if unknown"""
+        if self.source is None:
+            return None
+        return self.source.line_col(self.start)
+
     def __repr__(self):
         return f"Token({self.type}, {repr(self.value)})"
 
+class TokenTable:
+    """Token list stored as parallel columns: a kind id and a start/end offset
+    per token, about 9 bytes each. Token objects are only built on access."""
+    def __init__(self, source):
+        self.source = source
+        self.kinds = array('B')
+        self.starts = array('L')
+        self.ends = array('L')
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index):
+        return Token(TOKEN_TYPES[self.kinds[index]], start=self.starts[index], end=self.ends[index], source=self.source)
+
+    def __iter__(self):
+        for index in range(len(self.kinds)):
+            yield self[index]
+
+# Identifiers are matched once and looked up here, so keywords cost a dict
+# probe instead of one regex attempt each
+KEYWORDS = {
+    'use': 'USE',
+    'crate': 'CRATE',
+    'fn': 'FN',
+    'main': 'MAIN',
+    'let': 'LET',
+    'if': 'IF',
+    'else': 'ELSE',
+    'match': 'MATCH',
+    'while': 'WHILE',
+    'for': 'FOR',
+    'in': 'IN',
+    'break': 'BREAK',
+    'continue': 'CONTINUE',
+    'return': 'RETURN',
+    'not': 'NOT',
+    'input': 'INPUT',
+    'os': 'OS',
+    'print': 'PRINT',
+    'pause': 'PAUSE',
+    'shutdown': 'SHUTDOWN',
+    'i32': 'TYPE',
+    'string': 'TYPE',
+    'str': 'TYPE',
+    'iso': 'CRATE_NAME',
+    'bin': 'CRATE_NAME',
+}
+
+OPERATORS = {
+    '::': 'DOUBLE_COLON',
+    '..': 'DOT_DOT',
+    '>=': 'GREATER_EQUAL',
+    '<=': 'LESS_EQUAL',
+    '==': 'EQUAL',
+    '!=': 'NOT_EQUAL',
+    '&&': 'AND',
+    '||': 'OR',
+    '>': 'GREATER',
+    '<': 'LESS',
+    '=': 'ASSIGN',
+    '+': 'PLUS',
+    '-': 'MINUS',
+    '*': 'MULTIPLY',
+    '/': 'DIVIDE',
+    ':': 'COLON',
+    '(': 'LPAREN',
+    ')': 'RPAREN',
+    '{': 'LBRACE',
+    '}': 'RBRACE',
+    ';': 'SEMICOLON',
+    ',': 'COMMA',
+}
+
+# Every token type the lexer can produce, indexed by the ids TokenTable stores
+TOKEN_TYPES = sorted(set(KEYWORDS.values()) | set(OPERATORS.values()) | {'IDENTIFIER', 'STRING_LITERAL', 'NUMBER'})
+TOKEN_IDS = {token_type: index for index, token_type in enumerate(TOKEN_TYPES)}
+
+# One alternation tried left to right, built once at import. Python's re
+# takes the first alternative that matches, so this keeps the priority of
+# the old one-pattern-at-a-time loop (longer operators before shorter ones).
+TOKEN_PATTERN = '|'.join([
+    r'\b(?P<WORD>[a-zA-Z_][a-zA-Z0-9_]*)\b',
+    '(?P<OP>' + '|'.join(re.escape(op) for op in OPERATORS) + ')',
+    r'"(?P<STRING_LITERAL>.*?)"',
+    r'\b(?P<NUMBER>\d+)\b',
+    r'(?P<SKIP>#.*|\s+)',  # Comments and whitespace
+])
+TOKEN_REGEX = re.compile(TOKEN_PATTERN)
+# Same pattern for bytes-like sources such as an mmap-ed file
+BYTES_TOKEN_REGEX = re.compile(TOKEN_PATTERN.encode())
+
 class Lexer:
     def __init__(self, source_code):
+        # source_code may be a str or any bytes-like object (bytes, mmap)
         self.source_code = source_code
-        self.tokens = []
+        self.source = Source(source_code)
+        self.tokens = TokenTable(self.source)
         self.position = 0
 
     def tokenize(self):
-        patterns = [
-            # Keywords first to prevent greedy matches
-            (r'\buse\b', 'USE'),
-            (r'\b(crate)\b', 'CRATE'),
-            (r'\b(fn)\b', 'FN'),
-            (r'\b(main)\b', 'MAIN'),
-            (r'\b(let)\b', 'LET'),
-            (r'\b(if)\b', 'IF'),
-            (r'\b(else)\b', 'ELSE'),
-            (r'\b(match)\b', 'MATCH'),
-            (r'\b(return)\b', 'RETURN'),
-            (r'\b(not)\b', 'NOT'),
-            (r'\b(input)\b', 'INPUT'),
-            (r'\b(os)\b', 'OS'),
-            (r'\b(print)\b', 'PRINT'),
-            (r'\b(pause)\b', 'PAUSE'),
-            (r'\b(shutdown)\b', 'SHUTDOWN'),
-            (r'\b(i32|string|str)\b', 'TYPE'),
-            (r'\b(iso|bin)\b', 'CRATE_NAME'),
-            
-            # Operators and comparisons (order matters - longer operators first)
-            (r'::', 'DOUBLE_COLON'),
-            (r'>=', 'GREATER_EQUAL'),
-            (r'<=', 'LESS_EQUAL'),
-            (r'==', 'EQUAL'),
-            (r'!=', 'NOT_EQUAL'),
-            (r'&&', 'AND'),
-            (r'\|\|', 'OR'),
-            (r'>', 'GREATER'),
-            (r'<', 'LESS'),
-            (r'=', 'ASSIGN'),
-            (r'\+', 'PLUS'),
-            (r'-', 'MINUS'),
-            (r'\*', 'MULTIPLY'),
-            (r'/', 'DIVIDE'),
-            (r':', 'COLON'),
-            
-            # Delimiters and symbols
-            (r'\(', 'LPAREN'),
-            (r'\)', 'RPAREN'),
-            (r'\{', 'LBRACE'),
-            (r'\}', 'RBRACE'),
-            (r';', 'SEMICOLON'),
-            (r',', 'COMMA'),
-            
-            # Literals
-            (r'"(.*?)"', 'STRING_LITERAL'),
-            (r'\b(\d+)\b', 'NUMBER'),
-            
-            # Comments (changed from // to #)
-            (r'#.*', None),  # Ignore comments
-            
-            # Identifiers and whitespace last
-            (r'\b([a-zA-Z_][a-zA-Z0-9_]*)\b', 'IDENTIFIER'),
-            (r'\s+', None),  # Ignore whitespace
-        ]
-
-        while self.position < len(self.source_code):
-            match = None
-            for pattern, token_type in patterns:
-                regex = re.compile(pattern)
-                m = regex.match(self.source_code, self.position)
-                if m:
-                    value = m.group(1) if len(m.groups()) > 0 else m.group(0)
-                    if token_type:
-                        self.tokens.append(Token(token_type, value))
-                    self.position = m.end(0)
-                    match = True
-                    break
-            if not match:
-                raise Exception(f"Illegal character at position {self.position}: '{self.source_code[self.position]}'")
+        """Lex the whole source into self.tokens, a compact TokenTable"""
+        kinds = self.tokens.kinds.append
+        starts = self.tokens.starts.append
+        ends = self.tokens.ends.append
+        for token_type, start, end in self.scan():
+            kinds(TOKEN_IDS[token_type])
+            starts(start)
+            ends(end)
         return self.tokens
 
+    def iter_tokens(self):
+        """Yield tokens one at a time instead of building the whole list"""
+        source = self.source
+        for token_type, start, end in self.scan():
+            yield Token(token_type, start=start, end=end, source=source)
+
+    def scan(self):
+        """Yield (type, start, end) for each token; the span covers the value"""
+        source = self.source
+        text = source.text
+        length = len(text)
+        if source.is_text:
+            match = TOKEN_REGEX.match
+            keywords = KEYWORDS
+            operators = OPERATORS
+        else:
+            match = BYTES_TOKEN_REGEX.match
+            keywords = {word.encode(): kind for word, kind in KEYWORDS.items()}
+            operators = {op.encode(): kind for op, kind in OPERATORS.items()}
+
+        while self.position < length:
+            m = match(text, self.position)
+            if not m:
+                line, column = source.line_col(self.position)
+                char = text[self.position] if source.is_text else bytes(text[self.position:self.position + 4]).decode('utf-8', 'replace')[0]
+                raise Exception(f"Illegal character at line {line}, column {column} (position {self.position}): '{char}'")
+            kind = m.lastgroup
+            self.position = m.end()
+            if kind == 'SKIP':
+                continue
+            start, end = m.span(kind)
+            if kind == 'WORD':
+                yield keywords.get(m.group(kind), 'IDENTIFIER'), start, end
+            elif kind == 'OP':
+                yield operators[m.group(kind)], start, end
+            else:
+                yield kind, start, end
+
 if __name__ == '__main__':
     import sys
     if len(sys.argv) > 1:
         with open(sys.argv[1], 'r') as f:
             source = f.read()
         lexer = Lexer(source)
-        tokens = lexer.tokenize()
-        for token in tokens:
+        for token in lexer.iter_tokens():
             print(token)
     else:
         print("Usage: python lexer.py <source_file.rx>")
\ No newline at end of file
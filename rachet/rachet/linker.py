@@ -1,11 +1,73 @@
 import subprocess
 import os
+import re
 
-def link(generated_data, generated_text, output_type, generated_bss=""):
-    NASM_COMMAND = "nasm"
-    LD_COMMAND = "ld"
-    GRUB_COMMAND = "grub-mkrescue"
+# Kernel routines that are always linked: the multiboot header and the
+# entry point that calls main
+KERNEL_ROOTS = ('multiboot_header', '_start')
+
+LABEL = re.compile(r'^([A-Za-z_]\w*):')
+GLOBAL = re.compile(r'^global\s+([A-Za-z_]\w*)')
+DATA_LABEL = re.compile(r'^([A-Za-z_]\w*)\s+(?:db|dw|dd|dq|resb|resw|resd|times)\b')
+SYMBOL = re.compile(r'[A-Za-z_]\w*')
+
+def symbols(code):
+    """Identifiers used in assembly code, ignoring comments and strings"""
+    found = set()
+    for line in code.split('\n'):
+        line = re.sub(r'"[^"]*"|\'[^\']*\'', '', line.split(';', 1)[0])
+        found.update(SYMBOL.findall(line))
+    return found
+
+def split_kernel(kernel_asm):
+    """Split the kernel into its header and its top-level routines.
+
+    Returns (header, routines) where routines is a list of (name, text) in
+    file order. A routine starts at its global directive or label and runs
+    to the next one; comments just above a routine belong to it.
+    """
+    header = []
+    routines = []
+    current = header
+    for line in kernel_asm.split('\n'):
+        code = line.strip()
+        match = GLOBAL.match(code) or LABEL.match(code) or DATA_LABEL.match(code)
+        if match and not (routines and routines[-1][0] == match.group(1)):
+            # Move the comment block above this line over to the new routine
+            leading = []
+            while current and (not current[-1].strip() or current[-1].strip().startswith(';')):
+                leading.insert(0, current.pop())
+            routines.append((match.group(1), leading))
+            current = routines[-1][1]
+        current.append(line)
+    return '\n'.join(header), [(name, '\n'.join(lines)) for name, lines in routines]
+
+def prune_kernel(kernel_asm, code):
+    """Drop the kernel routines neither the kernel roots nor code refer to,
+    directly or through other kept routines.
+
+    Returns (kernel text, names of the dropped routines).
+    """
+    header, routines = split_kernel(kernel_asm)
+    texts = dict(routines)
+    kept = set()
+    pending = [name for name in KERNEL_ROOTS if name in texts]
+    pending += [name for name in symbols(code) if name in texts]
+    while pending:
+        name = pending.pop()
+        if name in kept:
+            continue
+        kept.add(name)
+        pending.extend(symbol for symbol in symbols(texts[name]) if symbol in texts)
+    parts = [header] + [text for name, text in routines if name in kept]
+    return '\n'.join(parts), [name for name, _ in routines if name not in kept]
+
+def write_asm(emitter, path='temp.asm', prune=False):
+    """Write the kernel followed by the emitter's sections to path.
 
+    With prune, kernel routines the generated code never reaches are left
+    out; the names of those routines are returned.
+    """
     # Read the kernel from the separate file
     kernel_file = 'runtimes/kernel.asm'
     if not os.path.exists(kernel_file):
@@ -13,23 +75,27 @@ def link(generated_data, generated_text, output_type, generated_bss=""):
     
     with open(kernel_file, 'r') as f:
         kernel_asm = f.read()
+
+    dropped = []
+    if prune:
+        code = ''.join(emitter.getvalue(section) for section in emitter.SECTIONS)
+        kernel_asm, dropped = prune_kernel(kernel_asm, code)
     
-    # Combine kernel with generated code
-    final_asm = f"{kernel_asm}\n\n"
-    
-    # Add data section if there's any generated data
-    if generated_data.strip():
-        final_asm += f"section .data\n{generated_data}\n"
-    
-    # Add BSS section if there's any generated BSS
-    if generated_bss.strip():
-        final_asm += f"section .bss\n{generated_bss}\n"
-    
-    # Always add text section
-    final_asm += f"section .text\n{generated_text}"
-    
-    with open('temp.asm', 'w') as f:
-        f.write(final_asm)
+    # Stream the generated code after the kernel chunk by chunk instead of
+    # building the whole file in memory first
+    with open(path, 'w') as f:
+        f.write(f"{kernel_asm}\n\n")
+        emitter.write(f)
+    return dropped
+
+def link(emitter, output_type, prune=False):
+    NASM_COMMAND = "nasm"
+    LD_COMMAND = "ld"
+    GRUB_COMMAND = "grub-mkrescue"
+
+    dropped = write_asm(emitter, prune=prune)
+    if dropped:
+        print(f"   Runtime: left out {len(dropped)} unused kernel routines ({', '.join(dropped)})")
     
     try:
         subprocess.run([NASM_COMMAND, 'temp.asm', '-f', 'elf32', '-o', 'temp.o'], check=True)
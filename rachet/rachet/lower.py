@@ -0,0 +1,233 @@
+from ir import Function, BasicBlock, Instr, Temp, Var, Const, Str, Command
+from inference import I32, COMMAND_TYPES, MIXED
+from emitter import unescape
+from optimizer import to_i32
+from inliner import has_effects
+
+class Lowering:
+    """Turns one FunctionDeclaration into an ir.Function.
+
+    Conditions become branches between basic blocks (&& and || short
+    circuit), matches become a single switch, loops test their condition
+    at the bottom, after the body, and return f(...) to a user
+    function with no more arguments than this one becomes a tail call: a
+    jump back to the entry block for self calls, a tailcall instruction
+    otherwise.
+    """
+    def __init__(self, compiler):
+        self.compiler = compiler
+        self.function = None
+        self.current = None
+        self.declared = set()
+        self.params = []
+        self.loops = []  # (continue label, break label) per enclosing loop
+
+    def lower(self, node):
+        self.params = [param.value for param in node.children[1:]]
+        self.function = Function(node.value, self.params)
+        self.declared = set(self.params)
+        self.start(self.new_label())
+        self.statement(node.children[0])
+        if self.current.terminator() is None:
+            # Falling off the end returns whatever eax holds, as codegen does
+            self.emit(Instr('return'))
+        return self.function
+
+    def new_label(self):
+        return self.compiler.get_unique_label("bb")
+
+    def start(self, label):
+        self.current = BasicBlock(label)
+        self.function.blocks.append(self.current)
+
+    def emit(self, instr):
+        if self.current.terminator() is not None:
+            # Code after a return: give it a block of its own (unreachable)
+            self.start(self.new_label())
+        self.current.instrs.append(instr)
+        return instr.dest
+
+    def temp(self, type=None):
+        return self.function.new_temp(None if type == MIXED else type)
+
+    def statement(self, node):
+        node_type = node.type
+        if node_type == 'Block':
+            for statement in node.children:
+                self.statement(statement)
+        elif node_type == 'VariableDeclaration':
+            value = self.expression(node.children[0])
+            self.emit(Instr('copy', Var(node.value), [value]))
+            # Bound after its own expression, so let x = x + 1 reads the old x
+            self.declared.add(node.value)
+        elif node_type == 'IfStatement':
+            then_label = self.new_label()
+            end_label = self.new_label()
+            else_label = self.new_label() if len(node.children) > 2 else end_label
+            self.condition(node.children[0], then_label, else_label)
+            self.start(then_label)
+            self.statement(node.children[1])
+            self.emit_jump(end_label)
+            if len(node.children) > 2:
+                self.start(else_label)
+                self.statement(node.children[2])
+                self.emit_jump(end_label)
+            self.start(end_label)
+        elif node_type == 'MatchStatement':
+            self.match(node)
+        elif node_type == 'WhileStatement':
+            self.loop(node)
+        elif node_type in ('BreakStatement', 'ContinueStatement'):
+            continue_label, break_label = self.loops[-1]
+            self.emit(Instr('jump', extra=break_label if node_type == 'BreakStatement' else continue_label))
+        elif node_type == 'ReturnStatement':
+            call = node.children[0]
+            if self.is_tail_call(call):
+                self.tail_call(call)
+            else:
+                self.emit(Instr('return', args=[self.expression(call)]))
+        else:
+            self.expression(node)
+
+    def emit_jump(self, label):
+        if self.current.terminator() is None:
+            self.emit(Instr('jump', extra=label))
+
+    def match(self, node):
+        cases = node.children[1:]
+        numeric = [isinstance(case.value, int) for case in cases]
+        if any(numeric) and not all(numeric):
+            raise Exception("Match arms mix numbers and strings")
+        value = self.expression(node.children[0])
+        end_label = self.new_label()
+        # First match wins, so a repeated case value never runs its body
+        arms = {}
+        for case in cases:
+            key = to_i32(case.value) if isinstance(case.value, int) else unescape(case.value).encode('utf-8')
+            if key not in arms:
+                arms[key] = (self.new_label(), case)
+        kind = 'int' if all(numeric) and cases else 'string'
+        self.emit(Instr('switch', args=[value], extra=([(key, label) for key, (label, _) in arms.items()], end_label, kind)))
+        for label, case in arms.values():
+            self.start(label)
+            self.statement(case.children[0])
+            self.emit_jump(end_label)
+        self.start(end_label)
+
+    def loop(self, node):
+        """The condition is lowered first, where it sits in program order,
+        and its blocks are moved after the body's"""
+        blocks = self.function.blocks
+        body_label, test_label, end_label = self.new_label(), self.new_label(), self.new_label()
+        step_label = self.new_label() if len(node.children) > 2 else test_label
+        self.emit_jump(test_label)
+        first = len(blocks)
+        self.start(test_label)
+        self.condition(node.children[0], body_label, end_label)
+        test = blocks[first:]
+        del blocks[first:]
+        self.start(body_label)
+        self.loops.append((step_label, end_label))
+        self.statement(node.children[1])
+        self.loops.pop()
+        if len(node.children) > 2:
+            self.emit_jump(step_label)
+            self.start(step_label)
+            self.statement(node.children[2])
+        self.emit_jump(test_label)
+        blocks.extend(test)
+        self.start(end_label)
+
+    def is_tail_call(self, node):
+        if node.type != 'FunctionCall' or node.value not in self.compiler.functions:
+            return False
+        return len(node.children) <= len(self.params)
+
+    def tail_call(self, node):
+        args = self.arguments(node.children)
+        if node.value == self.function.name:
+            # Every argument is read before any parameter is overwritten
+            values = []
+            for arg in args:
+                if isinstance(arg, Var):
+                    arg = self.emit(Instr('copy', self.temp(), [arg]))
+                values.append(arg)
+            for param, value in zip(self.params, values):
+                self.emit(Instr('copy', Var(param), [value]))
+            self.emit(Instr('jump', extra=self.function.blocks[0].label))
+        else:
+            self.emit(Instr('tailcall', args=args, extra=node.value))
+        self.compiler.tail_calls.append(f"{self.function.name} -> {node.value}")
+
+    def arguments(self, nodes):
+        """Operands for call arguments, evaluated last to first as codegen
+        pushes them"""
+        return list(reversed([self.expression(arg) for arg in reversed(nodes)]))
+
+    def condition(self, node, true_label, false_label):
+        """End the current block with a jump to true_label or false_label
+        depending on node"""
+        if node.type == 'BinaryOp' and node.value in ('EQUAL', 'NOT_EQUAL', 'GREATER', 'GREATER_EQUAL', 'LESS', 'LESS_EQUAL'):
+            left = self.expression(node.children[0])
+            right = self.expression(node.children[1])
+            self.emit(Instr('branch', args=[left, right], extra=(node.value, true_label, false_label)))
+        elif node.type == 'BinaryOp' and node.value in ('AND', 'OR'):
+            middle = self.new_label()
+            if node.value == 'AND':
+                self.condition(node.children[0], middle, false_label)
+            else:
+                self.condition(node.children[0], true_label, middle)
+            self.start(middle)
+            self.condition(node.children[1], true_label, false_label)
+        elif node.type == 'UnaryOp' and node.value == 'NOT':
+            self.condition(node.children[0], false_label, true_label)
+        elif node.type == 'Number':
+            self.emit(Instr('jump', extra=true_label if to_i32(node.value) else false_label))
+        else:
+            value = self.expression(node)
+            self.emit(Instr('branch', args=[value, Const(0)], extra=('NOT_EQUAL', true_label, false_label)))
+
+    def expression(self, node):
+        node_type = node.type
+        if node_type == 'Number':
+            return Const(node.value)
+        elif node_type == 'StringLiteral':
+            return Str(node.value)
+        elif node_type == 'Variable':
+            if node.value not in self.declared:
+                raise Exception(f"Undefined variable: {node.value}")
+            return Var(node.value)
+        elif node_type == 'BinaryOp' and node.value in ('AND', 'OR') and has_effects(node.children[1]):
+            # The right side may only run if the left does not decide the
+            # result; the two outcomes meet in a hidden local
+            result = Var(f"{node.value.lower()}.{self.function.temps}")
+            self.function.temps += 1
+            true_label, false_label, end_label = self.new_label(), self.new_label(), self.new_label()
+            self.condition(node, true_label, false_label)
+            for label, value in ((true_label, 1), (false_label, 0)):
+                self.start(label)
+                self.emit(Instr('copy', result, [Const(value)]))
+                self.emit_jump(end_label)
+            self.start(end_label)
+            return result
+        elif node_type == 'BinaryOp':
+            left = self.expression(node.children[0])
+            right = self.expression(node.children[1])
+            return self.emit(Instr('binary', self.temp(I32), [left, right], node.value))
+        elif node_type == 'UnaryOp':
+            operand = self.expression(node.children[0])
+            return self.emit(Instr('unary', self.temp(I32), [operand], node.value))
+        elif node_type == 'FunctionCall':
+            return self.call(node)
+        raise Exception(f"Cannot lower {node_type}")
+
+    def call(self, node):
+        compiler = self.compiler
+        module = compiler.load_command(node.value)
+        if module and (hasattr(module, 'emit') or hasattr(module, 'compile')):
+            args = [self.expression(arg) for arg in node.children]
+            nodes = [(arg.type, arg.value, compiler.value_type(arg)) for arg in node.children]
+            command = Command(node.value, module, nodes)
+            return self.emit(Instr('command', self.temp(COMMAND_TYPES.get(node.value)), args, command))
+        args = self.arguments(node.children)
+        return self.emit(Instr('call', self.temp(compiler.types.returns.get(node.value)), args, node.value))
@@ -0,0 +1,198 @@
+from parser import Node
+
+def to_i32(value):
+    """Wrap an integer to a signed 32-bit value, as the generated code would"""
+    value &= 0xFFFFFFFF
+    return value - 0x100000000 if value >= 0x80000000 else value
+
+def divide_i32(left, right):
+    """idiv semantics: truncate toward zero"""
+    quotient = abs(left) // abs(right)
+    return quotient if (left < 0) == (right < 0) else -quotient
+
+BINARY_FOLDS = {
+    'PLUS': lambda a, b: a + b,
+    'MINUS': lambda a, b: a - b,
+    'MULTIPLY': lambda a, b: a * b,
+    'DIVIDE': divide_i32,
+    'EQUAL': lambda a, b: int(a == b),
+    'NOT_EQUAL': lambda a, b: int(a != b),
+    'GREATER': lambda a, b: int(a > b),
+    'GREATER_EQUAL': lambda a, b: int(a >= b),
+    'LESS': lambda a, b: int(a < b),
+    'LESS_EQUAL': lambda a, b: int(a <= b),
+    'AND': lambda a, b: int(bool(a) and bool(b)),
+    'OR': lambda a, b: int(bool(a) or bool(b)),
+}
+
+UNARY_FOLDS = {
+    'NOT': lambda a: int(not a),
+}
+
+class ConstantFolder:
+    """Folds constant BinaryOp/UnaryOp trees and propagates constant lets.
+
+    Runs on a Node tree between Parser.parse and Compiler.codegen and
+    rewrites it in place. Variables live in one frame per function, so a
+    binding is only propagated while it is known on every path: after an
+    if or match, a name keeps its constant only if no branch rebound it.
+    An if whose condition folds to a constant is replaced by the branch
+    that runs. Names a loop rebinds lose their constant at the loop, and a
+    while whose condition folds to false is dropped.
+    """
+    def __init__(self):
+        self.function = None
+        self.folded = 0
+        self.propagated = 0
+
+    def fold(self, ast):
+        for child in ast.children:
+            if child.type == 'FunctionDeclaration':
+                self.function = child.value
+                # Parameters (children[1:]) are never constant
+                self.fold_statement(child.children[0], {})
+        return ast
+
+    def fold_block(self, block, env):
+        statements = []
+        for statement in block.children:
+            statement = self.fold_statement(statement, env)
+            if statement is not None:
+                statements.append(statement)
+        block.children = statements
+        return block
+
+    def fold_statement(self, node, env):
+        """Fold one statement, updating env with the constants it binds.
+        Returns the replacement node, or None to drop the statement."""
+        node_type = node.type
+        if node_type == 'Block':
+            return self.fold_block(node, env)
+        elif node_type == 'VariableDeclaration':
+            value = node.children[0] = self.fold_expression(node.children[0], env)
+            if value.type == 'Number':
+                env[node.value] = value.value
+            else:
+                env.pop(node.value, None)
+            return node
+        elif node_type == 'IfStatement':
+            condition = node.children[0] = self.fold_expression(node.children[0], env)
+            if condition.type == 'Number':
+                self.folded += 1
+                if to_i32(condition.value):
+                    return self.fold_statement(node.children[1], env)
+                if len(node.children) > 2:
+                    return self.fold_statement(node.children[2], env)
+                return None
+            self.fold_branches(node, 1, env, falls_through=len(node.children) < 3)
+            return node
+        elif node_type == 'MatchStatement':
+            node.children[0] = self.fold_expression(node.children[0], env)
+            self.fold_branches(node, 1, env, falls_through=True)
+            return node
+        elif node_type == 'WhileStatement':
+            # A name the loop rebinds can change between iterations, so it
+            # is not constant anywhere in the loop or after it
+            for name in bound_names(node):
+                env.pop(name, None)
+            condition = node.children[0] = self.fold_expression(node.children[0], env)
+            if condition.type == 'Number' and not to_i32(condition.value):
+                self.folded += 1
+                return None
+            # The body and the step (which continue jumps to) start out
+            # from what holds on every iteration
+            for i in range(1, len(node.children)):
+                folded = self.fold_statement(node.children[i], dict(env))
+                node.children[i] = folded if folded is not None else Node('Block', children=[])
+            return node
+        elif node_type == 'MatchCase':
+            node.children[0] = self.fold_statement(node.children[0], env)
+            return node
+        elif node_type == 'ReturnStatement':
+            if node.children:
+                node.children[0] = self.fold_expression(node.children[0], env)
+            return node
+        else:
+            return self.fold_expression(node, env)
+
+    def fold_branches(self, node, first, env, falls_through):
+        """Fold the alternative branches node.children[first:], then keep
+        only the constants every path agrees on"""
+        results = [env] if falls_through else []
+        for i in range(first, len(node.children)):
+            branch_env = dict(env)
+            folded = self.fold_statement(node.children[i], branch_env)
+            # A pruned else-if still needs a node in its place
+            node.children[i] = folded if folded is not None else Node('Block', children=[])
+            results.append(branch_env)
+        for name, value in list(env.items()):
+            if any(result.get(name) != value for result in results):
+                del env[name]
+
+    def fold_expression(self, node, env):
+        node_type = node.type
+        if node_type == 'Variable':
+            if node.value in env:
+                self.propagated += 1
+                return Node('Number', env[node.value])
+            return node
+        elif node_type == 'BinaryOp':
+            left = node.children[0] = self.fold_expression(node.children[0], env)
+            right = node.children[1] = self.fold_expression(node.children[1], env)
+            if node.value == 'DIVIDE' and right.type == 'Number' and to_i32(right.value) == 0:
+                # Only a reachable division faults, so warn and leave the idiv
+                print(f"Warning: Division by constant zero in function '{self.function}'")
+                return node
+            if left.type == 'Number' and right.type == 'Number' and node.value in BINARY_FOLDS:
+                a, b = to_i32(left.value), to_i32(right.value)
+                # INT_MIN / -1 faults at run time; leave it to do so
+                if node.value == 'DIVIDE' and a == -0x80000000 and b == -1:
+                    return node
+                self.folded += 1
+                return Node('Number', to_i32(BINARY_FOLDS[node.value](a, b)))
+            return node
+        elif node_type == 'UnaryOp':
+            operand = node.children[0] = self.fold_expression(node.children[0], env)
+            if operand.type == 'Number' and node.value in UNARY_FOLDS:
+                self.folded += 1
+                return Node('Number', UNARY_FOLDS[node.value](to_i32(operand.value)))
+            return node
+        elif node_type == 'FunctionCall':
+            node.children = [self.fold_expression(arg, env) for arg in node.children]
+            return node
+        return node
+
+def bound_names(node):
+    """Names of the VariableDeclarations anywhere under node"""
+    names = set()
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node.type == 'VariableDeclaration':
+            names.add(node.value)
+        stack.extend(node.children)
+    return names
+
+def prune_functions(ast, root='main'):
+    """Remove FunctionDeclarations that root never reaches through calls.
+
+    Returns the names of the removed functions. A program without root is
+    left alone, since there is nothing to measure reachability from.
+    """
+    functions = {child.value: child for child in ast.children if child.type == 'FunctionDeclaration'}
+    if root not in functions:
+        return []
+    reached = {root}
+    pending = [functions[root]]
+    while pending:
+        stack = [pending.pop()]
+        while stack:
+            node = stack.pop()
+            if node.type == 'FunctionCall' and node.value in functions and node.value not in reached:
+                reached.add(node.value)
+                pending.append(functions[node.value])
+            stack.extend(node.children)
+    dropped = [name for name in functions if name not in reached]
+    ast.children = [child for child in ast.children
+                    if child.type != 'FunctionDeclaration' or child.value in reached]
+    return dropped
@@ -1,53 +1,160 @@
+from collections import deque
+
+# Bump whenever the AST built for the same tokens can change; it is part of
+# the AST cache key
+PARSER_VERSION = 3
+
+# Node types are interned as small integer kinds; Node.type maps back to
+# the name so code that switches on strings keeps working
+NODE_TYPES = [
+    'Program',
+    'UseStatement',
+    'FunctionDeclaration',
+    'Parameter',
+    'Block',
+    'VariableDeclaration',
+    'Type',
+    'IfStatement',
+    'MatchStatement',
+    'MatchCase',
+    'ReturnStatement',
+    'BinaryOp',
+    'UnaryOp',
+    'Number',
+    'StringLiteral',
+    'Variable',
+    'FunctionCall',
+    'WhileStatement',
+    'BreakStatement',
+    'ContinueStatement',
+]
+NODE_KINDS = {name: kind for kind, name in enumerate(NODE_TYPES)}
+
+def node_kind(type):
+    """Return the integer kind for a node type, registering new types on first use"""
+    kind = NODE_KINDS.get(type)
+    if kind is None:
+        kind = NODE_KINDS[type] = len(NODE_TYPES)
+        NODE_TYPES.append(type)
+    return kind
+
+# Shared by every leaf instead of one empty list per node
+NO_CHILDREN = ()
+
 class Node:
+    __slots__ = ('kind', 'value', 'children')
+
     def __init__(self, type, value=None, children=None):
-        self.type = type
+        self.kind = node_kind(type)
         self.value = value
-        self.children = children if children is not None else []
+        self.children = children if children else NO_CHILDREN
+
+    @property
+    def type(self):
+        return NODE_TYPES[self.kind]
 
     def __repr__(self):
         if self.children:
             return f"Node({self.type}, value={repr(self.value)}, children={self.children})"
         return f"Node({self.type}, value={repr(self.value)})"
 
+# Binary operators by binding power, loosest first; all are left-associative
+BINARY_PRECEDENCE = {
+    'OR': 1,
+    'AND': 2,
+    'EQUAL': 3,
+    'NOT_EQUAL': 3,
+    'GREATER': 4,
+    'GREATER_EQUAL': 4,
+    'LESS': 4,
+    'LESS_EQUAL': 4,
+    'PLUS': 6,
+    'MINUS': 6,
+    'MULTIPLY': 7,
+    'DIVIDE': 7,
+}
+
+# 'not' applies to a whole arithmetic expression but binds tighter than comparisons
+UNARY_PRECEDENCE = {
+    'NOT': 5,
+}
+
 class Parser:
     def __init__(self, tokens):
-        self.tokens = tokens
+        # tokens may be a list or a generator such as Lexer.iter_tokens();
+        # only the few tokens of lookahead the grammar needs are buffered
+        self.tokens = iter(tokens)
+        self.lookahead = deque()
         self.position = 0
+        self.previous = None  # Last consumed token, for end-of-file errors
+        self.loop_depth = 0  # Loops around the statement being parsed
+        self.for_loops = 0  # For naming the hidden bound of each for loop
 
     def parse(self):
-        ast = Node('Program')
-        while self.position < len(self.tokens):
+        declarations = []
+        while not self.at_end():
             if self.current_token().type == 'USE':
-                ast.children.append(self.parse_use_statement())
+                declarations.append(self.parse_use_statement())
             elif self.current_token().type == 'FN':
-                ast.children.append(self.parse_function_declaration())
+                declarations.append(self.parse_function_declaration())
             else:
-                raise Exception(f"Unexpected token: {self.current_token().type}")
-        return ast
+                raise Exception(f"Unexpected token: {self.current_token().type} at {self.location()}")
+        return Node('Program', children=declarations)
+
+    def fill(self, count):
+        """Pull tokens from the stream until `count` are buffered, False at end of file"""
+        while len(self.lookahead) < count:
+            token = next(self.tokens, None)
+            if token is None:
+                return False
+            self.lookahead.append(token)
+        return True
+
+    def at_end(self):
+        return not self.fill(1)
 
     def current_token(self):
-        if self.position >= len(self.tokens):
-            raise Exception(f"Unexpected end of file at position {self.position}")
-        return self.tokens[self.position]
+        if self.lookahead:
+            return self.lookahead[0]
+        if not self.fill(1):
+            raise Exception(f"Unexpected end of file at {self.location()}")
+        return self.lookahead[0]
 
     def peek_token(self, offset=1):
         """Look ahead at the next token without advancing"""
-        pos = self.position + offset
-        if pos >= len(self.tokens):
+        if not self.fill(offset + 1):
             return None
-        return self.tokens[pos]
+        return self.lookahead[offset]
+
+    def next_is(self, token_type):
+        """Check the token after the current one without advancing"""
+        token = self.peek_token()
+        return token is not None and token.type == token_type
 
     def advance(self):
+        if self.lookahead or self.fill(1):
+            self.previous = self.lookahead.popleft()
         self.position += 1
 
+    def location(self):
+        """Describe where the parser is in the source for error messages"""
+        token = self.lookahead[0] if self.fill(1) else self.previous
+        where = token.line_col() if token is not None else None
+        if where is None:
+            return f"position {self.position}"
+        line, column = where
+        if token is self.previous:
+            return f"end of file after line {line}, column {column}"
+        return f"line {line}, column {column}"
+
     def expect(self, token_type):
-        if self.position >= len(self.tokens):
-            raise Exception(f"Expected token type '{token_type}', but reached end of file")
+        if self.at_end():
+            raise Exception(f"Expected token type '{token_type}', but reached {self.location()}")
         if self.current_token().type == token_type:
             self.advance()
         else:
             current = self.current_token()
-            raise Exception(f"Expected token type '{token_type}', but got '{current.type}' with value '{current.value}' at position {self.position}")
+            raise Exception(f"Expected token type '{token_type}', but got '{current.type}' with value '{current.value}' at {self.location()}")
 
     def parse_use_statement(self):
         self.expect('USE')
@@ -96,15 +203,21 @@ class Parser:
             return self.parse_match_statement()
         elif self.current_token().type == 'RETURN':
             return self.parse_return_statement()
+        elif self.current_token().type == 'WHILE':
+            return self.parse_while_statement()
+        elif self.current_token().type == 'FOR':
+            return self.parse_for_statement()
+        elif self.current_token().type in ['BREAK', 'CONTINUE']:
+            return self.parse_loop_exit()
         elif self.current_token().type in ['IDENTIFIER', 'INPUT', 'OS', 'PRINT', 'PAUSE']:
             # Check if it's a function call by looking ahead
-            if self.position + 1 < len(self.tokens) and self.tokens[self.position + 1].type == 'LPAREN':
+            if self.next_is('LPAREN'):
                 stmt = self.parse_function_call_statement()
                 return stmt
             else:
-                raise Exception(f"Unexpected identifier: {self.current_token().value} at position {self.position}")
+                raise Exception(f"Unexpected identifier: {self.current_token().value} at {self.location()}")
         else:
-            raise Exception(f"Unexpected statement: {self.current_token().type} at position {self.position}")
+            raise Exception(f"Unexpected statement: {self.current_token().type} at {self.location()}")
 
     def parse_variable_declaration(self):
         self.expect('LET')
@@ -119,16 +232,16 @@ class Parser:
                 var_type = self.current_token().value
                 self.advance()
             else:
-                raise Exception(f"Expected type after ':', but got '{self.current_token().type}' at position {self.position}")
+                raise Exception(f"Expected type after ':', but got '{self.current_token().type}' at {self.location()}")
         
         self.expect('ASSIGN')
         value = self.parse_expression()
         self.expect('SEMICOLON')
         
-        var_node = Node('VariableDeclaration', name, [value])
+        children = [value]
         if var_type:
-            var_node.children.append(Node('Type', var_type))
-        return var_node
+            children.append(Node('Type', var_type))
+        return Node('VariableDeclaration', name, children)
 
     def parse_if_statement(self):
         self.expect('IF')
@@ -140,7 +253,7 @@ class Parser:
         self.expect('RBRACE')
         
         else_block = None
-        if self.position < len(self.tokens) and self.current_token().type == 'ELSE':
+        if not self.at_end() and self.current_token().type == 'ELSE':
             self.advance()
             if self.current_token().type == 'IF':
                 else_block = self.parse_if_statement()
@@ -154,6 +267,65 @@ class Parser:
             children.append(else_block)
         return Node('IfStatement', children=children)
 
+    def parse_while_statement(self):
+        self.expect('WHILE')
+        self.expect('LPAREN')
+        condition = self.parse_expression()
+        self.expect('RPAREN')
+        body = self.parse_loop_body()
+        return Node('WhileStatement', children=[condition, body])
+
+    def parse_for_statement(self):
+        """for (i in start..end) { ... } counts i from start up to end - 1.
+        It becomes a while loop whose third child, the step, runs after
+        the body and on continue:
+
+            let i.end.N = end;  # only when end is not a number
+            let i = start;
+            while (i < i.end.N) { ... }  # step: let i = i + 1;
+
+        so end is evaluated once, before start."""
+        self.expect('FOR')
+        self.expect('LPAREN')
+        name = self.current_token().value
+        self.expect('IDENTIFIER')
+        self.expect('IN')
+        start = self.parse_expression()
+        self.expect('DOT_DOT')
+        end = self.parse_expression()
+        self.expect('RPAREN')
+        body = self.parse_loop_body()
+
+        statements = []
+        if end.type != 'Number':
+            # A name the lexer cannot produce, so it never collides
+            self.for_loops += 1
+            bound = f"{name}.end.{self.for_loops}"
+            statements.append(Node('VariableDeclaration', bound, [end]))
+            end = Node('Variable', bound)
+        statements.append(Node('VariableDeclaration', name, [start]))
+        condition = Node('BinaryOp', 'LESS', [Node('Variable', name), end])
+        step = Node('VariableDeclaration', name, [Node('BinaryOp', 'PLUS', [Node('Variable', name), Node('Number', 1)])])
+        statements.append(Node('WhileStatement', children=[condition, body, step]))
+        return Node('Block', children=statements)
+
+    def parse_loop_body(self):
+        self.expect('LBRACE')
+        self.loop_depth += 1
+        body = self.parse_block()
+        self.loop_depth -= 1
+        self.expect('RBRACE')
+        return body
+
+    def parse_loop_exit(self):
+        """break; or continue; which only make sense inside a loop"""
+        token = self.current_token()
+        if not self.loop_depth:
+            raise Exception(f"'{token.value}' outside of a loop at {self.location()}")
+        self.advance()
+        self.expect('SEMICOLON')
+        return Node('BreakStatement' if token.type == 'BREAK' else 'ContinueStatement')
+
     def parse_match_statement(self):
         self.expect('MATCH')
         self.expect('LPAREN')
@@ -163,8 +335,7 @@ class Parser:
         
         cases = []
         while self.current_token().type != 'RBRACE':
-            case_value = self.current_token().value.strip('"')
-            self.advance()
+            case_value = self.parse_case_value()
             self.expect('COMMA')
             
             if self.current_token().type == 'RETURN':
@@ -172,10 +343,10 @@ class Parser:
             else:
                 # For other actions in match cases
                 if self.current_token().type in ['IDENTIFIER', 'PRINT', 'INPUT', 'OS', 'PAUSE']:
-                    if self.position + 1 < len(self.tokens) and self.tokens[self.position + 1].type == 'LPAREN':
+                    if self.next_is('LPAREN'):
                         action = self.parse_function_call_expression()
                     else:
-                        raise Exception(f"Unexpected token in match case: {self.current_token().type}")
+                        raise Exception(f"Unexpected token in match case: {self.current_token().type} at {self.location()}")
                 else:
                     action = self.parse_expression()
             
@@ -187,6 +358,20 @@ class Parser:
         self.expect('RBRACE')
         return Node('MatchStatement', children=[expr] + cases)
 
+    def parse_case_value(self):
+        """A match arm label: an int for number arms (optionally negative),
+        otherwise the literal text with its quotes stripped"""
+        token = self.current_token()
+        if token.type == 'MINUS' and self.next_is('NUMBER'):
+            self.advance()
+            value = -int(self.current_token().value)
+        elif token.type == 'NUMBER':
+            value = int(token.value)
+        else:
+            value = token.value.strip('"')
+        self.advance()
+        return value
+
     def parse_return_statement(self):
         self.expect('RETURN')
         value = self.parse_expression()
@@ -194,95 +379,81 @@ class Parser:
         return Node('ReturnStatement', children=[value])
 
     def parse_expression(self):
-        return self.parse_logical_or()
+        """Parse an expression by precedence climbing over an explicit operator
+        stack. Operands and parentheses cost no Python frames, so long chains
+        and deeply nested expressions parse iteratively."""
+        operands = []
+        operators = []  # (precedence, op, is_unary); None marks an open '('
+        open_parens = 0
+        while True:
+            # Operand position: any opening parentheses and prefix operators
+            while True:
+                token_type = self.current_token().type
+                if token_type == 'LPAREN':
+                    operators.append(None)
+                    open_parens += 1
+                elif token_type in UNARY_PRECEDENCE:
+                    # 'not' may only start an operand of a comparison or looser
+                    # operator, so it cannot follow arithmetic or another 'not'
+                    precedence = UNARY_PRECEDENCE[token_type]
+                    if operators and operators[-1] is not None and operators[-1][0] >= precedence:
+                        break
+                    operators.append((precedence, token_type, True))
+                else:
+                    break
+                self.advance()
+            operands.append(self.parse_primary())
 
-    def parse_logical_or(self):
-        left = self.parse_logical_and()
-        while self.position < len(self.tokens) and self.current_token().type == 'OR':
-            op = self.current_token().type
-            self.advance()
-            right = self.parse_logical_and()
-            left = Node('BinaryOp', op, [left, right])
-        return left
-
-    def parse_logical_and(self):
-        left = self.parse_equality()
-        while self.position < len(self.tokens) and self.current_token().type == 'AND':
-            op = self.current_token().type
-            self.advance()
-            right = self.parse_equality()
-            left = Node('BinaryOp', op, [left, right])
-        return left
-
-    def parse_equality(self):
-        left = self.parse_comparison()
-        while self.position < len(self.tokens) and self.current_token().type in ['EQUAL', 'NOT_EQUAL']:
-            op = self.current_token().type
-            self.advance()
-            right = self.parse_comparison()
-            left = Node('BinaryOp', op, [left, right])
-        return left
-
-    def parse_comparison(self):
-        left = self.parse_unary()
-        while self.position < len(self.tokens) and self.current_token().type in ['GREATER', 'GREATER_EQUAL', 'LESS', 'LESS_EQUAL']:
-            op = self.current_token().type
-            self.advance()
-            right = self.parse_unary()
-            left = Node('BinaryOp', op, [left, right])
-        return left
-
-    def parse_unary(self):
-        """Handle unary operators like 'not'"""
-        if self.current_token().type == 'NOT':
-            op = self.current_token().type
-            self.advance()
-            expr = self.parse_arithmetic()
-            return Node('UnaryOp', op, [expr])
-        return self.parse_arithmetic()
-
-    def parse_arithmetic(self):
-        left = self.parse_term()
-        while self.position < len(self.tokens) and self.current_token().type in ['PLUS', 'MINUS']:
-            op = self.current_token().type
-            self.advance()
-            right = self.parse_term()
-            left = Node('BinaryOp', op, [left, right])
-        return left
-
-    def parse_term(self):
-        left = self.parse_primary()
-        while self.position < len(self.tokens) and self.current_token().type in ['MULTIPLY', 'DIVIDE']:
-            op = self.current_token().type
+            # Operator position: close parentheses, then a binary operator or the end
+            while True:
+                token_type = self.lookahead[0].type if self.lookahead or self.fill(1) else None
+                if token_type == 'RPAREN' and open_parens:
+                    while operators[-1] is not None:
+                        self.reduce(operands, operators.pop())
+                    operators.pop()
+                    open_parens -= 1
+                    self.advance()
+                    continue
+                break
+            precedence = BINARY_PRECEDENCE.get(token_type)
+            if precedence is None:
+                if open_parens:
+                    self.expect('RPAREN')
+                while operators:
+                    self.reduce(operands, operators.pop())
+                return operands[0]
+            while operators and operators[-1] is not None and operators[-1][0] >= precedence:
+                self.reduce(operands, operators.pop())
+            operators.append((precedence, token_type, False))
             self.advance()
-            right = self.parse_primary()
-            left = Node('BinaryOp', op, [left, right])
-        return left
+
+    def reduce(self, operands, operator):
+        """Pop an operator's operands and push the node it builds"""
+        _, op, is_unary = operator
+        if is_unary:
+            operands.append(Node('UnaryOp', op, [operands.pop()]))
+        else:
+            right = operands.pop()
+            left = operands.pop()
+            operands.append(Node('BinaryOp', op, [left, right]))
 
     def parse_primary(self):
-        if self.current_token().type == 'NUMBER':
-            value = int(self.current_token().value)
+        token = self.current_token()
+        if token.type == 'NUMBER':
             self.advance()
-            return Node('Number', value)
-        elif self.current_token().type == 'STRING_LITERAL':
-            value = self.current_token().value
+            return Node('Number', int(token.value))
+        elif token.type == 'STRING_LITERAL':
             self.advance()
-            return Node('StringLiteral', value)
-        elif self.current_token().type in ['IDENTIFIER', 'INPUT', 'OS', 'PRINT', 'PAUSE']:
+            return Node('StringLiteral', token.value)
+        elif token.type in ['IDENTIFIER', 'INPUT', 'OS', 'PRINT', 'PAUSE']:
             # Check if it's a function call
-            if self.position + 1 < len(self.tokens) and self.tokens[self.position + 1].type == 'LPAREN':
+            if self.next_is('LPAREN'):
                 return self.parse_function_call_expression()
             else:
-                value = self.current_token().value
                 self.advance()
-                return Node('Variable', value)
-        elif self.current_token().type == 'LPAREN':
-            self.advance()
-            expr = self.parse_expression()
-            self.expect('RPAREN')
-            return expr
+                return Node('Variable', token.value)
         else:
-            raise Exception(f"Unexpected token in expression: {self.current_token().type}")
+            raise Exception(f"Unexpected token in expression: {token.type} at {self.location()}")
 
     def parse_function_call_statement(self):
         """Parse function call as a standalone statement (requires semicolon)"""
@@ -0,0 +1,41 @@
+import time
+
+# What a pass of each stage receives and returns: the Program Node, one
+# ir.Function (at -O2, once per function), or the text section
+STAGES = ('ast', 'ir', 'asm')
+
+class PassManager:
+    """Runs the registered passes of a stage in order, timing each one.
+
+    A pass is a function from the unit of its stage to its replacement.
+    It runs when the optimization level is at least the level it was
+    registered for. timings adds up seconds per name, so an IR pass
+    reports its total over all functions.
+    """
+    def __init__(self, opt_level):
+        self.opt_level = opt_level
+        self.passes = {stage: [] for stage in STAGES}
+        self.timings = {}
+
+    def register(self, stage, name, function, level=1):
+        if stage not in self.passes:
+            raise Exception(f"Unknown pass stage '{stage}'")
+        self.passes[stage].append((name, function, level))
+
+    def enabled(self, stage):
+        return [(name, function) for name, function, level in self.passes[stage] if self.opt_level >= level]
+
+    def run(self, stage, unit):
+        for name, function in self.enabled(stage):
+            unit = self.time(name, function, unit)
+        return unit
+
+    def time(self, name, function, *args):
+        """Call function(*args), adding its wall time to name"""
+        start = time.perf_counter()
+        result = function(*args)
+        self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+        return result
+
+    def report(self):
+        return ", ".join(f"{name} {seconds * 1000:.2f}ms" for name, seconds in self.timings.items())
@@ -0,0 +1,235 @@
+import re
+from collections import Counter
+
+REGISTERS = ('eax', 'ebx', 'ecx', 'edx', 'esi', 'edi', 'ebp', 'esp')
+# Registers a call may clobber (cdecl caller-saved)
+CALL_CLOBBERED = ('eax', 'ecx', 'edx')
+REGISTER_ALIASES = {
+    'eax': ('eax', 'ax', 'al', 'ah'),
+    'ebx': ('ebx', 'bx', 'bl', 'bh'),
+    'ecx': ('ecx', 'cx', 'cl', 'ch'),
+    'edx': ('edx', 'dx', 'dl', 'dh'),
+    'esi': ('esi', 'si'),
+    'edi': ('edi', 'di'),
+    'ebp': ('ebp', 'bp'),
+    'esp': ('esp', 'sp'),
+}
+DIRECTIVES = ('global', 'extern', 'section', 'bits', 'align')
+
+class Line:
+    """One line of assembly. Instructions get op/args parsed; labels get
+    label; comments, blank lines and directives get neither."""
+    __slots__ = ('text', 'op', 'args', 'label')
+
+    def __init__(self, text):
+        self.text = text
+        self.op = None
+        self.args = ()
+        self.label = None
+        code = text.split(';', 1)[0].strip()
+        if not code:
+            return
+        if code.endswith(':') and ' ' not in code:
+            self.label = code[:-1]
+            return
+        parts = code.split(None, 1)
+        if parts[0].lower() in DIRECTIVES:
+            return
+        self.op = parts[0].lower()
+        if len(parts) > 1:
+            self.args = tuple(arg.strip() for arg in parts[1].split(','))
+
+    @classmethod
+    def make(cls, op, *args):
+        return cls(f"{op} {', '.join(args)}" if args else op)
+
+def memory(operand):
+    """Canonical form of a memory operand, or None for registers/immediates"""
+    if '[' not in operand:
+        return None
+    return operand.replace('dword', '').replace(' ', '')
+
+def mentions(operand, register):
+    return any(re.search(rf'\b{alias}\b', operand) for alias in REGISTER_ALIASES[register])
+
+def writes_without_reading(line, register):
+    """True if line overwrites register without using its old value"""
+    if line.op == 'call':
+        return register in CALL_CLOBBERED
+    if line.op in ('mov', 'movzx', 'lea') and len(line.args) == 2:
+        return line.args[0] == register and not mentions(line.args[1], register)
+    if line.op == 'pop':
+        return line.args == (register,)
+    if line.op == 'xor' and len(line.args) == 2:
+        return line.args[0] == line.args[1] == register
+    return False
+
+# Each rule gets the Peephole and the index of an instruction. On a match it
+# returns (indices of the lines it consumes, replacement lines); comments
+# between the consumed lines are kept after the replacement.
+
+def push_pop(peephole, i):
+    """push X / pop Y  ->  nothing, or mov Y, X"""
+    first = peephole.lines[i]
+    j = peephole.next_instruction(i)
+    if first.op != 'push' or j is None or peephole.lines[j].op != 'pop' or not first.args or not peephole.lines[j].args:
+        return None
+    source, target = first.args[0], peephole.lines[j].args[0]
+    if source.replace('dword ', '') == target:
+        return [i, j], []
+    if target in REGISTERS and not (memory(source) and mentions(source, 'esp')):
+        return [i, j], [Line.make('mov', target, source)]
+    return None
+
+def mov_push(peephole, i):
+    """mov R, N / push R  ->  push dword N, when R is dead afterwards"""
+    first = peephole.lines[i]
+    j = peephole.next_instruction(i)
+    if first.op != 'mov' or len(first.args) != 2 or j is None:
+        return None
+    register, source = first.args
+    second = peephole.lines[j]
+    if register not in REGISTERS or second.op != 'push' or second.args != (register,):
+        return None
+    if mentions(source, register) or mentions(source, 'esp'):
+        return None
+    k = peephole.next_instruction(j)
+    if k is None or not writes_without_reading(peephole.lines[k], register):
+        return None
+    if source not in REGISTERS and not source.startswith('dword'):
+        source = f"dword {source}"
+    return [i, j], [Line.make('push', source)]
+
+def jump_to_next(peephole, i):
+    """jmp L / L:  ->  L:"""
+    line = peephole.lines[i]
+    if line.op != 'jmp':
+        return None
+    target = line.args[0]
+    for j in range(i + 1, len(peephole.lines)):
+        following = peephole.lines[j]
+        if following.op is not None:
+            return None
+        if following.label == target:
+            return [i], []
+        # A new global label changes what a local .label refers to
+        if following.label is not None and not following.label.startswith('.') and target.startswith('.'):
+            return None
+    return None
+
+def stack_adjust(peephole, i):
+    """add esp, A / add esp, B  ->  add esp, A+B"""
+    first = peephole.lines[i]
+    j = peephole.next_instruction(i)
+    if j is None or first.op != 'add' or first.args[:1] != ('esp',):
+        return None
+    second = peephole.lines[j]
+    if second.op != 'add' or second.args[:1] != ('esp',) or len(first.args) != 2 or len(second.args) != 2:
+        return None
+    if not (first.args[1].isdigit() and second.args[1].isdigit()):
+        return None
+    return [i, j], [Line.make('add', 'esp', str(int(first.args[1]) + int(second.args[1])))]
+
+def store_load(peephole, i):
+    """mov [M], R / mov R, [M]  ->  mov [M], R
+    mov S, R / mov R, S  ->  mov S, R  (a local kept in a register)"""
+    first = peephole.lines[i]
+    j = peephole.next_instruction(i)
+    if first.op != 'mov' or len(first.args) != 2 or j is None:
+        return None
+    second = peephole.lines[j]
+    if second.op != 'mov' or len(second.args) != 2 or second.args[0] != first.args[1]:
+        return None
+    if first.args[0] in REGISTERS and first.args[1] in REGISTERS:
+        if second.args[1] == first.args[0]:
+            return [i, j], [first]
+    elif memory(first.args[0]) is not None and memory(second.args[1]) == memory(first.args[0]):
+        return [i, j], [first]
+    return None
+
+def self_move(peephole, i):
+    """mov R, R  ->  nothing"""
+    line = peephole.lines[i]
+    if line.op == 'mov' and len(line.args) == 2 and line.args[0] == line.args[1]:
+        return [i], []
+    return None
+
+def unreachable(peephole, i):
+    """Instructions after jmp/ret up to the next label never run"""
+    line = peephole.lines[i]
+    if line.op not in ('jmp', 'ret'):
+        return None
+    used = [i]
+    j = peephole.next_instruction(i)
+    while j is not None:
+        used.append(j)
+        j = peephole.next_instruction(j)
+    if len(used) == 1:
+        return None
+    return used, [line]
+
+RULES = [
+    ('push-pop', push_pop),
+    ('mov-push', mov_push),
+    ('jump-to-next', jump_to_next),
+    ('stack-adjust', stack_adjust),
+    ('store-load', store_load),
+    ('self-move', self_move),
+    ('unreachable', unreachable),
+]
+
+class Peephole:
+    """Rewrites short instruction windows using RULES until nothing matches.
+
+    Works on the text of the whole section, so command plugin output is
+    covered too. Labels and directives end a window; comments do not.
+    self.hits counts matches per rule name.
+    """
+    def __init__(self, rules=RULES, max_passes=10):
+        self.rules = rules
+        self.max_passes = max_passes
+        self.hits = Counter()
+        self.lines = []
+
+    def next_instruction(self, i):
+        """Index of the next instruction after i, or None if a label or
+        directive comes first"""
+        for j in range(i + 1, len(self.lines)):
+            line = self.lines[j]
+            if line.op is not None:
+                return j
+            if line.label is not None or line.text.split(';', 1)[0].strip():
+                return None
+        return None
+
+    def optimize(self, text):
+        self.lines = [Line(line) for line in text.split('\n')]
+        for _ in range(self.max_passes):
+            if not self.run_pass():
+                break
+        return '\n'.join(line.text for line in self.lines)
+
+    def run_pass(self):
+        out = []
+        changed = False
+        i = 0
+        while i < len(self.lines):
+            if self.lines[i].op is None:
+                out.append(self.lines[i])
+                i += 1
+                continue
+            for name, rule in self.rules:
+                match = rule(self, i)
+                if match:
+                    used, replacement = match
+                    self.hits[name] += 1
+                    out.extend(replacement)
+                    out.extend(self.lines[k] for k in range(i, used[-1] + 1) if k not in used)
+                    i = used[-1] + 1
+                    changed = True
+                    break
+            else:
+                out.append(self.lines[i])
+                i += 1
+        self.lines = out
+        return changed
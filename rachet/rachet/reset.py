@@ -19,11 +19,12 @@ def isoPycache():
         except FileNotFoundError:
             pass
 
-    # Remove iso folder
-    try:
-        shutil.rmtree("iso")
-    except FileNotFoundError:
-        pass
+    # Remove iso folder and the parsed AST cache
+    for path in ["iso", ".rachet_cache"]:
+        try:
+            shutil.rmtree(path)
+        except FileNotFoundError:
+            pass
 
 if __name__ == "__main__":
     tempAsmFile()
@@ -433,6 +433,7 @@ string_compare:
     mov ebp, esp
     push esi
     push edi
+    push ebx            ; bl holds the second string's bytes
     
     mov esi, [ebp+8]    ; First string
     mov edi, [ebp+12]   ; Second string
@@ -469,6 +470,7 @@ string_compare:
     mov eax, 1          ; Return 1 (equal)
     
 .done:
+    pop ebx
     pop edi
     pop esi
     pop ebp
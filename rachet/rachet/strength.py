@@ -0,0 +1,89 @@
+from optimizer import to_i32
+
+# Multipliers a single lea can apply: x + x*scale
+LEA_FACTORS = {3: 2, 5: 4, 9: 8}
+
+def log2(value):
+    """k if value is 2**k, else None"""
+    if value > 0 and value & (value - 1) == 0:
+        return value.bit_length() - 1
+    return None
+
+def multiply_sequence(factor, register):
+    """Instructions that multiply register by the constant factor without
+    imul, or None if none is shorter. Each instruction is a tuple
+    (op, operands...) that format_sequence() turns into NASM text."""
+    factor = to_i32(factor)
+    if factor == 0:
+        return [('xor', register, register)]
+    magnitude = abs(factor)
+    shift = log2(magnitude)
+    if shift is not None:
+        sequence = [('shl', register, shift)] if shift else []
+    else:
+        for lea_factor, scale in LEA_FACTORS.items():
+            shift = log2(magnitude // lea_factor) if magnitude % lea_factor == 0 else None
+            if shift is not None:
+                sequence = [('lea', register, register, register, scale)]
+                if shift:
+                    sequence.append(('shl', register, shift))
+                break
+        else:
+            return None
+    if factor < 0:
+        sequence.append(('neg', register))
+    return sequence
+
+def magic(divisor):
+    """(multiplier, shift) for signed division by divisor (2 < divisor <
+    2**31, not a power of two): the high 32 bits of n * multiplier,
+    shifted right by shift, are floor(n / divisor) for every i32 n"""
+    for shift in range(32):
+        multiplier = (1 << (32 + shift)) // divisor + 1
+        # The rounding error, scaled by the largest |n| (2**31), has to
+        # stay below one step of the shifted product
+        error = multiplier * divisor - (1 << (32 + shift))
+        if error < 2 << shift and multiplier < 1 << 32:
+            return multiplier, shift
+    raise Exception(f"No magic number for {divisor}")
+
+def divide_sequence(divisor):
+    """Instructions computing eax = eax / divisor (truncating, like idiv)
+    for a constant divisor, clobbering ecx and edx, or None to keep idiv.
+    Division by -1 keeps idiv so INT_MIN / -1 still faults."""
+    divisor = to_i32(divisor)
+    if divisor in (0, -1):
+        return None
+    if divisor == 1:
+        return []
+    magnitude = abs(divisor)
+    shift = log2(magnitude)
+    if shift is not None:
+        # Arithmetic shifts round toward minus infinity; adding
+        # magnitude - 1 to negative dividends first rounds toward zero
+        sequence = [('cdq',), ('and', 'edx', hex(magnitude - 1)), ('add', 'eax', 'edx'), ('sar', 'eax', shift)]
+    else:
+        multiplier, shift = magic(magnitude)
+        sequence = [('mov', 'ecx', 'eax'), ('mov', 'edx', hex(multiplier)), ('imul', 'edx')]
+        if multiplier >= 1 << 31:
+            # imul took the multiplier as negative (multiplier - 2**32),
+            # which took n * 2**32 off the product; add n back to edx
+            sequence.append(('add', 'edx', 'ecx'))
+        if shift:
+            sequence.append(('sar', 'edx', shift))
+        # floor -> truncate: add one when the quotient is negative
+        sequence += [('mov', 'eax', 'edx'), ('shr', 'eax', 31), ('add', 'eax', 'edx')]
+    if divisor < 0:
+        sequence.append(('neg', 'eax'))
+    return sequence
+
+def format_sequence(sequence):
+    """NASM text for a multiply or divide sequence"""
+    lines = []
+    for instr in sequence:
+        if instr[0] == 'lea':
+            _, target, base, index, scale = instr
+            lines.append(f"lea {target}, [{base}+{index}*{scale}]\n")
+        else:
+            lines.append(f"{instr[0]} {', '.join(str(operand) for operand in instr[1:])}\n".replace(' \n', '\n'))
+    return ''.join(lines)
@@ -0,0 +1,68 @@
+"""Compile .rx programs with the real compiler and run the generated assembly in the simulator"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simulator
+
+COMPILER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+
+# Every optimization level, plus the opt-in calling convention
+LEVELS = [('-O0',), ('-O1',), ('-O2',), ('-O1', '--fastcall')]
+
+def copy_compiler(work):
+    """Copy the compiler, its commands and runtimes into the directory work"""
+    for item in os.listdir(COMPILER_DIR):
+        if item.startswith('.') or item in ('__pycache__', 'tests'):
+            continue
+        path = os.path.join(COMPILER_DIR, item)
+        if os.path.isdir(path):
+            shutil.copytree(path, os.path.join(work, item), ignore=shutil.ignore_patterns('__pycache__'))
+        else:
+            shutil.copy(path, work)
+
+def compile_rx(source, flags=()):
+    """Compile source in a scratch copy of the compiler and return (asm, log)
+
+    The compiler reads runtimes/ and commands/ relative to the working
+    directory and writes temp.asm there before handing it to nasm, so each
+    build gets its own copy. The link step fails without nasm; temp.asm is
+    already complete by then."""
+    work = tempfile.mkdtemp(prefix='rachet_test_')
+    try:
+        copy_compiler(work)
+        with open(os.path.join(work, 'prog.rx'), 'w') as f:
+            f.write(source)
+        proc = subprocess.run([sys.executable, 'compiler.py', 'prog.rx', *flags], cwd=work,
+                              capture_output=True, text=True)
+        asm_path = os.path.join(work, 'temp.asm')
+        asm = None
+        if os.path.exists(asm_path):
+            with open(asm_path) as f:
+                asm = f.read()
+        return asm, proc.stdout + proc.stderr
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+def run_asm(asm, inputs=None, max_steps=20_000_000):
+    """Run main() of the assembled program and return (output, cpu)"""
+    cpu = simulator.CPU(simulator.Program(asm), inputs=inputs, max_steps=max_steps)
+    return cpu.run('main'), cpu
+
+def run_rx(source, flags=(), inputs=None):
+    """Compile and run source, returning the printed output"""
+    asm, log = compile_rx(source, flags)
+    if asm is None:
+        raise Exception(f"Compilation failed:\n{log}")
+    return run_asm(asm, inputs)[0]
+
+def read_corpus(name):
+    """Return the source of a corpus program"""
+    with open(os.path.join(CORPUS_DIR, name + '.rx')) as f:
+        return f.read()
@@ -0,0 +1,583 @@
+"""Small interpreter for the NASM subset Rachet emits, so tests can run compiled programs without nasm or qemu"""
+import re
+
+REG32 = ['eax', 'ecx', 'edx', 'ebx', 'esp', 'ebp', 'esi', 'edi']
+REG8 = {'al': ('eax', 0), 'cl': ('ecx', 0), 'dl': ('edx', 0), 'bl': ('ebx', 0),
+        'ah': ('eax', 8), 'ch': ('ecx', 8), 'dh': ('edx', 8), 'bh': ('ebx', 8)}
+REG16 = {'ax': 'eax', 'cx': 'ecx', 'dx': 'edx', 'bx': 'ebx', 'si': 'esi', 'di': 'edi', 'sp': 'esp', 'bp': 'ebp'}
+
+M32 = 0xFFFFFFFF
+
+
+class AsmError(Exception):
+    pass
+
+
+class Halt(Exception):
+    pass
+
+
+def s32(v):
+    v &= M32
+    return v - (1 << 32) if v & 0x80000000 else v
+
+
+def split_operands(s):
+    out, depth, cur, q = [], 0, '', None
+    for ch in s:
+        if q:
+            cur += ch
+            if ch == q:
+                q = None
+            continue
+        if ch in '"\'':
+            q = ch
+            cur += ch
+        elif ch == '[':
+            depth += 1
+            cur += ch
+        elif ch == ']':
+            depth -= 1
+            cur += ch
+        elif ch == ',' and depth == 0:
+            out.append(cur.strip())
+            cur = ''
+        else:
+            cur += ch
+    if cur.strip():
+        out.append(cur.strip())
+    return out
+
+
+def strip_comment(line):
+    q = None
+    for i, ch in enumerate(line):
+        if q:
+            if ch == q:
+                q = None
+        elif ch in '"\'':
+            q = ch
+        elif ch == ';':
+            return line[:i]
+    return line
+
+
+class Program:
+    def __init__(self, text):
+        self.instrs = []      # (mnemonic, operands, lineno, raw)
+        self.labels = {}      # name -> ('code', idx) / ('data', addr)
+        self.mem = bytearray(0x400000)
+        self.data_ptr = 0x200000
+        self.code_base = 0x100000
+        self.pending_data = []
+        self._parse(text)
+
+    def _parse(self, text):
+        last_global = ''
+        section = '.text'
+        for lineno, raw in enumerate(text.split('\n'), 1):
+            line = strip_comment(raw).strip()
+            if not line:
+                continue
+            low = line.lower()
+            if low.startswith('[bits') or low.startswith('bits ') or low.startswith('align') \
+                    or low.startswith('global ') or low.startswith('extern ') or low.startswith('[org'):
+                continue
+            if low.startswith('section '):
+                section = line.split()[1]
+                continue
+            # label with colon
+            m = re.match(r'^([A-Za-z_.$][\w.$]*):\s*(.*)$', line)
+            if m:
+                name = m.group(1)
+                if name.startswith('.'):
+                    name = last_global + name
+                else:
+                    last_global = name
+                if name in self.labels:
+                    raise AsmError(f"line {lineno}: duplicate label {name}")
+                rest = m.group(2)
+                if rest and re.match(r'^(db|dd|dw|resb|resd|times)\b', rest):
+                    self.labels[name] = ('data', self.data_ptr)
+                    self._data(rest, lineno, last_global)
+                    continue
+                if section in ('.data', '.bss', '.rodata') and not rest:
+                    self.labels[name] = ('data', self.data_ptr)
+                    continue
+                self.labels[name] = ('code', len(self.instrs))
+                line = rest
+                if not line:
+                    continue
+            m = re.match(r'^([A-Za-z_][\w]*)\s+(db|dd|dw|resb|resd)\b(.*)$', line)
+            if m:
+                name = m.group(1)
+                self.labels[name] = ('data', self.data_ptr)
+                self._data(m.group(2) + m.group(3), lineno, last_global)
+                continue
+            if re.match(r'^(db|dd|dw|resb|resd|times)\b', line):
+                self._data(line, lineno, last_global)
+                continue
+            parts = line.split(None, 1)
+            mn = parts[0].lower()
+            ops = split_operands(parts[1]) if len(parts) > 1 else []
+            self.instrs.append((mn, ops, lineno, raw, last_global))
+
+    def _data(self, line, lineno, scope):
+        m = re.match(r'^(db|dd|dw|resb|resd|times)\b\s*(.*)$', line)
+        kind, rest = m.group(1), m.group(2)
+        if kind == 'resb':
+            self.data_ptr += int(rest, 0)
+            return
+        if kind == 'resd':
+            self.data_ptr += 4 * int(rest, 0)
+            return
+        if kind == 'times':
+            n, rest2 = rest.split(None, 1)
+            for _ in range(int(n, 0)):
+                self._data(rest2, lineno, scope)
+            return
+        size = {'db': 1, 'dw': 2, 'dd': 4}[kind]
+        for item in split_operands(rest):
+            if item[0] in '"\'' and (size == 1 or len(item) > 3):
+                for ch in item[1:-1].encode('latin-1'):
+                    self.mem[self.data_ptr] = ch
+                    self.data_ptr += 1
+                continue
+            self.pending_data.append((self.data_ptr, size, item, lineno, scope))
+            self.data_ptr += size
+
+    def finish(self):
+        for addr, size, item, lineno, scope in self.pending_data:
+            v = self.eval_imm(item, scope) & ((1 << (8 * size)) - 1)
+            self.mem[addr:addr + size] = v.to_bytes(size, 'little')
+
+    def label_addr(self, name, scope):
+        if name.startswith('.'):
+            name = scope + name
+        if name not in self.labels:
+            raise AsmError(f"undefined label {name}")
+        kind, v = self.labels[name]
+        if kind == 'code':
+            return self.code_base + v
+        return v
+
+    def eval_imm(self, expr, scope):
+        expr = expr.strip()
+        for kw in ('dword ', 'byte ', 'word '):
+            if expr.lower().startswith(kw):
+                expr = expr[len(kw):].strip()
+
+        def repl(m):
+            tok = m.group(0)
+            if re.match(r'^0x[0-9a-fA-F]+$', tok) or re.match(r'^\d+$', tok):
+                return str(int(tok, 0))
+            if re.match(r'^[0-9][0-9a-fA-F]*h$', tok):
+                return str(int(tok[:-1], 16))
+            return str(self.label_addr(tok, scope))
+        if re.match(r"^'.'$", expr):
+            return ord(expr[1])
+        py = re.sub(r"0x[0-9a-fA-F]+|[A-Za-z_.$][\w.$]*|\d+", repl, expr)
+        if not re.match(r'^[\d\s+\-*()]+$', py):
+            raise AsmError(f"bad immediate {expr!r}")
+        return eval(py)
+
+
+class CPU:
+    def __init__(self, prog, inputs=None, max_steps=50_000_000):
+        self.p = prog
+        self.r = {r: 0 for r in REG32}
+        self.zf = self.sf = self.cf = self.of = 0
+        self.out = []
+        self.inputs = list(inputs or [])
+        self.steps = 0
+        self.max_steps = max_steps
+        self.max_depth = 0
+        self.halted = False
+
+    # --- memory
+    def rd(self, addr, size):
+        return int.from_bytes(self.p.mem[addr:addr + size], 'little')
+
+    def wr(self, addr, size, v):
+        self.p.mem[addr:addr + size] = (v & ((1 << (8 * size)) - 1)).to_bytes(size, 'little')
+
+    def cstr(self, addr):
+        end = self.p.mem.index(0, addr)
+        return self.p.mem[addr:end].decode('latin-1')
+
+    # --- operands
+    def parse_op(self, op, scope):
+        o = op.strip()
+        low = o.lower()
+        size = None
+        for kw, sz in (('dword ', 4), ('byte ', 1), ('word ', 2)):
+            if low.startswith(kw):
+                size = sz
+                o = o[len(kw):].strip()
+                low = o.lower()
+        if low in REG32:
+            if size not in (None, 4):
+                raise AsmError(f"size mismatch {op}")
+            if size == 4:
+                raise AsmError(f"'dword' on register operand {op}")
+            return ('r32', low)
+        if low in REG8:
+            return ('r8', low)
+        if low in REG16:
+            return ('r16', low)
+        if o.startswith('['):
+            inner = o[1:-1]
+            return ('mem', inner, size)
+        return ('imm', self.p.eval_imm(o, scope), size)
+
+    def ea(self, inner, scope):
+        total = 0
+        for sign, term in re.findall(r'([+-]?)\s*([^+-]+)', inner.replace(' ', '')):
+            t = term.lower()
+            if '*' in t:
+                a, b = t.split('*')
+                v = self.r[a] * int(b) if a in self.r else self.r[b] * int(a)
+            elif t in self.r:
+                v = self.r[t]
+            else:
+                v = self.p.eval_imm(term, scope)
+            total += -v if sign == '-' else v
+        return total & M32
+
+    def get(self, op, size):
+        k = op[0]
+        if k == 'r32':
+            return self.r[op[1]]
+        if k == 'r8':
+            reg, sh = REG8[op[1]]
+            return (self.r[reg] >> sh) & 0xFF
+        if k == 'r16':
+            return self.r[REG16[op[1]]] & 0xFFFF
+        if k == 'imm':
+            return op[1] & ((1 << (8 * size)) - 1)
+        return self.rd(self.ea(op[1], self.scope), size)
+
+    def put(self, op, size, v):
+        k = op[0]
+        if k == 'r32':
+            self.r[op[1]] = v & M32
+        elif k == 'r8':
+            reg, sh = REG8[op[1]]
+            self.r[reg] = (self.r[reg] & ~(0xFF << sh) & M32) | ((v & 0xFF) << sh)
+        elif k == 'r16':
+            reg = REG16[op[1]]
+            self.r[reg] = (self.r[reg] & 0xFFFF0000) | (v & 0xFFFF)
+        elif k == 'mem':
+            self.wr(self.ea(op[1], self.scope), size, v)
+        else:
+            raise AsmError('write to immediate')
+
+    def opsize(self, *ops):
+        sizes = set()
+        for op in ops:
+            if op[0] == 'r32':
+                sizes.add(4)
+            elif op[0] == 'r8':
+                sizes.add(1)
+            elif op[0] == 'r16':
+                sizes.add(2)
+            elif op[0] in ('mem', 'imm') and op[2]:
+                if op[0] == 'mem':
+                    sizes.add(op[2])
+        if len(sizes) > 1:
+            raise AsmError(f"operand size mismatch {ops}")
+        if not sizes:
+            raise AsmError(f"operation size not specified {ops}")
+        return sizes.pop()
+
+    def flags_logic(self, v, size):
+        bits = 8 * size
+        v &= (1 << bits) - 1
+        self.zf = int(v == 0)
+        self.sf = (v >> (bits - 1)) & 1
+        self.cf = self.of = 0
+
+    def flags_add(self, a, b, size, sub=False):
+        bits = 8 * size
+        mask = (1 << bits) - 1
+        if sub:
+            res = (a - b) & mask
+            self.cf = int((a & mask) < (b & mask))
+            sa, sb, sr = a >> (bits - 1) & 1, b >> (bits - 1) & 1, res >> (bits - 1)
+            self.of = int(sa != sb and sr != sa)
+        else:
+            full = (a & mask) + (b & mask)
+            res = full & mask
+            self.cf = int(full > mask)
+            sa, sb, sr = a >> (bits - 1) & 1, b >> (bits - 1) & 1, res >> (bits - 1)
+            self.of = int(sa == sb and sr != sa)
+        self.zf = int(res == 0)
+        self.sf = res >> (bits - 1)
+        return res
+
+    def cond(self, cc):
+        z, s, c, o = self.zf, self.sf, self.cf, self.of
+        table = {
+            'e': z, 'z': z, 'ne': not z, 'nz': not z,
+            'g': not z and s == o, 'nle': not z and s == o,
+            'ge': s == o, 'nl': s == o, 'l': s != o, 'nge': s != o,
+            'le': z or s != o, 'ng': z or s != o,
+            'a': not c and not z, 'nbe': not c and not z, 'ae': not c, 'nb': not c, 'nc': not c,
+            'b': c, 'c': c, 'nae': c, 'be': c or z, 'na': c or z,
+            's': s, 'ns': not s, 'o': o, 'no': not o,
+        }
+        if cc not in table:
+            raise AsmError(f"unknown condition {cc}")
+        return bool(table[cc])
+
+    def push(self, v):
+        self.r['esp'] = (self.r['esp'] - 4) & M32
+        self.wr(self.r['esp'], 4, v)
+
+    def pop(self):
+        v = self.rd(self.r['esp'], 4)
+        self.r['esp'] = (self.r['esp'] + 4) & M32
+        return v
+
+    # --- runtime stubs
+    def stub(self, name):
+        esp = self.r['esp']
+        arg = lambda i: self.rd(esp + 4 + 4 * i, 4)
+        if name == 'print_thunk':
+            self.out.append(self.cstr(arg(0)))
+            ret = 4
+        elif name == 'print_number_thunk':
+            self.out.append(str(s32(arg(0))))
+            ret = 4
+        elif name == 'pause_thunk':
+            ret = 4
+        elif name == 'input_thunk':
+            text = self.inputs.pop(0) if self.inputs else ''
+            buf = arg(0)
+            data = text.encode('latin-1') + b'\0'
+            self.p.mem[buf:buf + len(data)] = data
+            self.out.append(text + '\n')
+            ret = 4
+        elif name == 'string_compare':
+            a, b = self.cstr(arg(0)), self.cstr(arg(1))
+            self.r['eax'] = int(a == b)
+            # kernel implementation clobbers bl
+            ret = 8
+        elif name == 'shutdown_thunk':
+            self.out.append('<shutdown>')
+            raise Halt()
+        else:
+            return False
+        retaddr = self.pop()
+        self.r['esp'] = (self.r['esp'] + ret) & M32
+        self.pc = retaddr
+        return True
+
+    def run(self, entry='main'):
+        self.p.finish()
+        STACK_TOP = 0x90000
+        self.r['esp'] = STACK_TOP
+        SENTINEL = 0xDEAD0000
+        self.push(SENTINEL)
+        self.pc = self.p.label_addr(entry, '')
+        base = self.p.code_base
+        try:
+            while True:
+                if self.pc == SENTINEL:
+                    break
+                idx = self.pc - base
+                if not (0 <= idx < len(self.p.instrs)):
+                    raise AsmError(f"jump to bad address {self.pc:#x}")
+                self.max_depth = max(self.max_depth, STACK_TOP - self.r['esp'])
+                self.steps += 1
+                if self.steps > self.max_steps:
+                    raise AsmError("step limit")
+                mn, ops, lineno, raw, scope = self.p.instrs[idx]
+                self.scope = scope
+                self.pc += 1
+                try:
+                    self.exec(mn, ops, scope)
+                except Halt:
+                    raise
+                except AsmError as e:
+                    raise AsmError(f"line {lineno}: {raw.strip()}: {e}")
+        except Halt:
+            self.halted = True
+        return ''.join(self.out)
+
+    def exec(self, mn, ops, scope):
+        P = lambda o: self.parse_op(o, scope)
+        if mn == 'mov':
+            d, s = P(ops[0]), P(ops[1])
+            size = self.opsize(d, s) if not (d[0] == 'mem' and s[0] == 'imm' and not d[2]) else None
+            if size is None:
+                raise AsmError('mov mem, imm without size')
+            self.put(d, size, self.get(s, size))
+        elif mn in ('movzx', 'movsx'):
+            d, s = P(ops[0]), P(ops[1])
+            ssize = 1 if s[0] == 'r8' or (s[0] == 'mem' and s[2] == 1) else 2 if (s[0] == 'r16' or (s[0] == 'mem' and s[2] == 2)) else None
+            if ssize is None:
+                raise AsmError('movzx source size')
+            v = self.get(s, ssize)
+            if mn == 'movsx' and v >> (8 * ssize - 1):
+                v -= 1 << (8 * ssize)
+            self.put(d, 4, v)
+        elif mn == 'lea':
+            d, s = P(ops[0]), P(ops[1])
+            self.put(d, 4, self.ea(s[1], scope))
+        elif mn == 'push':
+            s = P(ops[0])
+            if s[0] == 'mem' and s[2] != 4:
+                raise AsmError('push mem needs dword')
+            self.push(self.get(s, 4))
+        elif mn == 'pop':
+            d = P(ops[0])
+            if d[0] == 'mem' and d[2] != 4:
+                raise AsmError('pop mem needs dword')
+            self.put(d, 4, self.pop())
+        elif mn in ('add', 'sub', 'cmp', 'and', 'or', 'xor', 'test'):
+            d, s = P(ops[0]), P(ops[1])
+            if d[0] == 'mem' and not d[2] and s[0] == 'imm':
+                raise AsmError(f'{mn} mem, imm without size')
+            size = self.opsize(d, s)
+            a, b = self.get(d, size), self.get(s, size)
+            if mn == 'add':
+                self.put(d, size, self.flags_add(a, b, size))
+            elif mn in ('sub', 'cmp'):
+                res = self.flags_add(a, b, size, sub=True)
+                if mn == 'sub':
+                    self.put(d, size, res)
+            else:
+                res = {'and': a & b, 'or': a | b, 'xor': a ^ b, 'test': a & b}[mn]
+                self.flags_logic(res, size)
+                if mn != 'test':
+                    self.put(d, size, res)
+        elif mn in ('inc', 'dec'):
+            d = P(ops[0])
+            size = self.opsize(d)
+            cf = self.cf
+            self.put(d, size, self.flags_add(self.get(d, size), 1, size, sub=(mn == 'dec')))
+            self.cf = cf
+        elif mn == 'neg':
+            d = P(ops[0])
+            size = self.opsize(d)
+            v = self.get(d, size)
+            res = self.flags_add(0, v, size, sub=True)
+            self.put(d, size, res)
+            self.cf = int(v != 0)
+        elif mn == 'not':
+            d = P(ops[0])
+            size = self.opsize(d)
+            self.put(d, size, ~self.get(d, size))
+        elif mn in ('shl', 'sal', 'shr', 'sar'):
+            d, s = P(ops[0]), P(ops[1])
+            size = self.opsize(d)
+            n = (self.get(s, 1) if s[0] != 'imm' else s[1]) & 31
+            v = self.get(d, size)
+            bits = 8 * size
+            if n:
+                if mn in ('shl', 'sal'):
+                    self.cf = (v >> (bits - n)) & 1
+                    res = (v << n) & ((1 << bits) - 1)
+                elif mn == 'shr':
+                    self.cf = (v >> (n - 1)) & 1
+                    res = v >> n
+                else:
+                    sv = v - (1 << bits) if v >> (bits - 1) else v
+                    self.cf = (sv >> (n - 1)) & 1
+                    res = (sv >> n) & ((1 << bits) - 1)
+                self.put(d, size, res)
+                self.zf = int(res == 0)
+                self.sf = res >> (bits - 1)
+        elif mn == 'imul':
+            if len(ops) == 1:
+                s = P(ops[0])
+                v = s32(self.r['eax']) * s32(self.get(s, 4))
+                self.r['eax'] = v & M32
+                self.r['edx'] = (v >> 32) & M32
+                self.cf = self.of = int(v != s32(v & M32))
+            else:
+                d = P(ops[0])
+                if len(ops) == 2:
+                    a, b = self.get(d, 4), self.get(P(ops[1]), 4)
+                else:
+                    a, b = self.get(P(ops[1]), 4), self.get(P(ops[2]), 4)
+                v = s32(a) * s32(b)
+                self.put(d, 4, v)
+                self.cf = self.of = int(v != s32(v & M32))
+        elif mn == 'mul':
+            s = P(ops[0])
+            v = self.r['eax'] * self.get(s, 4)
+            self.r['eax'] = v & M32
+            self.r['edx'] = (v >> 32) & M32
+        elif mn == 'cdq':
+            self.r['edx'] = M32 if self.r['eax'] & 0x80000000 else 0
+        elif mn in ('idiv', 'div'):
+            s = P(ops[0])
+            if s[0] == 'imm':
+                raise AsmError('div by immediate')
+            if s[0] == 'mem' and s[2] != 4:
+                raise AsmError('div mem needs dword')
+            dv = self.get(s, 4)
+            n = (self.r['edx'] << 32) | self.r['eax']
+            if mn == 'idiv':
+                dv = s32(dv)
+                n = n - (1 << 64) if n >> 63 else n
+                if dv == 0:
+                    raise AsmError('#DE divide by zero')
+                q = abs(n) // abs(dv)
+                if (n < 0) != (dv < 0):
+                    q = -q
+                r = n - q * dv
+                if not (-2**31 <= q < 2**31):
+                    raise AsmError('#DE quotient overflow')
+            else:
+                if dv == 0:
+                    raise AsmError('#DE divide by zero')
+                q, r = divmod(n, dv)
+            self.r['eax'] = q & M32
+            self.r['edx'] = r & M32
+        elif mn.startswith('set'):
+            d = P(ops[0])
+            if d[0] != 'r8':
+                raise AsmError('setcc needs r8')
+            self.put(d, 1, int(self.cond(mn[3:])))
+        elif mn == 'jmp':
+            t = ops[0]
+            if t.startswith('[') or t.lower().startswith('dword ['):
+                o = P(t)
+                self.pc = self.get(o, 4)
+            else:
+                self.pc = self.p.label_addr(t, scope)
+        elif mn.startswith('j'):
+            if self.cond(mn[1:]):
+                self.pc = self.p.label_addr(ops[0], scope)
+        elif mn == 'call':
+            name = ops[0]
+            self.push(self.pc)
+            self.pc = self.p.label_addr(name, scope)
+            if self.stub(name):
+                return
+        elif mn == 'ret':
+            n = int(ops[0], 0) if ops else 0
+            self.pc = self.pop()
+            self.r['esp'] += n
+        elif mn == 'leave':
+            self.r['esp'] = self.r['ebp']
+            self.r['ebp'] = self.pop()
+        elif mn == 'xchg':
+            a, b = P(ops[0]), P(ops[1])
+            size = self.opsize(a, b)
+            va, vb = self.get(a, size), self.get(b, size)
+            self.put(a, size, vb)
+            self.put(b, size, va)
+        elif mn == 'nop':
+            pass
+        elif mn in ('cli', 'hlt'):
+            raise Halt()
+        elif mn in ('cmovl', 'cmovge', 'cmovg', 'cmovle', 'cmove', 'cmovne', 'cmovs', 'cmovns'):
+            d, s = P(ops[0]), P(ops[1])
+            if self.cond(mn[4:]):
+                self.put(d, 4, self.get(s, 4))
+        else:
+            raise AsmError(f"unsupported instruction {mn}")
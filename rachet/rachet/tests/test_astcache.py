@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+
+from harness import copy_compiler
+from astcache import DEFAULT_CACHE_DIR, cache_dir_for
+
+SOURCE = 'use crate::bin;\n\nfn main() {\n    print(1);\n}\n'
+
+def cached_entries(directory):
+    path = os.path.join(directory, DEFAULT_CACHE_DIR)
+    return [name for name in os.listdir(path) if name.endswith('.ast')] if os.path.isdir(path) else []
+
+def test_cache_dir_is_next_to_the_source(tmp_path):
+    source = os.path.join(str(tmp_path), 'programs', 'main.rx')
+    assert cache_dir_for(source) == os.path.join(str(tmp_path), 'programs', DEFAULT_CACHE_DIR)
+
+def test_compile_from_another_directory_caches_next_to_the_source(tmp_path):
+    work = str(tmp_path)
+    copy_compiler(work)
+    os.makedirs(os.path.join(work, 'programs'))
+    with open(os.path.join(work, 'programs', 'main.rx'), 'w') as f:
+        f.write(SOURCE)
+    subprocess.run([sys.executable, 'compiler.py', os.path.join('programs', 'main.rx')], cwd=work, capture_output=True)
+    assert len(cached_entries(os.path.join(work, 'programs'))) == 1
+    assert cached_entries(work) == []
+
+def test_reset_removes_the_cache(tmp_path):
+    work = str(tmp_path)
+    copy_compiler(work)
+    with open(os.path.join(work, 'main.rx'), 'w') as f:
+        f.write(SOURCE)
+    subprocess.run([sys.executable, 'compiler.py', 'main.rx'], cwd=work, capture_output=True)
+    assert len(cached_entries(work)) == 1
+    subprocess.run([sys.executable, 'reset.py'], cwd=work, check=True)
+    assert not os.path.exists(os.path.join(work, DEFAULT_CACHE_DIR))
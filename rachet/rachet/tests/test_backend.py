@@ -0,0 +1,28 @@
+import pytest
+
+from harness import LEVELS, run_rx
+
+SHORT_CIRCUIT_ARGUMENTS = """use crate::bin;
+fn f() {
+    print(7);
+    return 0
+}
+fn g(a) {
+    print(a || f());
+    print(a && f());
+    print((a - 5) && f());
+    print((a - 5) || f());
+    return 9
+}
+fn main() {
+    print(g(5));
+    print(g(0));
+    return 0
+}
+"""
+
+@pytest.mark.parametrize('flags', LEVELS, ids=' '.join)
+def test_short_circuit_command_arguments(flags):
+    """A short circuit passed to a command prints its value, not a stale eax"""
+    expected = ['1', '7', '0', '0', '7', '0', '9', '7', '0', '0', '7', '0', '1', '9']
+    assert run_rx(SHORT_CIRCUIT_ARGUMENTS, flags).split() == expected
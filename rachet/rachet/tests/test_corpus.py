@@ -0,0 +1,16 @@
+import os
+
+import pytest
+
+from harness import CORPUS_DIR, LEVELS, read_corpus, run_rx
+
+PROGRAMS = sorted(name[:-3] for name in os.listdir(CORPUS_DIR)
+                  if name.endswith('.rx') and os.path.exists(os.path.join(CORPUS_DIR, name[:-3] + '.out')))
+
+@pytest.mark.parametrize('flags', LEVELS, ids=' '.join)
+@pytest.mark.parametrize('name', PROGRAMS)
+def test_corpus_matches_golden_output(name, flags):
+    """Every optimization level prints the recorded output of the program"""
+    with open(os.path.join(CORPUS_DIR, name + '.out')) as f:
+        expected = f.read()
+    assert run_rx(read_corpus(name), flags) == expected
@@ -0,0 +1,124 @@
+"""Random programs checked against a Python model of Rachet's i32 semantics"""
+import random
+
+import pytest
+
+from harness import LEVELS, run_rx
+
+SEEDS = range(3)
+
+OPERATORS = ['+', '-', '*', '/', '==', '!=', '<', '<=', '>', '>=', '&&', '||']
+
+def to_i32(value):
+    value &= 0xFFFFFFFF
+    return value - (1 << 32) if value >= 1 << 31 else value
+
+def divide_i32(a, b):
+    quotient = abs(a) // abs(b)
+    return quotient if (a < 0) == (b < 0) else -quotient
+
+def literal(value):
+    return str(value) if value >= 0 else f"(0 - {-value})"
+
+def random_expression(rng, depth, env):
+    """Return (source, value) for a random expression over the names in env"""
+    if depth == 0 or rng.random() < 0.25:
+        roll = rng.random()
+        if roll < 0.45:
+            name = rng.choice(list(env))
+            return name, env[name]
+        if roll < 0.55:
+            inner, value = random_expression(rng, depth - 1, env) if depth else ('1', 1)
+            return f"id({inner})", value
+        number = rng.randint(0, 9)
+        return str(number), number
+    if rng.random() < 0.1:
+        inner, value = random_expression(rng, depth - 1, env)
+        return f"(not {inner})", int(value == 0)
+    op = rng.choice(OPERATORS)
+    left, a = random_expression(rng, depth - 1, env)
+    right, b = random_expression(rng, depth - 1, env)
+    if op == '/':
+        if b == 0 or (a == -2**31 and b == -1):
+            right, b = f"({right} + 1000)", to_i32(b + 1000)
+            if b == 0:
+                return left, a
+        value = divide_i32(a, b)
+    else:
+        value = {'+': a + b, '-': a - b, '*': a * b, '==': int(a == b), '!=': int(a != b),
+                 '<': int(a < b), '<=': int(a <= b), '>': int(a > b), '>=': int(a >= b),
+                 '&&': int(bool(a) and bool(b)), '||': int(bool(a) or bool(b))}[op]
+    return f"({left} {op} {right})", to_i32(value)
+
+def random_string(rng):
+    alphabet = 'abc' if rng.random() < 0.7 else 'abcdefghijklmnopqrstuvwxyz'
+    return ''.join(rng.choice(alphabet) for _ in range(rng.choice([0, 1, 1, 2, 2, 3, 4, 6, 9])))
+
+@pytest.mark.parametrize('flags', LEVELS, ids=' '.join)
+@pytest.mark.parametrize('seed', SEEDS)
+def test_expressions(seed, flags):
+    """Nested arithmetic, comparisons and short-circuit operators over parameters"""
+    rng = random.Random(seed)
+    env = {'p': 3, 'q': -7, 'r': 11, 's': 2}
+    lines = []
+    for i in range(40):
+        expression, value = random_expression(rng, 5, env)
+        lines.append(f"    let v{i} = {expression};\n    let ok{i} = v{i} == {literal(value)};\n    print(ok{i});")
+    source = ("use crate::bin;\n\nfn main() {\n    work(3, 0 - 7, 11, 2);\n}\n\n"
+              "fn work(p, q, r, s) {\n" + "\n".join(lines) + "\n}\n\nfn id(x) {\n    return x\n}\n")
+    results = run_rx(source, flags).split()
+    failed = [lines[i] for i, result in enumerate(results) if result != '1']
+    assert len(results) == len(lines) and not failed, failed[:3]
+
+@pytest.mark.parametrize('flags', LEVELS, ids=' '.join)
+@pytest.mark.parametrize('seed', SEEDS)
+def test_string_matches(seed, flags):
+    """String match arms, including duplicate and empty patterns"""
+    rng = random.Random(seed)
+    lines = []
+    expected = []
+    for t in range(12):
+        cases = [random_string(rng) for _ in range(rng.randint(1, 20))]
+        subject = rng.choice(cases + [random_string(rng) for _ in range(3)])
+        lines.append(f'    let s{t} = "{subject}";')
+        lines.append(f'    match (s{t}) {{')
+        for i, case in enumerate(cases):
+            lines.append(f'        "{case}", print("m{t}_{i}");')
+        lines.append('    }')
+        lines.append(f'    print("e{t}");')
+        if subject in cases:
+            expected.append(f"m{t}_{cases.index(subject)}")
+        expected.append(f"e{t}")
+    source = "use crate::bin;\n\nfn main() {\n" + "\n".join(lines) + "\n}\n"
+    assert run_rx(source, flags).split() == expected
+
+@pytest.mark.parametrize('flags', LEVELS, ids=' '.join)
+@pytest.mark.parametrize('seed', SEEDS)
+def test_integer_matches(seed, flags):
+    """Dense, sparse and negative integer match arms, probed inside and outside their range"""
+    rng = random.Random(seed)
+    functions = []
+    calls = []
+    expected = []
+    for t in range(8):
+        kind = rng.choice(['dense', 'sparse', 'negative', 'small'])
+        count = rng.randint(1, 30)
+        if kind == 'dense':
+            base = rng.randint(-5, 50)
+            values = [base + rng.randint(0, count + count // 3) for _ in range(count)]
+        elif kind == 'sparse':
+            values = [rng.randint(-1000, 100000) for _ in range(count)]
+        elif kind == 'negative':
+            values = [rng.randint(-40, -1) for _ in range(count)]
+        else:
+            values = [rng.randint(0, 3) for _ in range(rng.randint(1, 4))]
+        body = "\n".join(f"        {value}, print({i});" for i, value in enumerate(values))
+        functions.append(f"fn m{t}(x) {{\n    match (x) {{\n{body}\n    }}\n    print(9999);\n}}")
+        probes = values + [min(values) - 1, max(values) + 1, rng.randint(-100, 100)]
+        for probe in rng.sample(probes, min(6, len(probes))):
+            calls.append(f"    m{t}({literal(probe)});")
+            if probe in values:
+                expected.append(str(values.index(probe)))
+            expected.append('9999')
+    source = "use crate::bin;\n\nfn main() {\n" + "\n".join(calls) + "\n}\n\n" + "\n\n".join(functions) + "\n"
+    assert run_rx(source, flags).split() == expected
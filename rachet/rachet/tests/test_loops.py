@@ -0,0 +1,69 @@
+import pytest
+
+from harness import LEVELS, compile_rx, run_asm, run_rx
+
+SKIPPED_LET = """use crate::bin;
+
+fn main() {
+    let x = 7;
+    if (0) {
+        let b = 5;
+    }
+    let b = (x + x);
+    for (j in 1..4) {
+        print(j);
+    }
+    print(99);
+}
+"""
+
+LOOPS = """use crate::bin;
+
+fn main() {
+    let total = 0;
+    for (i in 0..10) {
+        if (i == 2) {
+            continue;
+        }
+        if (i == 7) {
+            break;
+        }
+        let square = i * i;
+        let total = total + square;
+    }
+    print(total);
+    let n = 0;
+    let count = 0;
+    while (n < 2000) {
+        let step = n / 100 + 1;
+        let n = n + step;
+        let count = count + 1;
+    }
+    print(count);
+    print(nested(4));
+}
+
+fn nested(size) {
+    let pairs = 0;
+    for (a in 0..size) {
+        for (b in a..size) {
+            let pairs = pairs + 1;
+        }
+    }
+    return pairs
+}
+"""
+
+@pytest.mark.parametrize('flags', LEVELS, ids=' '.join)
+def test_let_in_skipped_branch(flags):
+    """A let whose branch is skipped still owns its slot, so later lets and pushes don't collide"""
+    assert run_rx(SKIPPED_LET, flags).split() == ['1', '2', '3', '99']
+
+@pytest.mark.parametrize('flags', LEVELS, ids=' '.join)
+def test_loops(flags):
+    asm, log = compile_rx(LOOPS, flags)
+    assert asm is not None, log
+    output, cpu = run_asm(asm)
+    assert output.split() == [str(0 + 1 + 9 + 16 + 25 + 36), '361', '10']
+    # Lets in a loop body reuse their slot on every pass
+    assert cpu.max_depth < 256
@@ -0,0 +1,47 @@
+import pytest
+
+from harness import LEVELS, compile_rx, run_asm
+from simulator import AsmError
+
+DEAD_DIVISIONS = """use crate::bin;
+
+fn main() {
+    let x = 5;
+    match (x) {
+        1, print(10 / 0);
+        5, print(x / 5);
+    }
+    print(2);
+}
+
+fn never() {
+    return 10 / 0
+}
+"""
+
+REACHABLE_DIVISION = """use crate::bin;
+
+fn main() {
+    print(1);
+    let z = 0;
+    print(7 / z);
+    print(2);
+}
+"""
+
+@pytest.mark.parametrize('flags', LEVELS, ids=' '.join)
+def test_unreachable_division_by_zero_compiles(flags):
+    """A constant zero divisor in a dead match arm or an uncalled function is not an error"""
+    asm, log = compile_rx(DEAD_DIVISIONS, flags)
+    assert asm is not None, log
+    if flags != ('-O0',):
+        assert "Warning: Division by constant zero in function 'never'" in log
+    assert run_asm(asm)[0].split() == ['1', '2']
+
+@pytest.mark.parametrize('flags', LEVELS, ids=' '.join)
+def test_reachable_division_by_zero_faults(flags):
+    """The division is left in place, so it faults where the program reaches it"""
+    asm, log = compile_rx(REACHABLE_DIVISION, flags)
+    assert asm is not None, log
+    with pytest.raises(AsmError, match='divide by zero'):
+        run_asm(asm)
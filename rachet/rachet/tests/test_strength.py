@@ -0,0 +1,123 @@
+import random
+
+import pytest
+
+from harness import LEVELS, compile_rx, run_asm
+from optimizer import to_i32, divide_i32
+from strength import multiply_sequence, divide_sequence, format_sequence, magic
+
+EDGES = [-0x80000000, -0x7FFFFFFF, -65536, -1000, -7, -2, -1, 0, 1, 2, 7, 1000, 65535, 0x7FFFFFFE, 0x7FFFFFFF]
+
+CONSTANTS = (list(range(-300, 301)) + [1 << k for k in range(31)] + [-(1 << k) for k in range(32)]
+             + [1000, 1000000, 0x7FFFFFFF, 641, 6700417, 3 << 20, 0x55555555])
+
+def dividends():
+    rng = random.Random(0)
+    values = EDGES + [rng.randint(-0x80000000, 0x7FFFFFFF) for _ in range(200)]
+    # Dividends just around multiples, where rounding goes wrong first
+    for constant in (3, 7, 10, 641, 1000):
+        for k in (1, 12345, 0x7FFFFFFF // constant):
+            values += [k * constant + delta for delta in (-1, 0, 1)] + [-k * constant + delta for delta in (-1, 0, 1)]
+    return [to_i32(n) for n in values]
+
+def execute(sequence, registers):
+    """Run a sequence on a dict of signed 32-bit register values, the way the CPU would"""
+    registers = dict(registers)
+
+    def value(operand):
+        if isinstance(operand, int):
+            return operand
+        if operand in registers:
+            return registers[operand]
+        return int(operand, 0)
+
+    for instr in sequence:
+        op = instr[0]
+        if op == 'cdq':
+            registers['edx'] = -1 if registers['eax'] < 0 else 0
+        elif op == 'imul':
+            product = registers['eax'] * to_i32(value(instr[1]))
+            registers['eax'] = to_i32(product)
+            registers['edx'] = to_i32(product >> 32)
+        elif op == 'lea':
+            _, target, base, index, scale = instr
+            registers[target] = to_i32(registers[base] + registers[index] * scale)
+        elif op == 'neg':
+            registers[instr[1]] = to_i32(-registers[instr[1]])
+        else:
+            target, source = instr[1], value(instr[2])
+            current = registers.get(target, 0)
+            result = {
+                'mov': lambda: source,
+                'add': lambda: current + source,
+                'and': lambda: current & source,
+                'xor': lambda: current ^ source,
+                'shl': lambda: current << source,
+                'sar': lambda: current >> source,
+                'shr': lambda: (current & 0xFFFFFFFF) >> source,
+            }[op]()
+            registers[target] = to_i32(result)
+    return registers
+
+def test_multiply_sequences_match_imul():
+    values = dividends()
+    for constant in CONSTANTS:
+        sequence = multiply_sequence(constant, 'ebx')
+        if sequence is None:
+            continue
+        for n in values:
+            assert execute(sequence, {'ebx': n})['ebx'] == to_i32(n * constant), f"{n} * {constant}"
+
+def test_divide_sequences_match_idiv():
+    values = dividends()
+    for constant in CONSTANTS:
+        sequence = divide_sequence(constant)
+        if sequence is None:
+            assert to_i32(constant) in (0, -1)
+            continue
+        for n in values:
+            assert execute(sequence, {'eax': n})['eax'] == divide_i32(n, to_i32(constant)), f"{n} / {constant}"
+
+def test_format_sequence():
+    assert format_sequence(multiply_sequence(10, 'ebx')) == "lea ebx, [ebx+ebx*4]\nshl ebx, 1\n"
+    assert format_sequence(divide_sequence(-4)) == "cdq\nand edx, 0x3\nadd eax, edx\nsar eax, 2\nneg eax\n"
+
+# Divisors and factors used by the compiled program; -1 is left out of the
+# divisors because INT_MIN / -1 faults
+PROGRAM_CONSTANTS = [2, 3, 5, 7, 9, 10, 12, 16, 25, 100, 641, 1000, 65536, 0x7FFFFFFF, -2, -3, -7, -8, -10, -1000]
+PROGRAM_ARGUMENTS = [(1234567, -89, 3, 40), (-2147483648, 7, -1, 5), (-1000001, 2147483647, 77, -6), (0, -1, 1, 641)]
+
+def literal(value):
+    return str(value) if value >= 0 else f"(0 - {-value})"
+
+def constant_program():
+    """Multiplies and divides by constants, alone and nested so that the
+    division runs while eax, ecx and edx hold other live values, with the
+    values each line should print"""
+    lines = []
+    expected = []
+    for i, constant in enumerate(PROGRAM_CONSTANTS):
+        c = literal(constant)
+        lines += [f"    let m{i} = p * {c};", f"    print(m{i});",
+                  f"    let d{i} = p / {c};", f"    print(d{i});",
+                  f"    let n{i} = q + (r + (p / {c}));", f"    print(n{i});",
+                  f"    let k{i} = s - (q * (r + p / {c})) * {c};", f"    print(k{i});"]
+    source = ("use crate::bin;\n\nfn main() {\n"
+              + "".join(f"    work({', '.join(literal(a) for a in args)});\n" for args in PROGRAM_ARGUMENTS)
+              + "}\n\nfn work(p, q, r, s) {\n" + "\n".join(lines) + "\n}\n")
+    for p, q, r, s in PROGRAM_ARGUMENTS:
+        for constant in PROGRAM_CONSTANTS:
+            quotient = divide_i32(p, constant)
+            expected += [to_i32(p * constant), quotient, to_i32(q + r + quotient),
+                         to_i32(s - to_i32(q * to_i32(r + quotient)) * constant)]
+    return source, [str(value) for value in expected]
+
+@pytest.mark.parametrize('flags', LEVELS, ids=' '.join)
+def test_compiled_constants_match_python(flags):
+    source, expected = constant_program()
+    asm, log = compile_rx(source, flags)
+    assert asm is not None, log
+    if flags != ('-O0',):
+        # The divisions really went through the multiply sequences
+        assert hex(magic(641)[0]) in asm
+    assert run_asm(asm)[0].split() == expected